@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""Generate synthetic DFD sources of tunable size, for benchmarks.
+
+A shape tells how many items, connections, frames, filters, include
+levels and external references a diagram has. generate_dfd() returns the
+files of such a diagram (the main file, its includees and the diagram it
+refers to), generate_markdown() a markdown document whose snippets refer
+to, and include, one another.
+
+Generation is deterministic: the same shape and seed give the same text.
+Run as a program to write a diagram to a directory, e.g.:
+
+    benchmarks/generate.py --items 2000 --connections 4000 --frames 20 \\
+        --filters 4 --include-depth 3 --externals 10 /tmp/big
+"""
+
+import argparse
+import random
+from dataclasses import dataclass, fields
+from pathlib import Path
+
+ITEM_KINDS = ["process", "entity", "store", "channel"]
+FRAME_SIZE = 5  # items per frame
+MAIN_FILE = "main.dfd"
+EXTERNAL_FILE = "external.dfd"
+
+
+@dataclass(frozen=True)
+class Shape:
+    """Size parameters of a synthetic diagram."""
+
+    items: int = 100
+    connections: int = 200
+    frames: int = 0
+    filters: int = 0
+    distance: str = "*"  # neighbor distance of filters: "*" or a number
+    include_depth: int = 0
+    externals: int = 0
+    seed: int = 0
+
+
+def _item_name(nr: int) -> str:
+    return f"N{nr}"
+
+
+def _part_name(level: int) -> str:
+    return f"part-{level}.part"
+
+
+def _items(shape: Shape, rng: random.Random) -> list[str]:
+    return [
+        f"{rng.choice(ITEM_KINDS)} {_item_name(nr)} Item {nr}"
+        for nr in range(shape.items)
+    ]
+
+
+def _connections(shape: Shape, rng: random.Random) -> list[tuple[int, int]]:
+    """Random connections, after a chain through all items (so that
+    filters find connected neighborhoods)."""
+    pairs = [
+        (nr, nr + 1) for nr in range(min(shape.items - 1, shape.connections))
+    ]
+    while len(pairs) < shape.connections:
+        pairs.append((rng.randrange(shape.items), rng.randrange(shape.items)))
+    return pairs
+
+
+def _connection_lines(pairs: list[tuple[int, int]]) -> list[str]:
+    lines = []
+    for nr, (src, dst) in enumerate(pairs):
+        if nr % 7 == 3:  # some reversed ones
+            lines.append(f"{_item_name(dst)} <-- {_item_name(src)} f{nr}")
+        else:
+            lines.append(f"{_item_name(src)} --> {_item_name(dst)} f{nr}")
+    return lines
+
+
+def _frames(shape: Shape) -> list[str]:
+    nb_frames = min(shape.frames, shape.items // FRAME_SIZE)
+    return [
+        "frame "
+        + " ".join(
+            _item_name(nr)
+            for nr in range(nb * FRAME_SIZE, (nb + 1) * FRAME_SIZE)
+        )
+        + f" = Frame {nb}"
+        for nb in range(nb_frames)
+    ]
+
+
+def _filters(
+    shape: Shape, pairs: list[tuple[int, int]], rng: random.Random
+) -> list[str]:
+    """Keep the neighborhood of an item, then remove smaller ones.
+
+    Removed items are picked among the kept ones, away from those already
+    removed: filters fail on names no longer available.
+    """
+    if not shape.filters or not shape.items:
+        return []
+    anchor = rng.randrange(shape.items)
+    lines = [f"!<>{shape.distance} {_item_name(anchor)}"]
+    if shape.distance == "*":
+        kept = list(range(shape.items))  # all chained
+    else:
+        reach = int(shape.distance)
+        kept = list(
+            range(max(0, anchor - reach), min(shape.items, anchor + reach + 1))
+        )
+    neighbors: dict[int, set[int]] = {}
+    for src, dst in pairs:
+        neighbors.setdefault(src, set()).add(dst)
+        neighbors.setdefault(dst, set()).add(src)
+    gone = {anchor}  # keep the anchor, for readability
+    for nr in range(1, shape.filters):
+        candidates = [i for i in kept if i not in gone]
+        if not candidates:
+            break
+        target = rng.choice(candidates)
+        reach = 1 + nr % 2
+        lines.append(f"~<>{reach} {_item_name(target)}")
+        ring = {target}
+        for _ in range(reach):
+            ring |= {n for i in ring for n in neighbors.get(i, ())}
+        gone |= ring
+    return lines
+
+
+def _externals(shape: Shape) -> tuple[list[str], list[str], str]:
+    """Return (referrer lines, connection lines, text of referred file)."""
+    names = [f"X{nr}" for nr in range(shape.externals)]
+    refs = [f"process {EXTERNAL_FILE}:{name}" for name in names]
+    conns = [
+        f"{name} --> {_item_name(nr % shape.items)} x{nr}"
+        for nr, name in enumerate(names)
+    ]
+    text = "".join(f"process {name} External {name}\n" for name in names)
+    return refs, conns, text
+
+
+def _split(lines: list[str], nb_chunks: int) -> list[list[str]]:
+    size = -(-len(lines) // nb_chunks) if lines else 0
+    return [lines[i * size : (i + 1) * size] for i in range(nb_chunks)]
+
+
+def generate_dfd(shape: Shape) -> dict[str, str]:
+    """Return the texts of a synthetic diagram, by file name.
+
+    Items are spread over the main file and include_depth nested
+    includees; the main file holds connections, frames and filters.
+    """
+    rng = random.Random(shape.seed)
+    items = _items(shape, rng)
+    chunks = _split(items, shape.include_depth + 1)
+    files: dict[str, str] = {}
+    for level in range(1, shape.include_depth + 1):
+        lines = list(chunks[level])
+        if level < shape.include_depth:
+            lines.append(f"#include {_part_name(level + 1)}")
+        files[_part_name(level)] = "\n".join(lines) + "\n"
+
+    main = []
+    refs, ext_conns, ext_text = _externals(shape)
+    if refs:
+        files[EXTERNAL_FILE] = ext_text
+        main += refs
+    if shape.include_depth:
+        main.append(f"#include {_part_name(1)}")
+    main += chunks[0]
+    pairs = _connections(shape, rng)
+    main += _connection_lines(pairs)
+    main += ext_conns
+    main += _frames(shape)
+    main += _filters(shape, pairs, rng)
+    files[MAIN_FILE] = "\n".join(main) + "\n"
+    return files
+
+
+def generate_markdown(shape: Shape, nb_snippets: int) -> str:
+    """Return a markdown document of nb_snippets diagrams of the shape.
+
+    Each snippet includes a shared fragment, and refers to the output
+    item of the previous snippet.
+    """
+    rng = random.Random(shape.seed)
+    blocks = [
+        "```data-flow-diagram #common\n"
+        + "\n".join(f"entity C{nr} Common {nr}" for nr in range(10))
+        + "\n```\n"
+    ]
+    for nb in range(nb_snippets):
+        lines = ["#include #common", f"process Out{nb} Output {nb}"]
+        if nb:
+            lines.append(f"process #snippet-{nb - 1}:Out{nb - 1}")
+            lines.append(f"Out{nb - 1} --> {_item_name(0)} in")
+        lines += _items(shape, rng)
+        lines.append(f"{_item_name(shape.items - 1)} --> Out{nb} out")
+        pairs = _connections(shape, rng)
+        lines += _connection_lines(pairs)
+        lines += [f"C{nr % 10} --> {_item_name(nr)} c{nr}" for nr in range(3)]
+        lines += _frames(shape)
+        lines += _filters(shape, pairs, rng)
+        blocks.append(
+            f"```data-flow-diagram snippet-{nb}.svg\n"
+            + "\n".join(lines)
+            + "\n```\n"
+        )
+    return "\n".join(blocks)
+
+
+def write_files(files: dict[str, str], directory: Path) -> None:
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, text in files.items():
+        (directory / name).write_text(text)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    for field in fields(Shape):
+        parser.add_argument(
+            "--" + field.name.replace("_", "-"),
+            type=type(field.default),
+            default=field.default,
+        )
+    parser.add_argument(
+        "--markdown",
+        type=int,
+        metavar="NB_SNIPPETS",
+        help="generate a markdown document of NB_SNIPPETS diagrams",
+    )
+    parser.add_argument("DIRECTORY", type=Path)
+    args = parser.parse_args()
+    shape = Shape(**{f.name: getattr(args, f.name) for f in fields(Shape)})
+    if args.markdown is None:
+        write_files(generate_dfd(shape), args.DIRECTORY)
+    else:
+        write_files(
+            {"main.md": generate_markdown(shape, args.markdown)},
+            args.DIRECTORY,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""Time the DFD pipeline on synthetic inputs and on the NR corpus.
+
+Each scenario is a series of synthetic diagrams of growing size (see
+generate.py). Each dfd.build() stage is timed separately, by wrapping the
+function of the stage; the growth exponent of each series (how time
+scales with size: 1 is linear, 2 quadratic) is reported too. The
+non-regression corpus (tests/non-regression) is replayed as well.
+
+Results are written as JSON. Superlinear series (growth exponent above
+1.5) are reported as regressions, and so are, given a baseline (a
+previous result file), the stages and growth exponents that got slower;
+the exit status is then 1:
+
+    benchmarks/run.py -o new.json --compare baseline.json
+
+Timings depend on the machine and its load: compare results obtained on
+the same, quiet machine, and raise --tolerance if it is noisy.
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "src"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from data_flow_diagram import cli, dfd, model  # noqa: E402
+from data_flow_diagram.dsl import (  # noqa: E402
+    checker,
+    dependency_checker,
+    filters,
+    parser,
+    scanner,
+)
+
+import generate  # noqa: E402
+from generate import Shape  # noqa: E402
+
+NR_DIR = ROOT_DIR / "tests" / "non-regression"
+
+# The stages of dfd.build(), in order: (module, function name, stage name)
+STAGES = [
+    (scanner, "scan", "scan"),
+    (parser, "parse", "parse"),
+    (dependency_checker, "check", "dependencies"),
+    (checker, "check", "check"),
+    (dfd, "resolve_star_endpoints", "resolve"),
+    (filters, "handle_filters", "filter"),
+    (dfd, "remove_unused_hidables", "hidables"),
+    (dfd, "handle_options", "options"),
+    (dfd, "generate_dot", "generate"),
+]
+
+# Series of growing size: (name, shapes)
+SIZES = [500, 1000, 2000, 4000]
+SCENARIOS: list[tuple[str, list[Shape]]] = [
+    (
+        "items",
+        [Shape(items=n, connections=n) for n in SIZES],
+    ),
+    (
+        "connections",
+        [Shape(items=200, connections=n * 2) for n in SIZES],
+    ),
+    (
+        "frames",
+        [Shape(items=n, connections=n, frames=n // 10) for n in SIZES],
+    ),
+    (
+        "filters",
+        [Shape(items=n, connections=n * 2, filters=8) for n in SIZES],
+    ),
+    (
+        "filters-near",
+        [
+            Shape(items=n, connections=n * 2, filters=8, distance="3")
+            for n in SIZES
+        ],
+    ),
+    (
+        "includes",
+        [Shape(items=n, connections=n, include_depth=8) for n in SIZES],
+    ),
+    (
+        "externals",
+        [Shape(items=n, connections=n, externals=n // 4) for n in SIZES],
+    ),
+]
+MARKDOWN_SNIPPETS = [5, 10, 20, 40]
+MARKDOWN_SHAPE = Shape(items=100, connections=150, frames=5, filters=3)
+
+# Comparison: a time is a regression if both thresholds are exceeded
+REGRESSION_RATIO = 1.25
+REGRESSION_MIN_SECONDS = 0.005
+REGRESSION_GROWTH = 0.4  # increase of growth exponent
+MAX_GROWTH = 1.5  # beyond, a series is superlinear, baseline or not
+
+
+class StageTimer:
+    """Accumulate the time spent in each stage, while installed.
+
+    Stages nested in others (e.g. the build of a referred diagram, during
+    the dependencies stage) are counted in the outer stage only.
+    """
+
+    def __init__(self) -> None:
+        self.times: dict[str, float] = {}
+        self._depth = 0
+
+    def _wrap(self, func: Callable[..., Any], stage: str) -> Callable[..., Any]:
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            if self._depth:
+                return func(*args, **kwargs)
+            self._depth += 1
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self.times[stage] = self.times.get(stage, 0.0) + elapsed
+                self._depth -= 1
+
+        return timed
+
+    @contextlib.contextmanager
+    def installed(self) -> Iterator["StageTimer"]:
+        saved = [
+            (module, name, getattr(module, name)) for module, name, _ in STAGES
+        ]
+        for module, name, stage in STAGES:
+            setattr(module, name, self._wrap(getattr(module, name), stage))
+        try:
+            yield self
+        finally:
+            for module, name, func in saved:
+                setattr(module, name, func)
+
+
+def _options() -> model.Options:
+    return model.Options(
+        format="dot",
+        background_color=None,
+        no_graph_title=False,
+        no_check_dependencies=False,
+        debug=False,
+    )
+
+
+def build_file(path: Path) -> None:
+    """Build a .dfd file, as the CLI does, without writing its output."""
+    text = path.read_text()
+    provenance = model.SourceLine("", f"<file:{path}>", None, 0)
+    dfd.build(provenance, text, path.stem, _options())
+
+
+def build_markdown(path: Path) -> None:
+    """Build the snippets of a markdown file, writing their DOT files."""
+    with open(path) as fp:
+        cli.handle_markdown_source(_options(), str(path), fp)
+
+
+def measure(
+    func: Callable[[Path], None], path: Path, repeat: int
+) -> dict[str, Any]:
+    """Time func(path), keeping the fastest of repeat runs, per stage.
+
+    As with timeit, the garbage collector is disabled while timing.
+    """
+    total = math.inf
+    stages: dict[str, float] = {}
+    for _ in range(repeat):
+        timer = StageTimer()
+        gc.collect()
+        gc.disable()
+        try:
+            with timer.installed(), contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                func(path)
+                elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        total = min(total, elapsed)
+        timer.times["other"] = max(0.0, elapsed - sum(timer.times.values()))
+        for stage, seconds in timer.times.items():
+            stages[stage] = min(stages.get(stage, math.inf), seconds)
+    return {"total": total, "stages": stages}
+
+
+def growth(sizes: list[int], totals: list[float]) -> float:
+    """Exponent of the time vs. size power law (least-squares fit)."""
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(total) for total in totals]
+    x_mean, y_mean = sum(xs) / len(xs), sum(ys) / len(ys)
+    return sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys)) / sum(
+        (x - x_mean) ** 2 for x in xs
+    )
+
+
+def run_scenarios(repeat: int, scale: float) -> dict[str, Any]:
+    results: dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cwd = os.getcwd()
+        os.chdir(tmp_dir)
+        try:
+            for name, shapes in SCENARIOS:
+                sizes, runs = [], []
+                for nr, shape in enumerate(shapes):
+                    shape = _scaled(shape, scale)
+                    directory = Path(tmp_dir) / f"{name}-{nr}"
+                    generate.write_files(
+                        generate.generate_dfd(shape), directory
+                    )
+                    os.chdir(directory)
+                    result = measure(
+                        build_file, Path(generate.MAIN_FILE), repeat
+                    )
+                    result["shape"] = shape.__dict__
+                    runs.append(result)
+                    sizes.append(max(shape.items, shape.connections))
+                    _report(f"{name}/{sizes[-1]}", result)
+                results[name] = {
+                    "runs": runs,
+                    "growth": growth(sizes, [r["total"] for r in runs]),
+                }
+
+            runs = []
+            directory = Path(tmp_dir) / "markdown"
+            directory.mkdir()
+            os.chdir(directory)
+            for nb_snippets in MARKDOWN_SNIPPETS:
+                path = Path(f"doc-{nb_snippets}.md")
+                shape = _scaled(MARKDOWN_SHAPE, scale)
+                path.write_text(generate.generate_markdown(shape, nb_snippets))
+                result = measure(build_markdown, path, repeat)
+                result["snippets"] = nb_snippets
+                runs.append(result)
+                _report(f"markdown/{nb_snippets}", result)
+            results["markdown"] = {
+                "runs": runs,
+                "growth": growth(MARKDOWN_SNIPPETS, [r["total"] for r in runs]),
+            }
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+def run_corpus(repeat: int) -> dict[str, Any]:
+    """Replay the non-regression corpus (from the repo root, as nr-test)."""
+    results: dict[str, Any] = {}
+    cwd = os.getcwd()
+    os.chdir(ROOT_DIR)
+    try:
+        for path in sorted(NR_DIR.glob("*.dfd")):
+            if "-err-" in path.name:
+                continue
+            path = path.relative_to(ROOT_DIR)
+            results[path.name] = measure(build_file, path, repeat)
+        for path in sorted(NR_DIR.glob("*.md")):
+            path = path.relative_to(ROOT_DIR)
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                # write the DOT files of snippets aside, not over goldens
+                text = path.read_text().replace(".dot\n", ".tmp\n")
+                tmp_path = Path(tmp_dir) / path.name
+                tmp_path.write_text(text)
+                results[path.name] = measure(build_markdown, tmp_path, repeat)
+                for tmp_file in NR_DIR.glob("*/*.tmp"):
+                    tmp_file.unlink()
+    finally:
+        os.chdir(cwd)
+    total = sum(r["total"] for r in results.values())
+    _report("non-regression", {"total": total})
+    return {"files": results, "total": total}
+
+
+def _scaled(shape: Shape, scale: float) -> Shape:
+    if scale == 1:
+        return shape
+    values = dict(shape.__dict__)
+    for key in ("items", "connections", "frames", "externals"):
+        values[key] = max(1, round(values[key] * scale)) if values[key] else 0
+    return Shape(**values)
+
+
+def _report(name: str, result: dict[str, Any]) -> None:
+    print(f"{name:30} {result['total'] * 1000:10.1f} ms", file=sys.stderr)
+
+
+def find_superlinear(results: dict[str, Any]) -> list[str]:
+    """Return descriptions of the series whose time grows too fast."""
+    return [
+        f"{name}: superlinear, growth exponent {scenario['growth']:.2f}"
+        for name, scenario in results["scenarios"].items()
+        if scenario["growth"] > MAX_GROWTH
+    ]
+
+
+def compare(
+    results: dict[str, Any],
+    baseline: dict[str, Any],
+    ratio: float = REGRESSION_RATIO,
+) -> list[str]:
+    """Return descriptions of the regressions of results vs. baseline."""
+    regressions = []
+
+    def check_time(name: str, new: float, old: float) -> None:
+        if new > old * ratio and new - old > REGRESSION_MIN_SECONDS:
+            regressions.append(
+                f"{name}: {old * 1000:.1f} -> {new * 1000:.1f} ms"
+                f" (x{new / old:.2f})"
+            )
+
+    def check_run(name: str, new: dict[str, Any], old: dict[str, Any]) -> None:
+        check_time(name, new["total"], old["total"])
+        for stage, seconds in new.get("stages", {}).items():
+            if stage in old.get("stages", {}):
+                check_time(f"{name} [{stage}]", seconds, old["stages"][stage])
+
+    old_scenarios = baseline.get("scenarios", {})
+    for name, new in results["scenarios"].items():
+        if name not in old_scenarios:
+            continue
+        old = old_scenarios[name]
+        if new["growth"] > old["growth"] + REGRESSION_GROWTH:
+            regressions.append(
+                f"{name}: growth exponent {old['growth']:.2f}"
+                f" -> {new['growth']:.2f}"
+            )
+        for nr, (new_run, old_run) in enumerate(zip(new["runs"], old["runs"])):
+            check_run(f"{name}/{nr}", new_run, old_run)
+
+    old_files = baseline.get("corpus", {}).get("files", {})
+    for name, new_run in results["corpus"]["files"].items():
+        if name in old_files:
+            check_run(name, new_run, old_files[name])
+    return regressions
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    arg_parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        default=Path("benchmarks/latest.json"),
+        help="result file (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "-c", "--compare", type=Path, help="baseline result file to compare to"
+    )
+    arg_parser.add_argument(
+        "-t",
+        "--tolerance",
+        type=float,
+        default=REGRESSION_RATIO,
+        help="slowdown ratio flagged as regression (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        default=5,
+        help="runs per measure, the fastest is kept (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "-s",
+        "--scale",
+        type=float,
+        default=1.0,
+        help="factor applied to the sizes of synthetic diagrams",
+    )
+    args = arg_parser.parse_args()
+
+    results = {
+        "python": platform.python_version(),
+        "version": cli.find_version(),
+        "scale": args.scale,
+        "scenarios": run_scenarios(args.repeat, args.scale),
+        "corpus": run_corpus(args.repeat),
+    }
+    args.output.write_text(json.dumps(results, indent=2) + "\n")
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    problems = find_superlinear(results)
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        if baseline.get("scale") != args.scale:
+            sys.exit(
+                f"Cannot compare to {args.compare}: it was run with"
+                f" --scale {baseline.get('scale')}"
+            )
+        problems += compare(results, baseline, args.tolerance)
+    for problem in problems:
+        print(f"REGRESSION: {problem}", file=sys.stderr)
+    if problems:
+        sys.exit(1)
+    if args.compare:
+        print(f"No regression vs. {args.compare}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
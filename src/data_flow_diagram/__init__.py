@@ -5,8 +5,24 @@ continue to work:
   - setup.py console_scripts: ``data_flow_diagram:main``
   - dev wrapper: ``./data-flow-diagram`` calls ``main()``
   - tests: ``from data_flow_diagram import parse_args, main``
+  - embedding tools: ``from data_flow_diagram import render_many``
 """
 
-from .cli import VERSION, main, parse_args
+from typing import Any
 
-__all__ = ["VERSION", "main", "parse_args"]
+from .cli import main, parse_args
+
+__all__ = ["VERSION", "main", "parse_args", "render_many"]
+
+
+def __getattr__(name: str) -> Any:
+    """Provide VERSION and render_many when first used, for a fast startup."""
+    if name == "VERSION":
+        from .cli import find_version
+
+        return find_version()
+    if name == "render_many":
+        from .dfd import render_many
+
+        return render_many
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,192 @@
+"""Expansion of the inputs of a batch run: files, directories and globs.
+
+Directories are searched recursively for diagram sources (DFD and
+markdown files), skipping hidden directories, and what the ignore files
+(.dfdignore) of the searched directories exclude; so are the matches of
+glob patterns, below the fixed part of the pattern. Their syntax is a
+subset of that of .gitignore: one pattern per line, "#" comments;
+a pattern ending with "/" only matches directories; a pattern holding
+another "/" matches the path relative to the directory of the ignore
+file, else the name of files and directories at any depth below it.
+
+Inputs included by other inputs are fragments (e.g. common definitions),
+not diagrams: they are not built on their own.
+"""
+
+import fnmatch
+import glob
+import os
+
+from . import config, exception
+
+GLOB_CHARS = "*?["
+
+
+class IgnoreRules:
+    """The patterns of the ignore files found while walking directories."""
+
+    def __init__(self) -> None:
+        # (directory of the ignore file, pattern, directories only,
+        # anchored: matched against the path from the directory)
+        self._rules: list[tuple[str, str, bool, bool]] = []
+        self._read: set[str] = set()  # directories
+
+    def read(self, directory: str) -> None:
+        """Add the patterns of the ignore file of directory, if any."""
+        if directory in self._read:
+            return
+        self._read.add(directory)
+        path = os.path.join(directory, config.BATCH_IGNORE_FILE_NAME)
+        try:
+            with open(path, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return
+        for line in lines:
+            pattern = line.strip()
+            if not pattern or pattern.startswith("#"):
+                continue
+            dir_only = pattern.endswith("/")
+            pattern = pattern.rstrip("/")
+            anchored = "/" in pattern
+            self._rules.append(
+                (directory, pattern.lstrip("/"), dir_only, anchored)
+            )
+
+    def is_ignored(self, path: str, is_dir: bool) -> bool:
+        for directory, pattern, dir_only, anchored in self._rules:
+            if dir_only and not is_dir:
+                continue
+            relative = os.path.relpath(path, directory)
+            if relative.split(os.sep)[0] == os.pardir:
+                continue  # not below the ignore file
+            if anchored:
+                subject = relative.replace(os.sep, "/")
+            else:
+                subject = os.path.basename(path)
+            if fnmatch.fnmatchcase(subject, pattern):
+                return True
+        return False
+
+
+def is_markdown(path: str) -> bool:
+    """Tell if an input of a batch run is a markdown file."""
+    return path.endswith(config.BATCH_MARKDOWN_SUFFIXES)
+
+
+def _is_source(name: str) -> bool:
+    return name.endswith(config.BATCH_DFD_SUFFIXES) or is_markdown(name)
+
+
+def _walk(top: str) -> list[str]:
+    """Return the diagram sources below a directory, in sorted order."""
+    found = []
+    rules = IgnoreRules()
+    for directory, dirs, files in os.walk(top):
+        rules.read(directory)
+        dirs[:] = sorted(
+            d
+            for d in dirs
+            if not d.startswith(".")
+            and not rules.is_ignored(os.path.join(directory, d), True)
+        )
+        found += [
+            os.path.join(directory, name)
+            for name in sorted(files)
+            if _is_source(name)
+            and not rules.is_ignored(os.path.join(directory, name), False)
+        ]
+    return found
+
+
+def is_batch(args: list[str]) -> bool:
+    """Tell if inputs ask for a batch run, rather than a single input."""
+    if len(args) != 1:
+        return len(args) > 1
+    return os.path.isdir(args[0]) or _is_glob(args[0])
+
+
+def _is_glob(arg: str) -> bool:
+    return any(c in arg for c in GLOB_CHARS) and not os.path.exists(arg)
+
+
+def _glob(pattern: str) -> list[str]:
+    """Return the paths matching a glob pattern, in sorted order."""
+    # fixed directory part of the pattern, where ignore files start
+    parts = pattern.split("/")
+    fixed = []
+    for part in parts[:-1]:
+        if any(c in part for c in GLOB_CHARS):
+            break
+        fixed.append(part)
+    top = "/".join(fixed) or ("/" if pattern.startswith("/") else ".")
+
+    rules = IgnoreRules()
+
+    def is_kept(path: str) -> bool:
+        directory = top
+        names = os.path.relpath(path, top).split(os.sep)
+        for name in names[:-1]:
+            rules.read(directory)
+            directory = os.path.join(directory, name)
+            if rules.is_ignored(directory, True):
+                return False
+        rules.read(directory)
+        return not rules.is_ignored(path, os.path.isdir(path))
+
+    return [
+        path
+        for path in sorted(glob.glob(pattern, recursive=True))
+        if is_kept(path)
+    ]
+
+
+def find_inputs(args: list[str]) -> list[str]:
+    """Expand input args into the paths of the files to build.
+
+    Files are kept as given, directories replaced by the sources below
+    them, and glob patterns ("**" included) by the files and directories
+    they match. Duplicates are dropped. Raises DfdException if an arg
+    matches nothing.
+    """
+    paths: dict[str, None] = {}  # ordered set, by normalized path
+    for arg in args:
+        matches = _glob(arg) if _is_glob(arg) else [arg]
+        if not matches or not os.path.exists(matches[0]):
+            raise exception.DfdException(f'No such input: "{arg}"')
+        for match in matches:
+            if os.path.isdir(match):
+                paths.update(dict.fromkeys(map(os.path.normpath, _walk(match))))
+            else:
+                paths[os.path.normpath(match)] = None
+    return list(paths)
+
+
+def drop_included(paths: list[str]) -> list[str]:
+    """Drop the inputs that other inputs include."""
+    included: set[str] = set()
+    for path in paths:
+        included |= _find_included(path)
+    return [path for path in paths if os.path.realpath(path) not in included]
+
+
+def _find_included(path: str) -> set[str]:
+    """Return the real paths of the files an input includes directly."""
+    from . import markdown, model
+    from .dsl import scanner
+
+    try:
+        with open(path, encoding="utf-8") as f:
+            if is_markdown(path):
+                texts = [snippet.text for snippet in markdown.read_snippets(f)]
+            else:
+                texts = [f.read()]
+    except (OSError, UnicodeDecodeError, exception.DfdException):
+        return set()  # reported when built
+    directory = os.path.dirname(path)  # includes are relative to it
+    return {
+        os.path.realpath(os.path.join(directory, name))
+        for text in texts
+        for _, _, name in scanner.split_lines(text)
+        if name is not None and not name.startswith(model.SNIPPET_PREFIX)
+    }
@@ -11,36 +11,63 @@ examples.
 This module parses the commandline args, prepares the I/Os and calls the stuff.
 """
 
+from __future__ import annotations
+
 import argparse
+import contextlib
+import functools
+import io
 import os
 import sys
-import tempfile
-from typing import TextIO
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, TextIO
+
+from . import config, exception, model
+from .console import CHANNELS, CLI, print_error, print_warning, set_debug
+from .timings import TIMINGS
+
+# The other modules are imported where needed, so that a run only imports
+# what it uses: e.g. "-f dot" needs no Graphviz, nor render cache.
+if TYPE_CHECKING:
+    from . import manifest
+    from .dsl import dependency_checker
+    from .rendering import cache, graphviz
 
-from . import dfd, exception, markdown, model
-from .console import dprint, print_error, set_debug
-from .rendering import graphviz
 
-from importlib.metadata import PackageNotFoundError, version
+@functools.cache
+def find_version() -> str:
+    """Return the version of the package (slow: reads its metadata)."""
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        return version("data-flow-diagram")
+    except PackageNotFoundError:
+        return "undefined"
+
 
-try:
-    VERSION = version("data-flow-diagram")
-except PackageNotFoundError:
-    VERSION = "undefined"
+def __getattr__(name: str) -> str:
+    """Provide VERSION, resolved when first used."""
+    if name == "VERSION":
+        return find_version()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
-def parse_args() -> argparse.Namespace:
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
     assert __doc__ is not None
     description, epilog = [each.strip() for each in __doc__.split("-----")[:2]]
 
     parser = argparse.ArgumentParser(description=description, epilog=epilog)
 
     parser.add_argument(
-        "INPUT_FILE",
+        "INPUT_FILES",
         action="store",
-        default=None,
-        nargs="?",
-        help="DFD input file; " "if omitted, stdin is used",
+        nargs="*",
+        metavar="INPUT_FILE",
+        help="DFD input file; if omitted, stdin is used; several files, "
+        "directories or glob patterns are built in one batch: "
+        "directories are searched for .dfd and .md files, except those "
+        f"excluded by {config.BATCH_IGNORE_FILE_NAME} files, markdown "
+        "files being taken as such; failures are summed up at the end",
     )
 
     parser.add_argument(
@@ -69,7 +96,10 @@ def parse_args() -> argparse.Namespace:
         default="svg",
         help="output format: gif, jpg, tiff, bmp, pnm, eps, "
         "pdf, svg (any supported by Graphviz), or dot "
-        "(raw Graphviz DOT text); default is svg",
+        "(raw Graphviz DOT text); default is svg; a comma-separated "
+        "list, e.g. svg,png,pdf, renders each format from a single "
+        "layout, into files named after the output, with the "
+        "format as extension",
     )
 
     parser.add_argument(
@@ -90,6 +120,23 @@ def parse_args() -> argparse.Namespace:
         help="suppress graph title",
     )
 
+    parser.add_argument(
+        "--no-provenance-comments",
+        action="store_true",
+        default=False,
+        help="omit the comments telling the source line of each DOT statement",
+    )
+
+    parser.add_argument(
+        "--layout-budget",
+        default=None,
+        help="'fast' trades layout quality for speed, bounding the Graphviz "
+        "effort by the size of the graph, and using the sfdp engine for "
+        "graphs of more than N items, given as 'fast:N' (default: "
+        f"{config.FAST_LAYOUT_MAX_NODES}), as 'style fast-layout [N]' "
+        "does; 'full' ignores that style; default is as styled",
+    )
+
     parser.add_argument(
         "--no-check-dependencies",
         action="store_true",
@@ -97,6 +144,89 @@ def parse_args() -> argparse.Namespace:
         help="suppress dependencies checking",
     )
 
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="directory of the cache of rendered images, reused as long "
+        "as the DOT text, engine, format and Graphviz version are the "
+        "same; default is $XDG_CACHE_HOME/data-flow-diagram",
+    )
+
+    parser.add_argument(
+        "--cache-layouts",
+        action="store_true",
+        default=False,
+        help="cache layouts too, to draw diagrams differing only by colors "
+        "(e.g. themes) without laying them out again",
+    )
+
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        default=False,
+        help="neither use nor fill the cache of rendered images",
+    )
+
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=None,
+        help="number of Graphviz processes rendering snippets "
+        "concurrently in markdown mode; default is the number of CPUs",
+    )
+
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        default=False,
+        help="in markdown mode, only build the snippets whose text, "
+        "includes or referred graphs changed since the previous build, "
+        "as recorded in a manifest file next to the outputs",
+    )
+
+    parser.add_argument(
+        "--watch",
+        "-w",
+        action="store_true",
+        default=False,
+        help="keep running, and rebuild the outputs whenever INPUT_FILE "
+        "or a file it includes or refers to changes; in markdown mode, "
+        "only the snippets depending on the changes are rebuilt",
+    )
+
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        default=False,
+        help="run as a daemon, serving the runs of this command from warm "
+        "processes (--jobs of them); runs are forwarded to the daemon "
+        f"when it listens on its socket (see ${config.DAEMON_SOCKET_ENV_VAR})",
+    )
+
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        default=False,
+        help="report the wall time, CPU time and memory peak of each stage, "
+        "and the Graphviz time and DOT size of each diagram; in markdown "
+        "mode, the slowest snippets are listed; tracing memory slows the "
+        "run down",
+    )
+
+    parser.add_argument(
+        "--timings-format",
+        choices=["text", "json"],
+        default="text",
+        help="format of the --timings report; default is text",
+    )
+
+    parser.add_argument(
+        "--timings-file",
+        default=None,
+        help="file to write the --timings report to; default is stderr",
+    )
+
     parser.add_argument(
         "--debug",
         action="store_true",
@@ -104,6 +234,14 @@ def parse_args() -> argparse.Namespace:
         help="emit debug messages",
     )
 
+    parser.add_argument(
+        "--debug-channels",
+        default=None,
+        help="comma-separated stages to emit debug messages for, among: "
+        + ", ".join(CHANNELS)
+        + "; implies --debug; default is all",
+    )
+
     parser.add_argument(
         "--version",
         "-V",
@@ -111,7 +249,46 @@ def parse_args() -> argparse.Namespace:
         help="print the version and exit",
     )
 
-    return parser.parse_args()
+    return parser.parse_args(argv)
+
+
+def open_render_cache(options: model.Options) -> cache.RenderCache | None:
+    """Return the render cache selected by the options, if any."""
+    if options.cache_dir is None:
+        return None
+    from .rendering import cache
+
+    return cache.RenderCache(options.cache_dir, layouts=options.cache_layouts)
+
+
+def split_formats(fmt: str) -> list[str]:
+    """Split a comma-separated list of output formats."""
+    formats = [f.strip() for f in fmt.split(",")]
+    if not all(formats) or len(set(formats)) < len(formats):
+        raise exception.DfdException(f'Invalid list of formats "{fmt}"')
+    return formats
+
+
+def resolve_outputs(output_path: str, fmt: str) -> dict[str, str]:
+    """Return the output path of each format, given the --format value.
+
+    An output path like "name.{svg,png}" gives its own list of formats.
+    The path of a single format is used as is; with several formats, the
+    extension of the path is replaced by each format.
+    """
+    base, brace, formats = output_path.rpartition(".{")
+    if brace and formats.endswith("}"):
+        fmt = formats[:-1]
+    else:
+        base = os.path.splitext(output_path)[0]
+    outputs = split_formats(fmt)
+    if len(outputs) == 1 and not brace:
+        return {outputs[0]: output_path}
+    if output_path == "-":
+        raise exception.DfdException(
+            "Several output formats need an output file, not stdout"
+        )
+    return {f: f"{base}.{f.split(':')[0]}" for f in outputs}
 
 
 def write_output(
@@ -119,113 +296,694 @@ def write_output(
     output_path: str,
     fmt: str,
     graph_options: model.GraphOptions,
+    render_cache: cache.RenderCache | None = None,
 ) -> None:
-    """Write pipeline output (DOT text or rendered image) to file or stdout."""
-    if fmt == "dot":
-        if output_path == "-":
+    """Write pipeline output (DOT text or rendered images) to file or stdout.
+
+    fmt may be a list of formats: see resolve_outputs().
+    """
+    outputs = resolve_outputs(output_path, fmt)
+    if "dot" in outputs:
+        path = outputs.pop("dot")
+        if path == "-":
             print(dot_text)
         else:
-            with open(output_path, "w") as f:
+            with open(path, "w") as f:
                 f.write(dot_text)
-    elif output_path == "-":
-        with tempfile.TemporaryDirectory() as d:
-            path = os.path.join(d, "output." + fmt)
-            graphviz.generate_image(graph_options, dot_text, path, fmt)
-            with open(path) as f:
-                print(f.read())
-    else:
-        graphviz.generate_image(graph_options, dot_text, output_path, fmt)
+    if not outputs:
+        return
+
+    from .rendering import graphviz
+
+    if len(outputs) > 1:
+        # one Graphviz run for all formats
+        jobs = [
+            graphviz.ImageJob(graph_options, dot_text, path, f, output_path)
+            for f, path in outputs.items()
+        ]
+        graphviz.generate_images(jobs, 1, render_cache)
+        return
+
+    [(fmt, path)] = outputs.items()
+    with TIMINGS.record_graphviz(output_path):
+        if path == "-":
+            sys.stdout.flush()  # before the image bytes
+            graphviz.pipe_image(
+                graph_options, dot_text, sys.stdout.buffer, fmt, render_cache
+            )
+        else:
+            graphviz.generate_image(
+                graph_options, dot_text, path, fmt, render_cache
+            )
+
+
+@dataclass
+class MarkdownBuild:
+    """Snippets of a markdown source built, with the images to render."""
+
+    snippets: model.Snippets
+    image_jobs: list[graphviz.ImageJob]
+    # output paths, fingerprint and sources of each snippet built
+    built: list[tuple[list[str], str, set[str]]]
+    nb_skipped: int
+    build_manifest: manifest.Manifest | None
+    error: exception.DfdException | None  # that stopped the build
 
 
 def handle_markdown_source(
-    options: model.Options, provenance: str, input_fp: TextIO
+    options: model.Options,
+    provenance: str,
+    input_fp: TextIO,
+    build_manifest: manifest.Manifest | None = None,
 ) -> None:
-    """Call build() for the markdown case: isolate snippets and call build() for each."""
+    """Call build() for the markdown case: isolate snippets and call build() for each.
+
+    Snippets recorded as up to date in *build_manifest* are skipped. If not
+    given, a manifest is used in --incremental mode.
+    """
+    from .rendering import graphviz
+
+    build = build_markdown_source(options, provenance, input_fp, build_manifest)
+
+    # render images in batches, one Graphviz process per batch
+    graphviz.generate_images(
+        build.image_jobs, options.jobs, open_render_cache(options)
+    )
+    finish_markdown_source(build)
+
+
+def build_markdown_source(
+    options: model.Options,
+    provenance: str,
+    input_fp: TextIO,
+    build_manifest: manifest.Manifest | None = None,
+    graph_registry: dependency_checker.GraphRegistry | None = None,
+    claim_outputs: Callable[[list[str]], None] | None = None,
+) -> MarkdownBuild:
+    """Build the snippets of a markdown source, up to their DOT text.
+
+    DOT outputs are written; images are left to render, before calling
+    finish_markdown_source(). On error, the snippets built before are
+    kept. The output paths of each snippet are first passed to
+    *claim_outputs*, if given, which may refuse them by raising a
+    DfdException.
+    """
+    from . import dfd, manifest, markdown
+    from .dsl import dependency_checker
+    from .rendering import graphviz
 
     # read MD file and extract snippets with their context (line number, provenance, etc.)
-    text = input_fp.read()
-    snippets = markdown.extract_snippets(text)
+    snippets = list(markdown.read_snippets(input_fp))
     markdown.check_snippets_unicity(provenance, snippets)
     snippets_params = markdown.make_snippets_params(provenance, snippets)
 
-    # build and write output for each snippet
+    # build each snippet; on error, still render the snippets built before
+    if build_manifest is None and options.incremental:
+        build_manifest = manifest.Manifest()
+    build = MarkdownBuild(snippets, [], [], 0, build_manifest, None)
+    if graph_registry is None:
+        graph_registry = dependency_checker.GraphRegistry()  # for snippets
     for params in snippets_params:
         title = os.path.splitext(params.file_name)[0]
-        dot_text, graph_options = dfd.build(
-            params.root,
-            params.input_fp.read(),
-            title,
-            options,
-            snippet_by_name=params.snippet_by_name,
+        outputs = resolve_outputs(params.file_name, options.format)
+        if claim_outputs is not None:
+            try:
+                claim_outputs(list(outputs.values()))
+            except exception.DfdException as e:
+                build.error = e
+                break
+        dfd_src = params.input_fp.read()
+        fingerprint = manifest.make_fingerprint(
+            dfd_src, options, find_version()
         )
-        write_output(dot_text, params.file_name, options.format, graph_options)
-        dprint(f"{sys.argv[0]}: generated {params.file_name}")
+        if build_manifest and all(
+            build_manifest.is_up_to_date(
+                path, fingerprint, params.snippet_by_name
+            )
+            for path in outputs.values()
+        ):
+            CLI.debug_print("%s: up to date %s", sys.argv[0], params.file_name)
+            build.nb_skipped += 1
+            continue
+
+        used_sources: set[str] = set()
+        try:
+            with TIMINGS.record_snippet(params.file_name):
+                dot_text, graph_options = dfd.build(
+                    params.root,
+                    dfd_src,
+                    title,
+                    options,
+                    snippet_by_name=params.snippet_by_name,
+                    used_sources=used_sources,
+                    graph_registry=graph_registry,
+                )
+        except exception.DfdException as e:
+            build.error = e
+            break
+        print_engine_warning(params.root, graph_options)
+        build.built.append((list(outputs.values()), fingerprint, used_sources))
+        for fmt, path in outputs.items():
+            if fmt == "dot":
+                write_output(dot_text, path, fmt, graph_options)
+                CLI.debug_print("%s: generated %s", sys.argv[0], path)
+            else:
+                build.image_jobs.append(
+                    graphviz.ImageJob(
+                        graph_options, dot_text, path, fmt, params.file_name
+                    )
+                )
+    return build
+
+
+def finish_markdown_source(build: MarkdownBuild) -> None:
+    """Once its images are rendered, record the build of a markdown source.
+
+    Raises the error that stopped the build, if any.
+    """
+    for job in build.image_jobs:
+        CLI.debug_print("%s: generated %s", sys.argv[0], job.output_path)
+
+    # record what was built, for the next incremental build
+    if build.build_manifest:
+        snippet_by_name = {s.name: s for s in build.snippets}
+        for output_paths, fingerprint, used_sources in build.built:
+            for output_path in output_paths:
+                build.build_manifest.record(
+                    output_path, fingerprint, used_sources, snippet_by_name
+                )
+        build.build_manifest.save()
+        print(
+            f"{len(build.built)} snippet(s) rebuilt, "
+            f"{build.nb_skipped} skipped",
+            file=sys.stderr,
+        )
+
+    if build.error is not None:
+        raise build.error
 
 
 def handle_dfd_source(
-    options: model.Options, provenance: str, input_fp: TextIO, output_path: str
+    options: model.Options,
+    provenance: str,
+    input_fp: TextIO,
+    output_path: str,
+    used_sources: set[str] | None = None,
 ) -> None:
     """Call build() for when the DFD is given by a path, and output to another path or stdout."""
+    from . import dfd
 
     root = model.SourceLine("", provenance, None, 0)
     title = "" if output_path == "-" else os.path.splitext(output_path)[0]
-    dot_text, graph_options = dfd.build(root, input_fp.read(), title, options)
-    write_output(dot_text, output_path, options.format, graph_options)
+    outputs = resolve_outputs(output_path, options.format)
+    if list(outputs) == ["dot"] and output_path != "-":
+        # stream the DOT text, replacing the output once complete
+        dot_path = outputs["dot"]
+        tmp_path = dot_path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f, TIMINGS.record_snippet(output_path):
+                _, graph_options = dfd.build(
+                    root,
+                    input_fp.read(),
+                    title,
+                    options,
+                    used_sources=used_sources,
+                    sink=f,
+                )
+            os.replace(tmp_path, dot_path)
+            print_engine_warning(root, graph_options)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return
 
+    if options.cache_dir is None and len(outputs) == 1 and "dot" not in outputs:
+        # stream the DOT text into Graphviz
+        from .rendering import graphviz
+
+        [(fmt, path)] = outputs.items()
+        with graphviz.EngineSink(fmt) as engine_sink:
+            try:
+                with TIMINGS.record_snippet(output_path):
+                    _, graph_options = dfd.build(
+                        root,
+                        input_fp.read(),
+                        title,
+                        options,
+                        used_sources=used_sources,
+                        sink=engine_sink.open,
+                    )
+                print_engine_warning(root, graph_options)
+            except BrokenPipeError:
+                pass  # the engine failed: reported by write_image()
+            with TIMINGS.record_graphviz(output_path):
+                if path == "-":
+                    sys.stdout.flush()  # before the image bytes
+                engine_sink.write_image(path, sys.stdout.buffer)
+        return
 
-def run(args: argparse.Namespace) -> None:
-    """Run the application with the given commandline args."""
+    with TIMINGS.record_snippet(output_path):
+        dot_text, graph_options = dfd.build(
+            root, input_fp.read(), title, options, used_sources=used_sources
+        )
+    print_engine_warning(root, graph_options)
+    write_output(
+        dot_text,
+        output_path,
+        options.format,
+        graph_options,
+        open_render_cache(options),
+    )
 
-    # resolve input source (file or stdin)
-    if args.INPUT_FILE is None:
-        input_fp = sys.stdin
-        provenance = "<stdin>"
+
+def handle_batch(options: model.Options, paths: list[str]) -> None:
+    """Build many inputs in this process (see batch.find_inputs()).
+
+    Each input is built from its own directory, as if run there: outputs
+    and included sources are relative to it. Markdown inputs get their
+    snippets built; the others are DFD sources, output next to them, under
+    the same name. The inputs share the
+    caches of included sources, the registry of referred graphs, and the
+    Graphviz batches. A failing input does not stop the others: its errors
+    are reported as they come, and the failed inputs listed at the end, by
+    a raised DfdException. An input writing an output of a previous input
+    fails.
+    """
+    from . import batch
+    from .dsl import dependency_checker
+    from .rendering import graphviz
+    from .rendering.cache import write_if_changed
+
+    graph_registry = dependency_checker.GraphRegistry()
+    failed: set[str] = set()
+
+    def fail(path: str, e: Exception) -> None:
+        print_error(f"ERROR: {e}")
+        failed.add(path)
+
+    def in_directory(path: str) -> contextlib.chdir[str]:
+        return contextlib.chdir(os.path.dirname(path) or ".")
+
+    # outputs by real path, with the input writing them
+    writers: dict[str, str] = {}
+
+    def claim_outputs(path: str, output_paths: list[str]) -> None:
+        for output_path in output_paths:
+            writer = writers.setdefault(os.path.realpath(output_path), path)
+            if writer != path:
+                raise exception.DfdException(
+                    f'Output "{output_path}" of "{path}" is also an output '
+                    f'of "{writer}"'
+                )
+
+    # phase 1: build all DOT texts, collecting the images to render
+    builds: dict[str, MarkdownBuild] = {}
+    image_jobs: list[tuple[str, graphviz.ImageJob]] = []
+    for path in paths:
+        provenance = f"<file:{path}>"
+        claim = functools.partial(claim_outputs, path)
+        try:
+            with open(path) as input_fp, in_directory(path):
+                if batch.is_markdown(path):
+                    build = builds[path] = build_markdown_source(
+                        options,
+                        provenance,
+                        input_fp,
+                        graph_registry=graph_registry,
+                        claim_outputs=claim,
+                    )
+                    jobs = build.image_jobs
+                else:
+                    jobs = _build_dfd_input(
+                        options,
+                        provenance,
+                        input_fp,
+                        os.path.basename(path),
+                        graph_registry,
+                        claim,
+                    )
+            for job in jobs:
+                job.output_path = os.path.join(
+                    os.path.dirname(path), job.output_path
+                )
+        except (OSError, UnicodeDecodeError, exception.DfdException) as e:
+            fail(path, e)
+            continue
+        image_jobs += [(path, job) for job in jobs]
+
+    # phase 2: render the images of all inputs together
+    results = graphviz.render_images(
+        [job for _, job in image_jobs], options.jobs, open_render_cache(options)
+    )
+    for (path, job), result in zip(image_jobs, results):
+        if isinstance(result, bytes):
+            write_if_changed(job.output_path, result)
+        else:
+            graphviz.print_failure(job.text, result)
+            failed.add(path)
+
+    # phase 3: record the markdown builds whose images were all rendered
+    for path, build in builds.items():
+        if path in failed:
+            continue
+        try:
+            with in_directory(path):
+                finish_markdown_source(build)
+        except exception.DfdException as e:
+            fail(path, e)
+
+    if failed:
+        names = [path for path in paths if path in failed]
+        raise exception.DfdException(
+            f"{len(names)} of {len(paths)} input(s) failed: " + ", ".join(names)
+        )
+
+
+def _build_dfd_input(
+    options: model.Options,
+    provenance: str,
+    input_fp: TextIO,
+    input_path: str,
+    graph_registry: dependency_checker.GraphRegistry,
+    claim_outputs: Callable[[list[str]], None],
+) -> list[graphviz.ImageJob]:
+    """Build a DFD input of a batch: write its DOT outputs, and return its
+    images to render. Its output paths are first passed to claim_outputs
+    (see build_markdown_source())."""
+    from . import dfd
+    from .rendering import graphviz
+
+    output_path = derive_output_path(input_path, options.format)
+    outputs = resolve_outputs(output_path, options.format)
+    claim_outputs(list(outputs.values()))
+    root = model.SourceLine("", provenance, None, 0)
+    title = os.path.splitext(output_path)[0]
+    with TIMINGS.record_snippet(output_path):
+        dot_text, graph_options = dfd.build(
+            root,
+            input_fp.read(),
+            title,
+            options,
+            graph_registry=graph_registry,
+        )
+    print_engine_warning(root, graph_options)
+    jobs = []
+    for fmt, path in outputs.items():
+        if fmt == "dot":
+            write_output(dot_text, path, fmt, graph_options)
+        else:
+            jobs.append(
+                graphviz.ImageJob(
+                    graph_options, dot_text, path, fmt, output_path
+                )
+            )
+    return jobs
+
+
+def print_engine_warning(
+    source: model.SourceLine, graph_options: model.GraphOptions
+) -> None:
+    """Warn if a graph is too large for fast layout by the engine of its
+    mode, and so laid out by the scalable one."""
+    from .rendering import templates as TMPL
+
+    if graph_options.use_scalable_engine:
+        print_warning(
+            f"WARNING: {source.raw_text}: {graph_options.nb_nodes} items, "
+            f"more than {graph_options.fast_layout_max_nodes} for fast layout:"
+            f" laid out by {TMPL.ENGINE_SCALABLE}, which ignores frames and "
+            "the flow direction"
+        )
+
+
+def derive_output_path(input_path: str, fmt: str) -> str:
+    """Output path of an input, when not given: same base name."""
+    return os.path.splitext(input_path)[0] + "." + split_formats(fmt)[0]
+
+
+def watch_source(
+    options: model.Options,
+    input_path: str,
+    output_path: str,
+    is_markdown: bool,
+) -> None:
+    """Build, then rebuild whenever the input or its sources change."""
+    from . import manifest, watch
+
+    provenance = f"<file:{input_path}>"
+
+    # build state, kept across rebuilds
+    build_manifest = manifest.Manifest(persistent=options.incremental)
+
+    def build() -> set[str]:
+        """Build, and return the paths of the files the outputs depend on."""
+        with open(input_path) as input_fp:
+            if is_markdown:
+                handle_markdown_source(
+                    options, provenance, input_fp, build_manifest
+                )
+                sources = build_manifest.find_sources()
+            else:
+                sources = set()
+                handle_dfd_source(
+                    options, provenance, input_fp, output_path, sources
+                )
+        return {s for s in sources if not s.startswith(model.SNIPPET_PREFIX)}
+
+    watch.Watcher(build, {input_path}).run()
+
+
+def _resolve_debug_channels(names: str | None) -> list[str] | None:
+    """Resolve the --debug-channels value; None means all channels."""
+    if names is None:
+        return None
+    channels = [name.strip() for name in names.split(",")]
+    unknown = [name for name in channels if name not in CHANNELS]
+    if unknown:
+        raise exception.DfdException(
+            f"Unknown debug channel(s): {', '.join(unknown)}; "
+            f"valid ones are: {', '.join(CHANNELS)}"
+        )
+    return channels
+
+
+def _resolve_jobs(jobs: int | None) -> int:
+    """Resolve the --jobs value, defaulting to the number of CPUs."""
+    if jobs is None:
+        return os.cpu_count() or 1
+    if jobs < 1:
+        raise exception.DfdException(
+            f"Number of jobs must be at least 1, not {jobs}"
+        )
+    return jobs
+
+
+def _resolve_layout_budget(
+    budget: str | None,
+) -> tuple[str | None, int | None]:
+    """Resolve the --layout-budget value: "fast", "fast:N" or "full".
+
+    Returns the budget, and the number of items beyond which the scalable
+    engine is used, if given.
+    """
+    if budget is None or budget in ("fast", "full"):
+        return budget, None
+    name, _, max_nodes = budget.partition(":")
+    if name == "fast" and max_nodes.isdigit():
+        return name, int(max_nodes)
+    raise exception.DfdException(
+        f'Invalid layout budget "{budget}": expected fast, fast:N or full'
+    )
+
+
+def _resolve_cache_dir(args: argparse.Namespace) -> str | None:
+    """Resolve the render cache directory; None means no cache."""
+    if args.no_cache or is_dot_only(args.format):
+        return None  # no rendering, no need for a cache
+    from .rendering import cache
+
+    return args.cache_dir or cache.find_default_directory()
+
+
+def is_dot_only(fmt: str) -> bool:
+    """Tell if the --format value asks for no rendering by Graphviz."""
+    return all(f.strip() == "dot" for f in fmt.split(","))
+
+
+def find_socket_path() -> str:
+    """Return the path of the render daemon socket, in a directory private
+    to the user."""
+    path = os.environ.get(config.DAEMON_SOCKET_ENV_VAR)
+    if path:
+        return path
+    if "XDG_RUNTIME_DIR" in os.environ:
+        directory = os.environ["XDG_RUNTIME_DIR"]
     else:
-        input_fp = open(args.INPUT_FILE)
-        provenance = f"<file:{args.INPUT_FILE}>"
+        import tempfile
+
+        directory = tempfile.gettempdir()
+    return os.path.join(
+        directory,
+        config.DAEMON_SOCKET_DIR_NAME.format(uid=os.getuid()),
+        config.DAEMON_SOCKET_NAME,
+    )
+
+
+def run(args: argparse.Namespace) -> None:
+    """Run the application with the given commandline args.
+
+    With --timings, the report is written even if the run fails.
+    """
+    if not args.timings:
+        _run(args)
+        return
+    TIMINGS.start()
+    try:
+        _run(args)
+    finally:
+        TIMINGS.stop()
+        if args.timings_file is None:
+            TIMINGS.report(args.timings_format, sys.stderr)
+        else:
+            with open(args.timings_file, "w") as f:
+                TIMINGS.report(args.timings_format, f)
+
 
+def _run(args: argparse.Namespace) -> None:
+    layout_budget, fast_layout_max_nodes = _resolve_layout_budget(
+        args.layout_budget
+    )
     options = model.Options(
         format=args.format,
         background_color=args.background_color,
         no_graph_title=args.no_graph_title,
+        provenance_comments=not args.no_provenance_comments,
+        layout_budget=layout_budget,
+        fast_layout_max_nodes=fast_layout_max_nodes,
         no_check_dependencies=args.no_check_dependencies,
-        debug=args.debug,
+        debug=args.debug or args.debug_channels is not None,
+        jobs=_resolve_jobs(args.jobs),
+        cache_dir=_resolve_cache_dir(args),
+        cache_layouts=args.cache_layouts,
+        incremental=args.incremental,
     )
 
-    set_debug(args.debug)
+    set_debug(options.debug, _resolve_debug_channels(args.debug_channels))
+
+    # several inputs, directories or globs: batch mode
+    if args.INPUT_FILES:
+        from . import batch
+
+        if batch.is_batch(args.INPUT_FILES):
+            if args.output_file is not None or args.watch:
+                raise exception.DfdException(
+                    "--output-file and --watch need a single input file"
+                )
+            handle_batch(
+                options,
+                batch.drop_included(batch.find_inputs(args.INPUT_FILES)),
+            )
+            return
+
+    # resolve input source (file or stdin)
+    input_file = args.INPUT_FILES[0] if args.INPUT_FILES else None
+    if input_file is None:
+        input_fp = sys.stdin
+        provenance = "<stdin>"
+    else:
+        input_fp = open(input_file)
+        provenance = f"<file:{input_file}>"
 
     # dispatch to markdown or single-source mode
-    if args.markdown:
+    if args.markdown and not args.watch:
         handle_markdown_source(options, provenance, input_fp)
         return
 
     # resolve output path (explicit, derived from input, or stdout)
     if args.output_file is None:
-        if args.INPUT_FILE is not None:
-            basename = os.path.splitext(args.INPUT_FILE)[0]
-            output_path = basename + "." + args.format
+        if input_file is not None:
+            output_path = derive_output_path(input_file, args.format)
         else:
             output_path = "-"
     else:
         output_path = args.output_file
 
+    # watch mode
+    if args.watch:
+        if input_file is None or (output_path == "-" and not args.markdown):
+            raise exception.DfdException(
+                "Watch mode needs an input file, and an output file"
+            )
+        input_fp.close()
+        watch_source(options, input_file, output_path, args.markdown)
+        return
+
     # DFD source
     handle_dfd_source(options, provenance, input_fp, output_path)
 
 
-def main() -> None:
-    """Entry point for the application script."""
+def forward(args: argparse.Namespace) -> None:
+    """Have the render daemon do the run, if one listens; then exit."""
+    if not hasattr(os, "getuid"):
+        return  # no Unix users, nor sockets (e.g. Windows): no daemon
+    socket_path = find_socket_path()
+    if not os.path.exists(socket_path):
+        return  # no daemon: spare the imports and the connection attempt
+    from . import daemon
 
-    graphviz.check_installed()
+    stdin_text = sys.stdin.read() if not args.INPUT_FILES else None
+    response = daemon.forward(
+        sys.argv[1:], find_version(), stdin_text, socket_path
+    )
+    if response is None:
+        if stdin_text is not None:
+            sys.stdin = io.StringIO(stdin_text)  # was consumed
+        return
+    sys.stdout.flush()
+    sys.stdout.buffer.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    sys.exit(response["exit"])
 
-    args = parse_args()
-    if args.version:
-        print("data-flow-diagram", VERSION)
-        sys.exit(0)
 
+def run_and_report(
+    args: argparse.Namespace, check_graphviz: bool = True
+) -> None:
+    """Run, reporting errors and exiting on failure."""
+    if check_graphviz and not is_dot_only(args.format):
+        from .rendering import graphviz
+
+        graphviz.check_installed()
     try:
         run(args)
     except exception.DfdException as e:
         text = f"ERROR: {e}"
         print_error(text)
         sys.exit(1)
+
+
+def main() -> None:
+    """Entry point for the application script."""
+
+    args = parse_args()
+    if args.version:
+        print("data-flow-diagram", find_version())
+        sys.exit(0)
+
+    if args.serve:
+        from . import daemon
+        from .rendering import graphviz
+
+        graphviz.check_installed()
+        try:
+            daemon.serve(
+                find_version(), _resolve_jobs(args.jobs), find_socket_path()
+            )
+        except exception.DfdException as e:
+            print_error(f"ERROR: {e}")
+            sys.exit(1)
+        return
+
+    # watch mode is interactive, hence always local
+    if not args.watch:
+        forward(args)
+    run_and_report(args)
@@ -8,3 +8,48 @@ DEFAULT_CONNECTION_TEXT_WIDTH = 14
 ITEM_EXTERNAL_ATTRS = "fillcolor=white color=grey fontcolor=grey"
 ITEM_STAR_ATTRS = 'fontname="times-italic" fontsize=10'
 FRAME_DEFAULT_ATTRS = "style=dashed"
+
+# Fast layout (--layout-budget fast, or style fast-layout): Graphviz tuning
+# attributes are derived from the node and edge counts
+
+FAST_LAYOUT_MAX_NODES = 1000  # default; beyond, the scalable engine is used
+FAST_LAYOUT_MAX_EDGES = 300  # beyond, straight edges, and a narrower search
+FAST_LAYOUT_NS_WORK = 10_000_000  # network simplex: iterations x nodes
+FAST_LAYOUT_MC_EDGES = 500  # crossing minimization: full effort up to that
+FAST_LAYOUT_SEARCH_SIZE = 10  # network simplex search, for many edges
+
+# Scanner cache (lines of included files), in number of files
+
+SCAN_CACHE_SIZE = 1024
+
+# Render cache
+
+CACHE_DIR_NAME = "data-flow-diagram"
+CACHE_MAX_BYTES = 256 * 1024 * 1024  # beyond, least recently used are evicted
+
+# Incremental markdown builds
+
+MANIFEST_FILE_NAME = ".data-flow-diagram.manifest.json"  # in output dirs
+
+# Watch mode
+
+WATCH_POLL_SECONDS = 0.2  # delay between checks of the watched files
+WATCH_DEBOUNCE_SECONDS = 0.1  # changes must settle that long before building
+
+# Render daemon
+
+# socket directory, private to the user, in $XDG_RUNTIME_DIR or the temp dir
+DAEMON_SOCKET_DIR_NAME = "data-flow-diagram-{uid}"
+DAEMON_SOCKET_NAME = "daemon.sock"
+DAEMON_SOCKET_ENV_VAR = "DATA_FLOW_DIAGRAM_SOCKET"  # overrides the above
+DAEMON_BUFFER_SIZE = 64 * 1024
+
+# Batch runs (several inputs, directories or globs)
+
+BATCH_DFD_SUFFIXES = (".dfd",)  # of the DFD sources found in directories
+BATCH_MARKDOWN_SUFFIXES = (".md",)  # of the markdown ones, in any batch
+BATCH_IGNORE_FILE_NAME = ".dfdignore"  # in searched directories
+
+# Timings report (--timings)
+
+TIMINGS_SLOWEST = 10  # snippets listed in markdown mode
@@ -1,5 +1,5 @@
 import sys
-from typing_extensions import Literal
+from typing import Iterable
 
 
 def print_error(text: str) -> None:
@@ -10,22 +10,50 @@ def print_error(text: str) -> None:
     print(text, file=sys.stderr)
 
 
-debug = False
+def print_warning(text: str) -> None:
+    """Print a warning message to stderr, in yellow if the output is a
+    terminal."""
+
+    if sys.stderr.isatty():
+        text = f"\033[33m{text}\033[0m"
+    print(text, file=sys.stderr)
+
+
+class DebugChannel:
+    """Debug messages of one processing stage, printed to stderr if enabled.
+
+    Messages are formatted lazily, %-style, so that a disabled channel costs
+    a mere test: pass the values to format as arguments, not in an f-string.
+    Guard costlier debug code with `if CHANNEL.enabled:`.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.enabled = False
+
+    def debug_print(self, message: str, *args: object) -> None:
+        if not self.enabled:
+            return
+        if args:
+            message = message % args
+        print(message, file=sys.stderr)
 
 
-def set_debug(value: bool) -> None:
-    global debug
-    debug = value
+# Debug channels, by processing stage
+SCANNER = DebugChannel("scanner")
+PARSER = DebugChannel("parser")
+FILTERS = DebugChannel("filters")
+DOT = DebugChannel("dot")
+CLI = DebugChannel("cli")
 
+CHANNELS = {c.name: c for c in (SCANNER, PARSER, FILTERS, DOT, CLI)}
 
-def dprint(
-    *values: object,
-    sep: str | None = " ",
-    end: str | None = "\n",
-    flush: Literal[False] = False,
-) -> None:
-    """Debug printing, to stderr, and only if debug mode is on."""
 
-    if not debug:
-        return
-    print(*values, sep=sep, end=end, flush=flush, file=sys.stderr)
+def set_debug(value: bool, names: Iterable[str] | None = None) -> None:
+    """Enable the named debug channels, or else all, if value; disable the
+    others (a daemon worker runs many requests)."""
+    for channel in CHANNELS.values():
+        channel.enabled = False
+    if value:
+        for name in CHANNELS if names is None else names:
+            CHANNELS[name].enabled = True
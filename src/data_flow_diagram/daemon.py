@@ -0,0 +1,237 @@
+"""Render daemon: serve CLI runs from warm processes, over a Unix socket.
+
+Each CLI run pays the interpreter startup, the imports, and the checks of
+Graphviz before doing any work. With `--serve`, a daemon listens on a
+local socket, and runs the requests it receives on a pool of worker
+processes, whose modules and caches (included sources, Graphviz version)
+stay warm. The CLI forwards its run to the daemon when one listens, and
+runs locally otherwise.
+
+Protocol: the client connects, sends a JSON request, and shuts down its
+sending side; the daemon answers with a JSON response, and closes the
+connection. A request holds the version of the client, its command-line
+args, its working directory, and the text of its standard input, if used.
+The response holds the exit code, and the standard outputs (stdout is
+base64-encoded, as images may be binary); or an error, e.g. on version
+mismatch, upon which the client runs locally.
+
+The socket is private to the user from its creation, in a directory that
+other users cannot write to; the client only connects to a socket of its
+user, so that another user cannot pose as the daemon.
+"""
+
+import base64
+import contextlib
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import stat
+import sys
+from concurrent.futures import Executor
+from typing import Any, Callable
+
+from . import config, exception
+
+# A worker's run: (args, working directory, stdin text) -> response
+Runner = Callable[[list[str], str, str | None], dict[str, Any]]
+
+
+def is_private(path: str) -> bool:
+    """Tell if a file is owned by the user, and private to them."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return st.st_uid == os.getuid() and not st.st_mode & 0o077
+
+
+def _receive(sock: socket.socket) -> bytes:
+    """Read until the peer shuts down its sending side."""
+    chunks = []
+    while chunk := sock.recv(config.DAEMON_BUFFER_SIZE):
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+# client side
+
+
+def forward(
+    args: list[str],
+    version: str,
+    stdin_text: str | None,
+    socket_path: str,
+) -> dict[str, Any] | None:
+    """Have the daemon run the CLI with args; None if it cannot.
+
+    Returns the response of the daemon, holding "exit", "stdout" (decoded)
+    and "stderr". A socket not private to the user, maybe of another user
+    posing as the daemon, is not connected to.
+    """
+    if not is_private(socket_path):
+        return None
+    request = {
+        "version": version,
+        "args": args,
+        "cwd": os.getcwd(),
+        "stdin": stdin_text,
+    }
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(socket_path)
+            sock.sendall(json.dumps(request).encode("utf-8"))
+            sock.shutdown(socket.SHUT_WR)
+            response: dict[str, Any] = json.loads(_receive(sock))
+    except (OSError, ValueError):
+        return None  # stale socket, or daemon gone: run locally
+    if "error" in response:
+        return None
+    response["stdout"] = base64.b64decode(response["stdout"])
+    return response
+
+
+# daemon side
+
+
+def run_request(
+    args: list[str], cwd: str, stdin_text: str | None
+) -> dict[str, Any]:
+    """Run the CLI in this (worker) process, capturing its outputs."""
+    from . import cli  # not at module level: cli imports us
+
+    os.chdir(cwd)
+    stdout = io.BytesIO()
+    stderr = io.StringIO()
+    out = io.TextIOWrapper(stdout, encoding="utf-8", write_through=True)
+    sys.stdin = io.StringIO(stdin_text or "")
+    try:
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(
+            stderr
+        ):
+            try:
+                cli.run_and_report(cli.parse_args(args), check_graphviz=False)
+                code = 0
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else int(bool(e.code))
+    finally:
+        sys.stdin = sys.__stdin__
+    out.flush()
+    return {
+        "exit": code,
+        "stdout": base64.b64encode(stdout.getvalue()).decode("ascii"),
+        "stderr": stderr.getvalue(),
+    }
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "Daemon"
+
+    def handle(self) -> None:
+        data = _receive(self.connection)
+        if not data:
+            return  # mere probe, see _remove_stale_socket()
+        try:
+            request = json.loads(data)
+            if request.get("version") != self.server.version:
+                response = {"error": "version mismatch"}
+            else:
+                future = self.server.executor.submit(
+                    self.server.runner,
+                    request["args"],
+                    request["cwd"],
+                    request["stdin"],
+                )
+                response = future.result()
+        except Exception as e:  # report, and keep serving
+            response = {"error": f"{type(e).__name__}: {e}"}
+        with contextlib.suppress(OSError):  # client gone
+            self.wfile.write(json.dumps(response).encode("utf-8"))
+
+
+class Daemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serve CLI runs on a pool of workers, until shut down.
+
+    Each connection is handled by a thread, waiting for a worker.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        socket_path: str,
+        version: str,
+        executor: Executor,
+        runner: Runner = run_request,
+    ) -> None:
+        self.version = version
+        self.executor = executor
+        self.runner = runner
+        _make_socket_directory(os.path.dirname(socket_path) or ".")
+        _remove_stale_socket(socket_path)
+        umask = os.umask(0o177)  # the socket is private from its creation
+        try:
+            super().__init__(socket_path, _Handler)
+        finally:
+            os.umask(umask)
+
+    def server_close(self) -> None:
+        super().server_close()
+        with contextlib.suppress(OSError):
+            os.remove(self.server_address)  # type: ignore[arg-type]
+
+
+def _make_socket_directory(directory: str) -> None:
+    """Create the directory of the socket, private to the user, if missing.
+
+    Fail if other users can replace the files of the directory.
+    """
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    st = os.stat(directory)
+    others_write = st.st_mode & 0o022 and not st.st_mode & stat.S_ISVTX
+    if st.st_uid not in (os.getuid(), 0) or others_write:
+        raise exception.DfdException(
+            f"The socket directory {directory} is writable by other users"
+        )
+
+
+def _remove_stale_socket(socket_path: str) -> None:
+    """Remove the socket of a dead daemon; fail if a daemon listens."""
+    if not os.path.exists(socket_path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            os.remove(socket_path)
+            return
+    raise exception.DfdException(
+        f"A daemon is already listening on {socket_path}"
+    )
+
+
+def _init_worker() -> None:
+    """Leave interruptions to the daemon, which then shuts the pool down."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def serve(version: str, nb_workers: int, socket_path: str) -> None:
+    """Run the daemon until interrupted (SIGINT or SIGTERM)."""
+    # not at module level, as clients need not import it
+    from concurrent.futures import ProcessPoolExecutor
+
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    with ProcessPoolExecutor(nb_workers, initializer=_init_worker) as executor:
+        with Daemon(socket_path, version, executor) as daemon:
+            print(
+                f"Serving on {socket_path} with {nb_workers} worker(s); "
+                "press Ctrl-C to stop.",
+                file=sys.stderr,
+            )
+            try:
+                daemon.serve_forever()
+            except KeyboardInterrupt:
+                pass
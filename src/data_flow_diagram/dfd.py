@@ -1,10 +1,15 @@
 """Pipeline orchestrator: scan → parse → check → resolve → filter → render."""
 
+import dataclasses
+import os
+from typing import Callable, Iterable, TextIO
+
 from . import config, exception, model
-from .console import dprint
+from .console import DOT
 from .dsl import checker, dependency_checker, filters, parser, scanner
 from .rendering.dot import Generator, generate_dot
 from .rendering import templates as TMPL
+from .timings import TIMINGS
 
 
 def build(
@@ -13,30 +18,68 @@ def build(
     title: str,
     options: model.Options,
     snippet_by_name: model.SnippetByName | None = None,
+    used_sources: set[str] | None = None,
+    graph_registry: dependency_checker.GraphRegistry | None = None,
+    sink: TextIO | Callable[[model.GraphOptions], TextIO] | None = None,
 ) -> tuple[str, model.GraphOptions]:
     """Run the pure pipeline and return (DOT text, graph options).
 
-    No file I/O is performed here; the caller is responsible for writing
-    the DOT text to disk or invoking Graphviz.
+    No file I/O is performed here, except reading included and referred
+    sources; the caller is responsible for writing the DOT text to disk or
+    invoking Graphviz. The names of these sources (file paths, or
+    #-prefixed snippet names) are added to *used_sources*, when provided.
+
+    Graphs referred to by dependencies are parsed once per *graph_registry*,
+    which is shared by the builds of a run.
+
+    If a *sink* is given, the DOT text is written to it as it is generated,
+    instead of being returned (the returned text is then empty): huge
+    graphs can go to a file or a pipe without being held in memory. The
+    sink may be given by a function of the graph options, called once they
+    are known, e.g. to start the Graphviz engine they select.
     """
 
     # scan (includes, line continuations) and parse the DSL into statements
-    lines = scanner.scan(provenance, dfd_src, snippet_by_name, options.debug)
-    statements, dependencies, attribs = parser.parse(lines, options)
+    with TIMINGS.record_stage("scan"):
+        lines = scanner.scan(
+            provenance, dfd_src, snippet_by_name, options.debug, used_sources
+        )
+    with TIMINGS.record_stage("parse"):
+        statements, dependencies, attribs = parser.parse(lines, options)
     if dependencies and not options.no_check_dependencies:
-        dependency_checker.check(dependencies, snippet_by_name, options)
+        with TIMINGS.record_stage("dependencies"):
+            dependency_checker.check(
+                dependencies,
+                snippet_by_name,
+                options,
+                used_sources=used_sources,
+                registry=graph_registry,
+            )
 
     # validate statements, resolve star endpoints, and apply filters
-    items_by_name = checker.check(statements)
-    statements = resolve_star_endpoints(statements, items_by_name)
-    statements = filters.handle_filters(statements, options.debug)
-    statements = remove_unused_hidables(statements)
-    statements, graph_options = handle_options(statements)
+    with TIMINGS.record_stage("check"):
+        items_by_name = checker.check(statements)
+    with TIMINGS.record_stage("resolve"):
+        statements = resolve_star_endpoints(statements, items_by_name)
+    with TIMINGS.record_stage("filter"):
+        statements = filters.handle_filters(statements)
+    with TIMINGS.record_stage("hidables"):
+        statements = remove_unused_hidables(statements)
+    with TIMINGS.record_stage("options"):
+        statements, graph_options = handle_options(statements)
 
-    # resolve title and background color (CLI args override DFD style)
+    # resolve title, layout budget and background color (CLI args override
+    # DFD style)
     if options.no_graph_title or graph_options.no_graph_title:
         title = ""
 
+    if options.layout_budget is not None:
+        graph_options.fast_layout = options.layout_budget == "fast"
+    if options.fast_layout_max_nodes is not None:
+        graph_options.fast_layout_max_nodes = options.fast_layout_max_nodes
+    if graph_options.fast_layout:
+        graph_options.nb_nodes, graph_options.nb_edges = count_graph(statements)
+
     bg_color = (
         options.background_color
         if options.background_color is not None
@@ -44,12 +87,82 @@ def build(
     )
 
     # generate DOT text
-    gen = Generator(graph_options, attribs)
-    text = generate_dot(gen, title, bg_color, statements, items_by_name)
-    dprint(text)
+    if callable(sink):
+        sink = sink(graph_options)
+    with TIMINGS.record_stage("generate"):
+        gen = Generator(
+            graph_options, attribs, sink, options.provenance_comments
+        )
+        text = generate_dot(gen, title, bg_color, statements, items_by_name)
+    TIMINGS.add_dot_size(gen.writer.size)
+    if sink is None:
+        DOT.debug_print(text)
     return text, graph_options
 
 
+def render_many(
+    sources: Iterable[str],
+    fmt: str = "svg",
+    options: model.Options | None = None,
+    jobs: int | None = None,
+) -> list[bytes]:
+    """Render DFD sources to images in memory, e.g. for embedding tools.
+
+    Returns the image of each source, in the format *fmt* ("dot" for the
+    DOT text). The sources share the caches of includes and referred
+    graphs; the Graphviz work is done by *jobs* concurrent processes
+    (default: the number of CPUs), and reuses the render cache of
+    *options*, if any. Raises DfdException on the first failing source.
+    """
+    # not at module level, as building DOT texts needs no Graphviz
+    import subprocess
+
+    from .rendering import graphviz
+    from .rendering.cache import RenderCache
+
+    if options is None:
+        options = model.Options(
+            background_color=None,
+            no_graph_title=False,
+            format=fmt,
+            no_check_dependencies=False,
+            debug=False,
+        )
+    else:
+        options = dataclasses.replace(options, format=fmt)
+
+    # build all DOT texts
+    graph_registry = dependency_checker.GraphRegistry()
+    image_jobs = []
+    for nr, source in enumerate(sources):
+        provenance = model.SourceLine("", f"<source {nr}>", None, 0)
+        text, graph_options = build(
+            provenance, source, "", options, graph_registry=graph_registry
+        )
+        image_jobs.append(graphviz.ImageJob(graph_options, text, "", fmt))
+    if fmt == "dot":
+        return [job.text.encode("utf-8") for job in image_jobs]
+
+    # render them
+    cache = (
+        RenderCache(options.cache_dir, layouts=options.cache_layouts)
+        if options.cache_dir
+        else None
+    )
+    results = graphviz.render_images(
+        image_jobs, jobs or os.cpu_count() or 1, cache
+    )
+    images = []
+    for nr, result in enumerate(results):
+        if isinstance(result, subprocess.CalledProcessError):
+            diagnostics = (result.stderr or b"").decode("utf-8", "replace")
+            raise exception.DfdException(
+                f"Graphviz failed to render source {nr}: {diagnostics}"
+            )
+        images.append(result)
+    return images
+
+
 def resolve_star_endpoints(
     statements: model.Statements,
     items_by_name: dict[str, model.Item],
@@ -111,6 +224,17 @@ def remove_unused_hidables(statements: model.Statements) -> model.Statements:
     return new_statements
 
 
+def count_graph(statements: model.Statements) -> tuple[int, int]:
+    """Return the numbers of nodes (items) and edges (connections)."""
+    nb_nodes = nb_edges = 0
+    for statement in statements:
+        if isinstance(statement, model.Item):
+            nb_nodes += 1
+        elif isinstance(statement, model.Connection):
+            nb_edges += 1
+    return nb_nodes, nb_edges
+
+
 def handle_options(
     statements: model.Statements,
 ) -> tuple[model.Statements, model.GraphOptions]:
@@ -149,6 +273,15 @@ def handle_options(
                         options.background_color = style.value
                     case model.StyleOption.NO_GRAPH_TITLE:
                         options.no_graph_title = True
+                    case model.StyleOption.FAST_LAYOUT:
+                        options.fast_layout = True
+                        if style.value:
+                            try:
+                                options.fast_layout_max_nodes = int(style.value)
+                            except ValueError as e:
+                                raise exception.DfdException(
+                                    f'{e}"', source=statement.source
+                                ) from e
                     case _:
                         raise exception.DfdException(
                             f'Unsupported style "{style.style}"',
@@ -1,8 +1,95 @@
+import os
+from dataclasses import dataclass, field
+
 from .. import exception, model
 from ..model import Keyword
 from . import parser, scanner
 
 
+@dataclass
+class ParsedGraph:
+    """Items of a referred graph, by name, and the sources it includes."""
+
+    items_by_name: dict[str, model.Item]
+    used_sources: set[str]
+
+
+# What tells a version of a referred graph from another: nothing for the
+# snippets of a document, which do not change during a run; the real path,
+# modification time and size of a file (see _find_file_version())
+GraphVersion = tuple[str | int, ...]
+
+
+@dataclass
+class GraphRegistry:
+    """Referred graphs, parsed once and shared by all the graphs of a run.
+
+    Graphs are keyed by the provenance of the referring document (whose
+    snippets the graph may include), reference (file path or #-prefixed
+    snippet name) and version, so that a file that changed is read and
+    parsed again.
+    """
+
+    graphs: dict[tuple[str, str, GraphVersion], ParsedGraph] = field(
+        default_factory=dict
+    )
+
+    def find_graph(
+        self,
+        dep: model.GraphDependency,
+        version: GraphVersion,
+        snippet_by_name: model.SnippetByName,
+        options: model.Options,
+        file_texts: dict[str, str] | None = None,
+    ) -> ParsedGraph:
+        """Return the parsed graph referred to by a dependency; its text is
+        only read if not already parsed (see _read_file())."""
+        key = find_document(dep.source), dep.to_graph, version
+        graph = self.graphs.get(key)
+        if graph is None:
+            if dep.to_graph.startswith(model.SNIPPET_PREFIX):
+                name = dep.to_graph[len(model.SNIPPET_PREFIX) :]
+                text = snippet_by_name[name].text
+            else:
+                text = _read_file(dep.to_graph, file_texts)
+            used_sources: set[str] = set()
+            lines = scanner.scan(
+                dep.source, text, snippet_by_name, options.debug, used_sources
+            )
+            statements, _, _ = parser.parse(lines, options)
+            graph = ParsedGraph(index_items(statements), used_sources)
+            self.graphs[key] = graph
+        return graph
+
+
+def find_document(source: model.SourceLine) -> str:
+    """Return the provenance of the document a source line comes from.
+
+    The snippets of a markdown document share its provenance. Lines
+    without provenance (no parent) are of an unknown document: "".
+    """
+    root = source.parent
+    while root is not None and root.parent is not None:
+        root = root.parent
+    if root is None:
+        return ""
+    return (root.raw_text or "").partition(model.SNIPPET_PROVENANCE)[0]
+
+
+def _find_file_version(
+    name: str, file_texts: dict[str, str] | None
+) -> GraphVersion:
+    """Return the version of a file, without reading it (but from
+    *file_texts*, see _read_file()).
+
+    Raises FileNotFoundError for a missing file.
+    """
+    if file_texts is not None:
+        return (_read_file(name, file_texts),)
+    st = os.stat(name)
+    return os.path.realpath(name), st.st_mtime_ns, st.st_size
+
+
 def _read_file(name: str, file_texts: dict[str, str] | None) -> str:
     """Read graph source text from *file_texts* dict or from the filesystem.
 
@@ -24,17 +111,29 @@ def check(
     snippet_by_name: model.SnippetByName | None,
     options: model.Options,
     file_texts: dict[str, str] | None = None,
+    used_sources: set[str] | None = None,
+    registry: GraphRegistry | None = None,
 ) -> None:
     """Verify that all dependencies refer to existing items of compatible type.
 
     *file_texts*, when provided, is a ``{filename: content}`` dict used
     instead of the real filesystem.  This is intended for unit tests that
     need to exercise dependency checking without creating temporary files.
+
+    The names of the referred files and snippets, and of their includes,
+    are added to *used_sources*, when provided.
+
+    Referred graphs are parsed once per *registry*; pass the same registry
+    to all the checks of a run.
     """
 
     snippet_by_name = snippet_by_name or {}
+    registry = registry or GraphRegistry()
     errors = exception.DfdException("Dependency error(s) found:")
     for dep in dependencies:
+        if used_sources is not None:
+            used_sources.add(dep.to_graph)
+
         # load source text
         if dep.to_graph.startswith(model.SNIPPET_PREFIX):
             # from snippet
@@ -45,13 +144,13 @@ def check(
                     source=dep.source,
                 )
                 continue
-            text = snippet_by_name[name].text
+            version: GraphVersion = ()
             what = "snippet"
         else:
-            # from file
+            # from file, read only if not parsed yet
             name = dep.to_graph
             try:
-                text = _read_file(name, file_texts)
+                version = _find_file_version(name, file_texts)
             except FileNotFoundError as e:
                 if name in snippet_by_name:
                     errors.add(
@@ -74,12 +173,15 @@ def check(
                 )
             continue
 
-        # scan and parse the referred graph to look up the item
-        lines = scanner.scan(dep.source, text, snippet_by_name, options.debug)
-        statements, _, _ = parser.parse(lines, options)
+        # parse the referred graph (once) to look up the item
+        graph = registry.find_graph(
+            dep, version, snippet_by_name, options, file_texts
+        )
+        if used_sources is not None:
+            used_sources |= graph.used_sources
 
         # verify the referred item exists and has the expected type
-        item = find_item(dep.to_item, statements)
+        item = graph.items_by_name.get(dep.to_item)
         if item:
             if dep.to_type != item.type:
                 errors.add(
@@ -102,10 +204,11 @@ def check(
         raise errors
 
 
-def find_item(name: str, statements: model.Statements) -> model.Item | None:
+def index_items(statements: model.Statements) -> dict[str, model.Item]:
+    """Map item names to items; the first item wins for duplicate names."""
+    items_by_name: dict[str, model.Item] = {}
     for statement in statements:
         match statement:
             case model.Item() as item:
-                if item.name == name:
-                    return statement
-    return None
+                items_by_name.setdefault(item.name, item)
+    return items_by_name
@@ -1,44 +1,67 @@
 """Filter engine: only/without, neighbor expansion."""
 
+from dataclasses import dataclass, field
+
 from .. import exception, model
-from ..console import dprint
+from ..console import FILTERS
+
+# Shared, read-only result for names without neighbors
+_NO_NAMES: frozenset[str] = frozenset()
+
+
+@dataclass
+class Adjacency:
+    """Upstream and downstream neighbor index of the connection graph.
+
+    Built once per handle_filters() call, so that each neighbor expansion
+    is a breadth-first search instead of one statement scan per wave.
+    """
+
+    downstream: dict[str, set[str]] = field(default_factory=dict)
+    upstream: dict[str, set[str]] = field(default_factory=dict)
+
+    def add(self, src: str, dst: str) -> None:
+        self.downstream.setdefault(src, set()).add(dst)
+        self.upstream.setdefault(dst, set()).add(src)
+
+    def find(self, name: str, down: bool) -> set[str] | frozenset[str]:
+        """Return the direct neighbors of a name in one direction."""
+        index = self.downstream if down else self.upstream
+        return index.get(name, _NO_NAMES)
 
 
-def _collect_connected_names(
+def build_adjacencies(
     statements: model.Statements,
-    names: set[str],
-    search_downstream: bool,
-    use_layout_direction: bool,
-) -> set[str]:
-    """Find items connected to a set of names in one direction."""
-    found_names: set[str] = set()
+) -> dict[bool, Adjacency]:
+    """Index connections by endpoint, per direction mode.
+
+    Returns {use_layout_direction: adjacency}: in flow direction mode,
+    reversed connections point from dst to src; in layout direction mode,
+    they keep the src to dst orientation.
+    """
+    adjacencies = {False: Adjacency(), True: Adjacency()}
     for statement in statements:
         match statement:
             case model.Connection() as conn:
+                pass
+            case _:
+                continue
 
-                # constraints do not define neighborhood
-                if conn.type == model.Keyword.CONSTRAINT:
-                    continue
+        # constraints do not define neighborhood
+        if conn.type == model.Keyword.CONSTRAINT:
+            continue
 
-                src, dst = conn.src, conn.dst
-                if conn.reversed and not use_layout_direction:
-                    src, dst = dst, src
+        for use_layout_direction, adjacency in adjacencies.items():
+            src, dst = conn.src, conn.dst
+            if conn.reversed and not use_layout_direction:
+                src, dst = dst, src
 
-                if conn.type in (model.Keyword.BFLOW, model.Keyword.UFLOW):
-                    if dst in names:
-                        found_names.add(src)
-                    if src in names:
-                        found_names.add(dst)
-                else:
-                    if search_downstream:
-                        if src in names:
-                            found_names.add(dst)
-                    else:
-                        if dst in names:
-                            found_names.add(src)
-            case _:
-                continue
-    return found_names
+            # undirected connections are neighbors both ways
+            adjacency.add(src, dst)
+            if conn.type in (model.Keyword.BFLOW, model.Keyword.UFLOW):
+                adjacency.add(dst, src)
+
+    return adjacencies
 
 
 def _resolve_distance(distance: int, max_neighbors: int) -> int:
@@ -49,47 +72,54 @@ def _resolve_distance(distance: int, max_neighbors: int) -> int:
 
 
 def _expand_neighbors_in_dir(
-    statements: model.Statements,
+    adjacencies: dict[bool, Adjacency],
     anchor_names: list[str],
     max_neighbors: int,
     fn: model.FilterNeighbors,
     down: bool,
 ) -> set[str]:
-    """Expand neighbors in one direction by successive waves of connections."""
+    """Expand neighbors in one direction by successive waves of connections.
+
+    Anchors are not part of the result unless a cycle leads back to them.
+    """
+    adjacency = adjacencies[fn.layout_direction]
     names = set(anchor_names)
     neighbor_names: set[str] = set()
     for i in range(_resolve_distance(fn.distance, max_neighbors)):
-        names = _collect_connected_names(
-            statements,
-            names,
-            search_downstream=down,
-            use_layout_direction=fn.layout_direction,
-        )
-        if not names:
+        # visit the next wave: neighbors not reached by a previous wave
+        new_names: set[str] = set()
+        for name in names:
+            new_names.update(adjacency.find(name, down))
+        new_names.difference_update(neighbor_names)
+        if not new_names:
             break
-        dprint(f"  - {i} {down} {fn}")
-        dprint(f"     :", neighbor_names)
-        dprint(f"   + :", names)
-        neighbor_names.update(names)
-        dprint(f"   = :", neighbor_names)
+        FILTERS.debug_print("  - %s %s %s", i, down, fn)
+        FILTERS.debug_print("     : %s", neighbor_names)
+        FILTERS.debug_print("   + : %s", new_names)
+        neighbor_names.update(new_names)
+        FILTERS.debug_print("   = : %s", neighbor_names)
+        names = new_names
     return neighbor_names
 
 
 def find_neighbors(
     filter: model.Filter,
-    statements: model.Statements,
+    adjacencies: dict[bool, Adjacency],
     max_neighbors: int,
-    debug: bool,
 ) -> tuple[set[str], set[str]]:
     """Collect neighbor names by following connections outward from filter anchors."""
     return _expand_neighbors_in_dir(
-        statements,
+        adjacencies,
         filter.names,
         max_neighbors,
         filter.neighbors_down,
         down=True,
     ), _expand_neighbors_in_dir(
-        statements, filter.names, max_neighbors, filter.neighbors_up, down=False
+        adjacencies,
+        filter.names,
+        max_neighbors,
+        filter.neighbors_up,
+        down=False,
     )
 
 
@@ -133,7 +163,7 @@ def _collect_frame_skips(
 def _collect_kept_names(
     statements: model.Statements,
     all_names: set[str],
-    debug: bool,
+    adjacencies: dict[bool, Adjacency],
 ) -> tuple[set[str] | None, set[str], dict[str, str], set[str]]:
     """Process filter statements to determine which names to keep.
 
@@ -146,8 +176,8 @@ def _collect_kept_names(
 
     for statement in statements:
         if isinstance(statement, model.Filter):
-            dprint("*** Filter:", statement)
-            dprint("    before:", kept_names)
+            FILTERS.debug_print("*** Filter: %s", statement)
+            FILTERS.debug_print("    before: %s", kept_names)
 
         match statement:
             case model.Only() as f:
@@ -166,15 +196,13 @@ def _collect_kept_names(
                     not f.neighbors_up.suppress_anchors
                     and not f.neighbors_down.suppress_anchors
                 ):
-                    dprint("ONLY: adding items:", names)
+                    FILTERS.debug_print("ONLY: adding items: %s", names)
                     kept_names.update(f.names)
                     only_names.update(f.names)
 
                 # add upstream/downstream neighbor names
-                downs, ups = find_neighbors(
-                    f, statements, len(all_names), debug
-                )
-                dprint("ONLY: adding neighbors:", downs, ups)
+                downs, ups = find_neighbors(f, adjacencies, len(all_names))
+                FILTERS.debug_print("ONLY: adding neighbors: %s %s", downs, ups)
                 kept_names.update(downs)
                 kept_names.update(ups)
 
@@ -203,14 +231,14 @@ def _collect_kept_names(
                     not f.neighbors_up.suppress_anchors
                     and not f.neighbors_down.suppress_anchors
                 ):
-                    dprint("WITHOUT: removing items:", names)
+                    FILTERS.debug_print("WITHOUT: removing items: %s", names)
                     kept_names.difference_update(names)
 
                 # remove upstream/downstream neighbor names
-                downs, ups = find_neighbors(
-                    f, statements, len(all_names), debug
+                downs, ups = find_neighbors(f, adjacencies, len(all_names))
+                FILTERS.debug_print(
+                    "WITHOUT: removing neighbors: %s %s", downs, ups
                 )
-                dprint("WITHOUT: removing neighbors:", downs, ups)
                 kept_names.difference_update(downs)
                 kept_names.difference_update(ups)
 
@@ -219,7 +247,7 @@ def _collect_kept_names(
                 )
 
         if isinstance(statement, model.Filter):
-            dprint("    after:", kept_names)
+            FILTERS.debug_print("    after: %s", kept_names)
 
     return kept_names, only_names, replacement, skip_frames_for_names
 
@@ -240,20 +268,22 @@ def _apply_filters(
     kept_names: set[str],
     replacement: dict[str, str],
     skip_frames_for_names: set[str],
-) -> tuple[list[model.Statement], dict[str, model.Connection]]:
+) -> tuple[list[model.Statement], set[model.ConnectionKey]]:
     """Apply kept/replacement/skip decisions to produce filtered statements.
 
-    Returns (new_statements, replaced_connections).
+    Returns (new_statements, keys of the replaced connections).
     """
     new_statements: list[model.Statement] = []
-    replaced_connections: dict[str, model.Connection] = {}
+    replaced_keys: set[model.ConnectionKey] = set()
     for statement in statements:
-        dprint(f"\nHandling statement: {statement}")
+        FILTERS.debug_print("\nHandling statement: %s", statement)
         match statement:
             case model.Item() as item:
                 # skip items not in the kept set
                 if item.name not in kept_names:
-                    dprint("=> Skipping item: its name is not in the kept list")
+                    FILTERS.debug_print(
+                        "=> Skipping item: its name is not in the kept list"
+                    )
                     continue
 
             case model.Connection() as conn:
@@ -266,11 +296,11 @@ def _apply_filters(
                         conn.src = replacement[conn.src]
                     if conn.dst in replacement:
                         conn.dst = replacement[conn.dst]
-                    replaced_connections[conn.signature()] = conn
+                    replaced_keys.add(conn.signature())
                 else:
                     # skip if either endpoint was filtered out
                     if conn.src not in kept_names or conn.dst not in kept_names:
-                        dprint(
+                        FILTERS.debug_print(
                             "=> Skipping connection: some end is not in the kept list"
                         )
                         continue
@@ -285,70 +315,77 @@ def _apply_filters(
                 # skip frames with no remaining kept items
                 names = set(frame.items)
                 if not names.intersection(kept_names):
-                    dprint("=> Skipping frame: no items are in the kept list")
+                    FILTERS.debug_print(
+                        "=> Skipping frame: no items are in the kept list"
+                    )
                     continue
                 else:
                     # trim frame to kept items only
                     new_items = [n for n in frame.items if n in kept_names]
-                    dprint(
-                        f"=> Adjusting frame items: {frame.items} -> {new_items}"
+                    FILTERS.debug_print(
+                        "=> Adjusting frame items: %s -> %s",
+                        frame.items,
+                        new_items,
                     )
                     frame.items = new_items
 
                     # skip frames containing items selected via "f" flag
                     if set(new_items).intersection(skip_frames_for_names):
-                        dprint(
+                        FILTERS.debug_print(
                             "=> Skipping frame: some items are in the skip-frames list"
                         )
                         continue
 
         # keep statement
-        dprint("=> Keeping statement")
+        FILTERS.debug_print("=> Keeping statement")
         new_statements.append(statement)
 
-    return new_statements, replaced_connections
+    return new_statements, replaced_keys
+
 
+def deduplicate_connections(
+    statements: model.Statements,
+    candidates: set[model.ConnectionKey] | None = None,
+) -> model.Statements:
+    """Remove connections equivalent to a previous one (see signature()).
 
-def _deduplicate_connections(
-    statements: list[model.Statement],
-    replaced_connections: dict[str, model.Connection],
-) -> list[model.Statement]:
-    """Remove duplicate connections created by replacements."""
-    kept_statements: list[model.Statement] = []
-    skipped_signatures: set[str] = set()
+    Only connections whose key is in *candidates* are deduplicated, or all
+    connections if *candidates* is None.
+    """
+    kept_statements: model.Statements = []
+    seen_keys: set[model.ConnectionKey] = set()
     for statement in statements:
         match statement:
             case model.Connection() as conn:
-                sig = conn.signature()
-                if sig in skipped_signatures:
+                key = conn.signature()
+                if key in seen_keys:
                     continue
-                if sig in replaced_connections:
-                    skipped_signatures.add(sig)
+                if candidates is None or key in candidates:
+                    seen_keys.add(key)
         kept_statements.append(statement)
     return kept_statements
 
 
-def handle_filters(
-    statements: model.Statements, debug: bool = False
-) -> model.Statements:
+def handle_filters(statements: model.Statements) -> model.Statements:
     """Apply only/without filters to a statement list."""
     all_names = set([s.name for s in statements if isinstance(s, model.Item)])
+    adjacencies = build_adjacencies(statements)
 
     # phase 1: collect filtered names
     kept_names, only_names, replacement, skip_frames_for_names = (
-        _collect_kept_names(statements, all_names, debug)
+        _collect_kept_names(statements, all_names, adjacencies)
     )
 
     _mark_non_hidable(statements, only_names)
 
     # default to keeping all names if no filter was encountered
     kept_names = kept_names if kept_names is not None else all_names
-    dprint("\nItems to keep", kept_names)
+    FILTERS.debug_print("\nItems to keep %s", kept_names)
 
     # phase 2: apply filters to statements
-    new_statements, replaced_connections = _apply_filters(
+    new_statements, replaced_keys = _apply_filters(
         statements, kept_names, replacement, skip_frames_for_names
     )
 
     # phase 3: deduplicate connections created by replacements
-    return _deduplicate_connections(new_statements, replaced_connections)
+    return deduplicate_connections(new_statements, replaced_keys)
@@ -2,12 +2,19 @@
 
 import os.path
 import re
+import sys
 from typing import Callable
 
 from .. import config, exception, model
-from ..console import dprint
+from ..console import PARSER
 from ..model import Keyword
 
+# A line split once: [keyword, first argument, remainder] (possibly shorter)
+Tokens = list[str]
+
+# Statement parsers get the source line and its tokens
+Parser = Callable[[model.SourceLine, Tokens], model.Statement]
+
 
 def parse(
     source_lines: model.SourceLines,
@@ -27,12 +34,12 @@ def parse(
         if not src_line or src_line.startswith("#"):
             continue
 
-        # rewrite arrow sugar to keyword form
-        line = _apply_syntactic_sugars(src_line)
+        # tokenize, rewriting arrow sugar to keyword form
+        line, tokens = _apply_syntactic_sugars(src_line)
         source.text = line  # fixup text
 
         # dispatch to the keyword-specific parser
-        word = source.text.split()[0]
+        word = tokens[0]
         f = _PARSERS.get(word)
 
         if f is None:
@@ -41,7 +48,7 @@ def parse(
             )
 
         try:
-            statement = f(source)
+            statement = f(source, tokens)
         except exception.DfdException as e:
             raise exception.DfdException(str(e), source=source) from e
 
@@ -60,18 +67,26 @@ def parse(
 
         statements.append(statement)
 
-    if shared_options and shared_options.debug:
+    if shared_options and shared_options.debug and PARSER.enabled:
         for s in statements:
-            dprint(model.repr(s))
+            PARSER.debug_print(model.repr(s))
     return statements, dependencies, attribs
 
 
+def _tokenize(line: str) -> Tokens:
+    """Split a DFD line into keyword, first argument and remainder"""
+    return line.split(maxsplit=2)
+
+
 def _split_args(
-    dfd_line: str, n: int, last_is_optional: bool = False
+    tokens: Tokens, n: int, last_is_optional: bool = False
 ) -> list[str]:
-    """Split DFD line into n (possibly n-1) tokens"""
+    """Split the arguments of a tokenized DFD line into n (possibly n-1) tokens"""
 
-    terms: list[str] = dfd_line.split(maxsplit=n)
+    # only the remainder needs splitting further
+    terms = tokens[:]
+    if n > 2 and len(tokens) == 3:
+        terms = tokens[:2] + tokens[2].split(maxsplit=n - 2)
     if len(terms) - 1 == n - 1 and last_is_optional:
         terms.append("")
 
@@ -87,20 +102,20 @@ def _split_args(
 def _parse_item_name(name: str) -> tuple[str, bool]:
     """If name ends with ?, make it hidable"""
     if name.endswith("?"):
-        return name[:-1], True
+        return sys.intern(name[:-1]), True
     else:
-        return name, False
+        return sys.intern(name), False
 
 
-def _parse_style(source: model.SourceLine) -> model.Statement:
+def _parse_style(source: model.SourceLine, tokens: Tokens) -> model.Statement:
     """Parse style statement"""
-    style, value = _split_args(source.text, 2, True)
+    style, value = _split_args(tokens, 2, True)
     return model.Style(source, style, value)
 
 
-def _parse_attrib(source: model.SourceLine) -> model.Statement:
+def _parse_attrib(source: model.SourceLine, tokens: Tokens) -> model.Statement:
     """Parse attrib name text"""
-    alias, text = _split_args(source.text, 2, True)
+    alias, text = _split_args(tokens, 2, True)
     return model.Attrib(source, alias, text)
 
 
@@ -170,9 +185,9 @@ def _parse_neighbor_spec(
     return fn, is_up, is_down
 
 
-def _parse_filter(source: model.SourceLine) -> model.Statement:
+def _parse_filter(source: model.SourceLine, tokens: Tokens) -> model.Statement:
     """Parse !/~[NEIGHBOURS] NAME[S]"""
-    terms: list[str] = source.text.split()
+    terms = tokens[:2] + (tokens[2].split() if len(tokens) == 3 else [])
     if len(terms) < 2:
         raise exception.DfdException(f"One or more arguments are expected")
 
@@ -218,26 +233,24 @@ def _parse_filter(source: model.SourceLine) -> model.Statement:
         raise exception.DfdException(f"One or more names are expected")
 
     # remaining args are anchor names
-    f.names = args
+    f.names = [sys.intern(name) for name in args]
 
     # wrap into the concrete Only or Without subclass
     res: model.Statement
     if cmd == Keyword.ONLY:
-        res = model.Only(**f.__dict__)
+        res = model.Only(**model.get_fields(f))
     else:  # cmd == Keyword.WITHOUT:
         res = model.Without(
-            **f.__dict__, replaced_by=replacer
+            **model.get_fields(f), replaced_by=replacer
         )  # replaced_by is set later by the caller
     return res
 
 
-def _make_item_parser(
-    keyword: Keyword,
-) -> Callable[[model.SourceLine], model.Statement]:
+def _make_item_parser(keyword: Keyword) -> Parser:
     """Create a parser for an item statement of the given type."""
 
-    def parse(source: model.SourceLine) -> model.Statement:
-        name, text = _split_args(source.text, 2, True)
+    def parse(source: model.SourceLine, tokens: Tokens) -> model.Statement:
+        name, text = _split_args(tokens, 2, True)
         name, hidable = _parse_item_name(name)
         return model.Item(source, keyword, text, "", name, hidable)
 
@@ -249,11 +262,12 @@ def _make_connection_parser(
     reversed: bool = False,
     relaxed: bool = False,
     swap: bool = False,
-) -> Callable[[model.SourceLine], model.Statement]:
+) -> Parser:
     """Create a parser for a connection statement."""
 
-    def parse(source: model.SourceLine) -> model.Statement:
-        src, dst, text = _split_args(source.text, 3, True)
+    def parse(source: model.SourceLine, tokens: Tokens) -> model.Statement:
+        src, dst, text = _split_args(tokens, 3, True)
+        src, dst = sys.intern(src), sys.intern(dst)
         if swap:
             src, dst = dst, src
         return model.Connection(
@@ -263,99 +277,71 @@ def _make_connection_parser(
     return parse
 
 
-def _format_sugar(verb: str, args: list[str]) -> str:
-    """Format a rewritten arrow as keyword form."""
-    array = [verb] + args
-    del array[2]  # remove arrow
-    return "\t".join(array)
+# Arrow operators (without the "?" suffix making them relaxed), with their
+# keyword and relaxed keyword (None if they cannot be relaxed)
+_ARROWS: list[tuple[str, Keyword, Keyword | None]] = [
+    (r"-+>", Keyword.FLOW, Keyword.FLOW_RELAXED),
+    (r"<-+", Keyword.FLOW_REVERSED, Keyword.FLOW_REVERSED_RELAXED),
+    (r"-+>>", Keyword.CFLOW, Keyword.CFLOW_RELAXED),
+    (r"<<-+", Keyword.CFLOW_REVERSED, Keyword.CFLOW_REVERSED_RELAXED),
+    (r"<-+>", Keyword.BFLOW, Keyword.BFLOW_RELAXED),
+    (r"--+", Keyword.UFLOW, Keyword.UFLOW_RELAXED),
+    (r":+>", Keyword.SIGNAL, Keyword.SIGNAL_RELAXED),
+    (r"<:+", Keyword.SIGNAL_REVERSED, Keyword.SIGNAL_REVERSED_RELAXED),
+    (r">+", Keyword.CONSTRAINT, None),
+    (r"<+", Keyword.CONSTRAINT_REVERSED, None),
+]
+
+# All arrows in one pattern; the matching group is named after the index
+RX_ARROW = re.compile(
+    "|".join(f"(?P<a{n}>{rx})" for n, (rx, _, _) in enumerate(_ARROWS))
+)
 
 
-def _resolve_sugar(
-    src_line: str, op: str, keyword: str, relaxed_keyword: str | None = None
-) -> str:
-    """Resolve an arrow operator to a keyword connection statement."""
-    parts = src_line.split(maxsplit=3)
-    if relaxed_keyword is not None and op.endswith("?"):
-        return _format_sugar(relaxed_keyword, parts)
-    return _format_sugar(keyword, parts)
+def _find_arrow_keyword(op: str) -> Keyword | None:
+    """Return the connection keyword of an arrow operator, if it is one."""
+    relaxed = op.endswith("?")
+    m = RX_ARROW.fullmatch(op[:-1] if relaxed else op)
+    if not m or not m.lastgroup:
+        return None
+    _, keyword, relaxed_keyword = _ARROWS[int(m.lastgroup[1:])]
+    return relaxed_keyword if relaxed else keyword
 
 
-def _apply_syntactic_sugars(src_line: str) -> str:
-    """Rewrite arrow operators and filter shorthands to canonical keyword form."""
+def _apply_syntactic_sugars(src_line: str) -> tuple[str, Tokens]:
+    """Tokenize a line, rewriting arrow operators and filter shorthands to
+    canonical keyword form.
+
+    Returns the rewritten line and its tokens.
+    """
 
     # insert space after filter mnemonic (e.g. "!A B" → "! A B")
     if src_line and src_line[0] in (Keyword.ONLY, Keyword.WITHOUT):
         if len(src_line) > 1 and src_line[1] != " ":
             # insert a space after the filter, so that it is recognized as a filter
             new_line = src_line[0] + " " + src_line[1:]
-            return new_line
+            return new_line, _tokenize(new_line)
 
     # rewrite arrow operators (e.g. "A --> B label" → "flow A B label")
-    terms = src_line.split()
-    if len(terms) < 3:
-        return src_line
-
-    op = terms[1]
-    new_line = ""
-
-    # match arrow patterns against connection keywords
-    if re.fullmatch(r"-+>[?]?", op):
-        new_line = _resolve_sugar(
-            src_line, op, Keyword.FLOW, Keyword.FLOW_RELAXED
-        )
-
-    elif re.fullmatch(r"<-+[?]?", op):
-        new_line = _resolve_sugar(
-            src_line, op, Keyword.FLOW_REVERSED, Keyword.FLOW_REVERSED_RELAXED
-        )
+    tokens = _tokenize(src_line)
+    if len(tokens) < 3:
+        return src_line, tokens
+    keyword = _find_arrow_keyword(tokens[1])
+    if keyword is None:
+        return src_line, tokens
 
-    if re.fullmatch(r"-+>>[?]?", op):
-        new_line = _resolve_sugar(
-            src_line, op, Keyword.CFLOW, Keyword.CFLOW_RELAXED
-        )
-    elif re.fullmatch(r"<<-+[?]?", op):
-        new_line = _resolve_sugar(
-            src_line, op, Keyword.CFLOW_REVERSED, Keyword.CFLOW_REVERSED_RELAXED
-        )
-
-    elif re.fullmatch(r"<-+>[?]?", op):
-        new_line = _resolve_sugar(
-            src_line, op, Keyword.BFLOW, Keyword.BFLOW_RELAXED
-        )
-
-    elif re.fullmatch(r"--+[?]?", op):
-        new_line = _resolve_sugar(
-            src_line, op, Keyword.UFLOW, Keyword.UFLOW_RELAXED
-        )
-
-    elif re.fullmatch(r":+>[?]?", op):
-        new_line = _resolve_sugar(
-            src_line, op, Keyword.SIGNAL, Keyword.SIGNAL_RELAXED
-        )
-    elif re.fullmatch(r"<:+[?]?", op):
-        new_line = _resolve_sugar(
-            src_line,
-            op,
-            Keyword.SIGNAL_REVERSED,
-            Keyword.SIGNAL_REVERSED_RELAXED,
-        )
-
-    elif re.fullmatch(r">+", op):
-        new_line = _resolve_sugar(src_line, op, Keyword.CONSTRAINT)
-    elif re.fullmatch(r"<+", op):
-        new_line = _resolve_sugar(src_line, op, Keyword.CONSTRAINT_REVERSED)
-
-    if new_line:
-        return new_line
-    else:
-        return src_line
+    # "SRC OP DST [TEXT]" → "KEYWORD\tSRC\tDST[\tTEXT]"
+    src, _, rest = tokens
+    dst_text = rest.split(maxsplit=1)
+    new_line = "\t".join([keyword, src] + dst_text)
+    return new_line, [keyword, src, "\t".join(dst_text)]
 
 
 def parse_drawable_attrs(drawable: model.Drawable) -> None:
     """Extract inline Graphviz attributes from a leading [...] bracket prefix."""
     if drawable.text and drawable.text.startswith("["):
         parts = drawable.text[1:].split("]", 1)
-        drawable.attrs = parts[0]
+        drawable.attrs = sys.intern(parts[0])  # typically repeated
         drawable.text = parts[1].strip()
 
         match drawable:
@@ -392,7 +378,7 @@ def _parse_item_external(
         dependencies.append(dependency)
 
 
-def _parse_frame(source: model.SourceLine) -> model.Statement:
+def _parse_frame(source: model.SourceLine, tokens: Tokens) -> model.Statement:
     """Parse frame statement"""
     parts = source.text.split("=", maxsplit=1)
     if len(parts) == 1:
@@ -400,7 +386,7 @@ def _parse_frame(source: model.SourceLine) -> model.Statement:
     else:
         text = parts[1].strip()
 
-    items = parts[0].split()[1:]
+    items = [sys.intern(name) for name in parts[0].split()[1:]]
     attrs = config.FRAME_DEFAULT_ATTRS
     return model.Frame(source, Keyword.FRAME, text, attrs, items)
 
@@ -408,7 +394,7 @@ def _parse_frame(source: model.SourceLine) -> model.Statement:
 ##############################################################################
 # Keyword-to-parser dispatch table (module-level, built once)
 
-_PARSERS: dict[str, Callable[[model.SourceLine], model.Statement]] = {
+_PARSERS: dict[str, Parser] = {
     # Options
     Keyword.STYLE: _parse_style,
     Keyword.ATTRIB: _parse_attrib,
@@ -2,9 +2,12 @@
 
 import os
 import re
+import sys
+from dataclasses import dataclass, field
+from functools import lru_cache
 
-from .. import exception, model
-from ..console import dprint
+from .. import config, exception, model
+from ..console import SCANNER
 
 # Regex to transform lines like:
 #   abc\
@@ -13,15 +16,38 @@ from ..console import dprint
 #   abcdef
 RX_LINE_CONT = re.compile("[\\\\]\\s*\n\\s*", re.MULTILINE)
 
+# A non-blank line: (line number, text, included name or None)
+ScannedLine = tuple[int, str, str | None]
+
+
+@dataclass
+class IncludeState:
+    """Includes of one scan: the current chain, and all the included names
+    (real paths for files, so that "a.dfd" and "./a.dfd" are the same).
+
+    Only a name included from itself (directly or not) is a recursion
+    error. A name already included elsewhere is skipped (include-once), so
+    that common fragments can be shared by several includees.
+    """
+
+    stack: list[str] = field(default_factory=list)
+    included: set[str] = field(default_factory=set)
+
 
 def scan(
     provenance: model.SourceLine | None,
     source_text: str,
     snippet_by_name: model.SnippetByName | None = None,
     debug: bool = False,
+    used_sources: set[str] | None = None,
 ) -> model.SourceLines:
+    """Split source text into lines, resolving #include directives.
+
+    The names of the included files and snippets are added to
+    *used_sources*, when provided.
+    """
     output: model.SourceLines = []
-    includes: set[str] = set()
+    includes = IncludeState()
 
     # stitch continuation lines (trailing backslash)
     source_text = RX_LINE_CONT.sub("", source_text)
@@ -29,60 +55,100 @@ def scan(
     # default provenance for top-level sources
     if provenance is None:
         provenance = model.SourceLine("", provenance, None, 0)
-    _scan(source_text, provenance, output, snippet_by_name, includes)
-
-    if debug:
-        dprint("=" * 40)
-        dprint(provenance)
-        dprint("----------")
-        dprint(source_text)
-        dprint("----------")
+    _scan(
+        split_lines(source_text),
+        provenance,
+        output,
+        snippet_by_name,
+        includes,
+        used_sources,
+    )
+
+    if debug and SCANNER.enabled:
+        SCANNER.debug_print("=" * 40)
+        SCANNER.debug_print("%s", provenance)
+        SCANNER.debug_print("----------")
+        SCANNER.debug_print(source_text)
+        SCANNER.debug_print("----------")
         for l in output:
-            dprint(model.repr(l))
-        dprint("=" * 40)
+            SCANNER.debug_print(model.repr(l))
+        SCANNER.debug_print("=" * 40)
 
     return output
 
 
 def _scan(
-    source_text: str,
+    lines: tuple[ScannedLine, ...],
     parent: model.SourceLine,
     output: model.SourceLines,
     snippet_by_name: model.SnippetByName | None,
-    includes: set[str],
+    includes: IncludeState,
+    used_sources: set[str] | None,
 ) -> None:
     """Process each non-blank line: dispatch includes, collect the rest."""
-    for nr, line in enumerate(source_text.splitlines()):
+    for nr, line, name in lines:
+        # SourceLines are not shared, as the parser rewrites their text
+        source_line = model.SourceLine(line, line, parent, nr)
+        if name is not None:
+            include(
+                name,
+                source_line,
+                output,
+                snippet_by_name,
+                includes,
+                used_sources,
+            )
+        else:
+            output.append(source_line)
+
+
+def split_lines(text: str) -> tuple[ScannedLine, ...]:
+    """Split text into non-blank lines, spotting the include directives."""
+    lines = []
+    for nr, line in enumerate(text.splitlines()):
         if not line.strip():
             continue
-        source_line = model.SourceLine(line, line, parent, nr)
         pair = line.split(maxsplit=1)
         if len(pair) == 2 and pair[0] == model.INCLUDE_DIRECTIVE:
-            include(line, source_line, output, snippet_by_name, includes)
+            lines.append((nr, line, pair[1]))
         else:
-            output.append(source_line)
+            lines.append((nr, line, None))
+    return tuple(lines)
+
+
+@lru_cache(maxsize=config.SCAN_CACHE_SIZE)
+def _read_lines(path: str, mtime_ns: int, size: int) -> tuple[ScannedLine, ...]:
+    """Read and split a file; cached as long as its stat info is unchanged,
+    so that a file included many times in a run is only read once."""
+    with open(path, encoding="utf-8") as f:
+        return split_lines(f.read())
 
 
 def include(
-    line: str,
+    name: str,
     parent: model.SourceLine,
     output: model.SourceLines,
     snippet_by_name: model.SnippetByName | None,
-    includes: set[str],
+    includes: IncludeState,
+    used_sources: set[str] | None = None,
 ) -> None:
-    # extract the include target and guard against recursion
-    pair = line.split(maxsplit=1)
-    name = pair[1]
-
-    if name in includes:
+    # guard against recursion, and include each snippet or file (by real
+    # path) once
+    is_snippet = name.startswith(model.SNIPPET_PREFIX)
+    key = name if is_snippet else os.path.realpath(name)
+    if key in includes.stack:
         raise exception.DfdException(
             f'Recursive include of "{name}"', source=parent
         )
-    includes.add(name)
+    if key in includes.included:
+        return
+    includes.included.add(key)
+    if used_sources is not None:
+        used_sources.add(name)
 
     # resolve the includee: snippet (#-prefixed) or file
-    caller = model.SourceLine("", f"<snippet {name}>", parent, 0)
-    if name.startswith(model.SNIPPET_PREFIX):
+    caller = model.SourceLine("", sys.intern(f"<snippet {name}>"), parent, 0)
+    if is_snippet:
         # include from MD snippet
         if not snippet_by_name:
             raise exception.DfdException(
@@ -97,14 +163,19 @@ def include(
                 f'included snippet "{name}" not found.', source=parent
             )
 
-        _scan(snippet.text, caller, output, snippet_by_name, includes)
+        lines = split_lines(snippet.text)
 
     else:
         # include from file
-        if not os.path.exists(name):
+        try:
+            st = os.stat(name)
+        except OSError:
             raise exception.DfdException(
                 f'included file "{name}" not found.', source=parent
             )
-        with open(name, encoding="utf-8") as f:
-            text = f.read()
-        _scan(text, caller, output, snippet_by_name, includes)
+        # by real path: a daemon worker serves runs of many directories
+        lines = _read_lines(key, st.st_mtime_ns, st.st_size)
+
+    includes.stack.append(key)
+    _scan(lines, caller, output, snippet_by_name, includes, used_sources)
+    includes.stack.pop()
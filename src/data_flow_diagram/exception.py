@@ -4,56 +4,77 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 
-from .model import pack
+from .model import ErrorRecord, pack
 
 if TYPE_CHECKING:
     from .model import SourceLine
 
 
 class DfdException(Exception):
+    """An error, possibly accumulating more errors (see add()).
+
+    The message is only formatted when the exception is displayed (or its
+    args read), as checks may accumulate thousands of errors before giving
+    up.
+    """
+
     def __init__(self, msg: str, source: SourceLine | None = None):
         self.source = source
         self._msg = msg
         self._accumulated: list[tuple[str, SourceLine | None]] = []
-        super().__init__(self._format())
+        self._formatted: str | None = None
+        super().__init__(msg)
 
     def add(self, msg: str, source: SourceLine | None = None) -> None:
         """Accumulate an additional error with optional source context."""
         self._accumulated.append((msg, source))
-        Exception.__init__(self, self._format())
+        self._formatted = None
 
     def __bool__(self) -> bool:
         """True when add() has been called at least once."""
         return len(self._accumulated) > 0
 
+    def __str__(self) -> str:
+        if self._formatted is None:
+            self._formatted = self._format()
+        return self._formatted
+
+    @property
+    def args(self) -> tuple[str]:
+        """The formatted message, as the only argument."""
+        return (str(self),)
+
+    @args.setter
+    def args(self, value: tuple[object, ...]) -> None:
+        # kept for pickling, which rebuilds the exception from these
+        vars(BaseException)["args"].__set__(self, value)
+
+    def records(self) -> list[ErrorRecord]:
+        """Return the errors as structured records.
+
+        These are the accumulated errors if any, else the error itself (the
+        message given at creation being then a mere heading).
+        """
+        if not self._accumulated:
+            return [_make_record(self._msg, self.source)]
+        return [_make_record(msg, src) for msg, src in self._accumulated]
+
     @staticmethod
-    def _mk_prefix(src: SourceLine) -> str:
-        """Build an error prefix showing the source location stack."""
+    def _mk_prefix(src: SourceLine, memo: dict[int, str] | None = None) -> str:
+        """Build an error prefix showing the source location stack.
 
-        def _add_to_stack(stack: list[str], src: SourceLine) -> None:
-            if src.line_nr is None:
-                stack += [f"  {pack(src.raw_text)}"]
-            else:
-                if src.parent and src.parent.is_container:
-                    nr = src.parent.line_nr + 1
-                    delta = src.line_nr + 1
-                    final = nr + delta
-                    stack += [f"  line {final}: {pack(src.raw_text)}"]
-                else:
-                    nr = src.line_nr + 1
-                    stack += [f"  line {nr}: {pack(src.raw_text)}"]
-            if src.parent:
-                _add_to_stack(stack, src.parent)
-
-        stack: list[str] = ["(most recent first)"]
-        _add_to_stack(stack, src)
-        stack += [""]
-        return "\n".join(stack) + "Error: "
+        Errors often share their parent chain (e.g. the lines of an included
+        file): memo maps the ids of visited lines to their stack text.
+        """
+        if memo is None:
+            memo = {}
+        return f"(most recent first)\n{_format_stack(src, memo)}\nError: "
 
     def _format(self) -> str:
         """Format all accumulated errors into a single message."""
+        memo: dict[int, str] = {}
         if self.source is not None:
-            base = f"{self._mk_prefix(self.source)}{self._msg}"
+            base = f"{self._mk_prefix(self.source, memo)}{self._msg}"
         else:
             base = self._msg
         if not self._accumulated:
@@ -61,7 +82,56 @@ class DfdException(Exception):
         parts = [base]
         for msg, src in self._accumulated:
             if src is not None:
-                parts.append(f"{self._mk_prefix(src)}{msg}")
+                parts.append(f"{self._mk_prefix(src, memo)}{msg}")
             else:
                 parts.append(msg)
         return "\n\n".join(parts)
+
+
+def _find_line_nr(src: SourceLine) -> int | None:
+    """Return the 1-based number of a source line, None if not a line."""
+    if src.line_nr is None:
+        return None
+    if src.parent and src.parent.is_container:
+        # line of a markdown snippet: count from the snippet start
+        return src.parent.line_nr + 1 + src.line_nr + 1
+    return src.line_nr + 1
+
+
+def _format_stack(src: SourceLine, memo: dict[int, str]) -> str:
+    """Format the lines of the stack of a source line, most recent first."""
+    # walk up to the first memoized ancestor
+    chain: list[SourceLine] = []
+    node: SourceLine | None = src
+    while node is not None and id(node) not in memo:
+        chain.append(node)
+        node = node.parent
+    stack = memo[id(node)] if node is not None else None
+
+    # then format down, memoizing each ancestor
+    for node in reversed(chain):
+        nr = _find_line_nr(node)
+        if nr is None:
+            line = f"  {pack(node.raw_text)}"
+        else:
+            line = f"  line {nr}: {pack(node.raw_text)}"
+        stack = line if stack is None else f"{line}\n{stack}"
+        memo[id(node)] = stack
+    assert stack is not None
+    return stack
+
+
+def _make_record(msg: str, src: SourceLine | None) -> ErrorRecord:
+    """Locate an error: the provenance of its line, and the line number.
+
+    Provenances are the synthetic, textless lines heading each source (the
+    input, an included file or snippet).
+    """
+    if src is None:
+        return ErrorRecord(None, None, msg)
+    line_nr = None if not src.text else _find_line_nr(src)
+    node: SourceLine | None = src
+    while node is not None and node.text:
+        node = node.parent
+    file = node.raw_text if node is not None else None
+    return ErrorRecord(file, line_nr, msg)
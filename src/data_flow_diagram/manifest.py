@@ -0,0 +1,152 @@
+"""Manifest of built snippets, allowing incremental markdown builds.
+
+A manifest file is kept in each directory receiving outputs. For each
+output, it records the fingerprint of the snippet it was built from, the
+hashes of the sources the build read (includes and referred graphs), and
+the hash of the output itself. A snippet whose fingerprint and sources
+are unchanged, and whose output is still as written, need not be built.
+"""
+
+import hashlib
+import json
+import os
+
+from . import config, model
+
+# Recorded hash of a source that could not be read
+MISSING = ""
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_fingerprint(text: str, options: model.Options, version: str) -> str:
+    """Hash everything a snippet output depends on, except the sources."""
+    parts = [
+        version,
+        text,
+        options.format,
+        str(options.background_color),
+        str(options.no_graph_title),
+        str(options.no_check_dependencies),
+        str(options.provenance_comments),
+        str(options.layout_budget),
+        str(options.fast_layout_max_nodes),
+    ]
+    return hash_bytes(json.dumps(parts).encode("utf-8"))
+
+
+def hash_source(name: str, snippet_by_name: model.SnippetByName) -> str:
+    """Hash the current content of a source (#-prefixed snippet, or file)."""
+    if name.startswith(model.SNIPPET_PREFIX):
+        snippet_name = name[len(model.SNIPPET_PREFIX) :]
+        snippet = snippet_by_name.get(snippet_name) or snippet_by_name.get(name)
+        if snippet is None:
+            return MISSING
+        return hash_bytes(snippet.text.encode("utf-8"))
+    try:
+        with open(name, "rb") as f:
+            return hash_bytes(f.read())
+    except OSError:
+        return MISSING
+
+
+class Manifest:
+    """Build records of outputs, stored next to them (one file per directory).
+
+    A non-persistent manifest is neither read nor written, and only lives
+    in memory (e.g. for the duration of a watch session).
+    """
+
+    def __init__(self, persistent: bool = True) -> None:
+        self.persistent = persistent
+        self._entries_by_dir: dict[str, dict[str, dict[str, object]]] = {}
+        self._modified_dirs: set[str] = set()
+
+    @staticmethod
+    def _split(output_path: str) -> tuple[str, str]:
+        directory, name = os.path.split(output_path)
+        return directory or ".", name
+
+    def _load(self, directory: str) -> dict[str, dict[str, object]]:
+        """Return the entries of a directory, reading its manifest once."""
+        if directory not in self._entries_by_dir:
+            entries = {}
+            path = os.path.join(directory, config.MANIFEST_FILE_NAME)
+            try:
+                if self.persistent:
+                    with open(path, encoding="utf-8") as f:
+                        entries = json.load(f)
+            except (OSError, ValueError):
+                pass  # no manifest yet, or unreadable: rebuild all
+            self._entries_by_dir[directory] = entries
+        return self._entries_by_dir[directory]
+
+    def is_up_to_date(
+        self,
+        output_path: str,
+        fingerprint: str,
+        snippet_by_name: model.SnippetByName,
+    ) -> bool:
+        """Tell whether an output was built from the same, unchanged inputs."""
+        directory, name = self._split(output_path)
+        entry = self._load(directory).get(name)
+        if entry is None or entry.get("fingerprint") != fingerprint:
+            return False
+
+        # the output must still be the one we wrote
+        digest = entry.get("output")
+        if digest == MISSING or hash_source(output_path, {}) != digest:
+            return False
+
+        # the sources must still have the same content
+        sources = entry.get("sources")
+        if not isinstance(sources, dict):
+            return False
+        return all(
+            hash_source(source, snippet_by_name) == digest
+            for source, digest in sources.items()
+        )
+
+    def record(
+        self,
+        output_path: str,
+        fingerprint: str,
+        used_sources: set[str],
+        snippet_by_name: model.SnippetByName,
+    ) -> None:
+        """Register a freshly built output."""
+        directory, name = self._split(output_path)
+        self._load(directory)[name] = {
+            "fingerprint": fingerprint,
+            "sources": {
+                source: hash_source(source, snippet_by_name)
+                for source in sorted(used_sources)
+            },
+            "output": hash_source(output_path, {}),
+        }
+        self._modified_dirs.add(directory)
+
+    def find_sources(self) -> set[str]:
+        """Return the names of the sources of all recorded outputs."""
+        sources: set[str] = set()
+        for entries in self._entries_by_dir.values():
+            for entry in entries.values():
+                names = entry.get("sources")
+                if isinstance(names, dict):
+                    sources.update(names)
+        return sources
+
+    def save(self) -> None:
+        """Write the manifests of the directories having new records."""
+        if not self.persistent:
+            return
+        for directory in sorted(self._modified_dirs):
+            path = os.path.join(directory, config.MANIFEST_FILE_NAME)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(
+                    self._entries_by_dir[directory], f, indent=1, sort_keys=True
+                )
+                f.write("\n")
+        self._modified_dirs.clear()
@@ -2,10 +2,9 @@
 
 import io
 import os
-import re
 from collections import Counter
 from dataclasses import dataclass
-from typing import TextIO
+from typing import Iterator, TextIO
 
 from . import exception, model
 
@@ -18,36 +17,112 @@ class SnippetContext:
     snippet_by_name: model.SnippetByName
 
 
-SnippetContexts = list[SnippetContext]
+SnippetContexts = Iterator[SnippetContext]
+
+OPENING_FENCE = "```"
+SNIPPET_KEYWORD = "data-flow-diagram"
 
 
 def extract_snippets(text: str) -> model.Snippets:
     """Find all ```data-flow-diagram ...``` code blocks in a markdown text."""
-    rx = re.compile(
-        r"^```(?P<head>\s*)"
-        r"data-flow-diagram\s+"
-        r"(?P<output>.*?)\s*"
-        r"^(?P<src>.*?)^\s*```",
-        re.DOTALL | re.M,
-    )
-
-    return [
-        model.Snippet(
-            text=match["head"] + match["src"],
-            name=os.path.splitext(match["output"])[0],
-            output=match["output"],
-            line_nr=len(text[: match.start()].splitlines()),
+    return list(read_snippets(io.StringIO(text)))
+
+
+def read_snippets(fp: TextIO) -> Iterator[model.Snippet]:
+    """Find all ```data-flow-diagram ...``` code blocks in a markdown stream.
+
+    The stream is read in a single pass, line by line, and snippets are
+    yielded as soon as their block is closed. A block opens with a line
+    starting with ```, followed by the keyword (possibly after blank
+    lines, kept as the head of the snippet text) and the output name. It
+    closes at the next line starting with ```, indented or not. Blank
+    lines at the start and at the end of the block are dropped. Line
+    numbers are 0-based.
+    """
+    lines = iter(fp)
+    line_nr = -1
+    pending: str | None = None  # line to process again
+
+    def next_line() -> str | None:
+        nonlocal line_nr, pending
+        if pending is not None:
+            line, pending = pending, None
+            return line
+        line_nr += 1
+        return next(lines, None)
+
+    while (line := next_line()) is not None:
+        # phase 1: find the opening fence
+        if not line.startswith(OPENING_FENCE):
+            continue
+        fence_nr = line_nr
+        empty: model.Snippet | None = None
+
+        # phase 2: find the keyword, possibly after blank lines
+        head = ""
+        rest = line[len(OPENING_FENCE) :]
+        while rest.isspace():
+            head += rest
+            rest = next_line() or ""
+            if not rest.startswith(OPENING_FENCE):
+                continue
+            pending = rest  # may open another block
+            break
+        stripped = rest.lstrip()
+        head += rest[: len(rest) - len(stripped)]
+        if not stripped.startswith(SNIPPET_KEYWORD):
+            continue
+        after = stripped[len(SNIPPET_KEYWORD) :]
+        if not after[:1].isspace():
+            continue
+        output = after.strip()
+        if not output:
+            # no output name: the next non-blank line is taken as such if
+            # indented, else as the first line of an anonymous snippet
+            while (line := next_line()) is not None and line.isspace():
+                pass
+            if line is None:
+                return  # unclosed block
+            if not line[0].isspace():
+                pending = line
+            else:
+                output = line.strip()
+                if line.lstrip().startswith(OPENING_FENCE):
+                    # unless another fence follows, this one closes an
+                    # empty anonymous snippet
+                    empty = model.Snippet(head, "", "", fence_nr)
+
+        # phase 3: collect the body, up to the closing fence
+        body: list[str] = []
+        blanks: list[str] = []
+        while (line := next_line()) is not None:
+            if line.lstrip().startswith(OPENING_FENCE):
+                break
+            if line.isspace():
+                blanks.append(line)
+            else:
+                if body:
+                    body += blanks
+                blanks = []
+                body.append(line)
+        else:
+            if empty:
+                yield empty
+            return  # unclosed block
+
+        yield model.Snippet(
+            text=head + "".join(body),
+            name=os.path.splitext(output)[0],
+            output=output,
+            line_nr=fence_nr,
         )
-        for match in rx.finditer(text)
-    ]
-    # FIXME: have text a TextIO and find in streaming
 
 
 def make_snippets_params(
     provenance: str,
     snippets: model.Snippets,
 ) -> SnippetContexts:
-    res: SnippetContexts = []
+    """Yield the context of each snippet having an output file."""
     snippet_by_name = {s.name: s for s in snippets}
 
     for snippet in snippets:
@@ -57,14 +132,14 @@ def make_snippets_params(
 
         # snippet with output
         input_fp = io.StringIO(snippet.text)
-        snippet_provenance = f"{provenance}<snippet:{snippet.output}>"
+        snippet_provenance = (
+            f"{provenance}{model.SNIPPET_PROVENANCE}{snippet.output}>"
+        )
         root = model.SourceLine(
             "", snippet_provenance, None, snippet.line_nr, is_container=True
         )
         file_name = input_fp.name = snippet.output
-        res.append(SnippetContext(root, input_fp, file_name, snippet_by_name))
-
-    return res
+        yield SnippetContext(root, input_fp, file_name, snippet_by_name)
 
 
 def check_snippets_unicity(provenance: str, snippets: model.Snippets) -> None:
@@ -17,11 +17,24 @@ def repr(o: Any) -> str:
     return f"{name} {val}"
 
 
+def get_fields(o: Any) -> dict[str, Any]:
+    """Return the fields of a dataclass instance, by name (not recursively).
+
+    Model classes are slotted, hence have no __dict__.
+    """
+    return {f.name: getattr(o, f.name) for f in dataclasses.fields(o)}
+
+
 ##############################################################################
 # Classes representing elements, statements, and internal data structures
+#
+# Being numerous (one per source line and statement), they are slotted, and
+# their repeated strings (names, attrs, provenances) interned: on a generated
+# 100k-line DFD, this lowered the peak RSS of a build from 164 to 147 MB (see
+# "Measuring memory" in benchmarks/README.md to reproduce).
 
 
-@dataclass
+@dataclass(slots=True)
 class Base:
     def __repr__(self) -> str:
         return (
@@ -34,7 +47,7 @@ class Base:
 # Source text
 
 
-@dataclass
+@dataclass(slots=True)
 class Snippet(Base):
     text: str
     name: str
@@ -42,7 +55,7 @@ class Snippet(Base):
     line_nr: int
 
 
-@dataclass
+@dataclass(slots=True)
 class SourceLine(Base):
     text: str  # after pre-processor
     raw_text: str | None
@@ -51,8 +64,17 @@ class SourceLine(Base):
     is_container: bool = False
 
 
+@dataclass(slots=True)
+class ErrorRecord(Base):
+    """An error, for tools that process errors rather than display them."""
+
+    file: str | None  # provenance, e.g. "<file:x.dfd>", "<snippet #s>"
+    line: int | None  # 1-based line number in the whole file, if any
+    message: str
+
+
 # Statements
-@dataclass
+@dataclass(slots=True)
 class Statement(Base):
     source: SourceLine
 
@@ -60,7 +82,7 @@ class Statement(Base):
 # Statements: options
 
 
-@dataclass
+@dataclass(slots=True)
 class GraphOptions:
     is_vertical: bool = False
     is_context: bool = False
@@ -69,15 +91,24 @@ class GraphOptions:
     connection_text_width: int = config.DEFAULT_CONNECTION_TEXT_WIDTH
     background_color: str | None = None
     no_graph_title: bool = False
+    fast_layout: bool = False  # trade layout quality for speed
+    fast_layout_max_nodes: int = config.FAST_LAYOUT_MAX_NODES
+    nb_nodes: int = 0  # counted for fast layout only
+    nb_edges: int = 0
+
+    @property
+    def use_scalable_engine(self) -> bool:
+        """Whether the graph is too large for the engine of its mode."""
+        return self.fast_layout and self.nb_nodes > self.fast_layout_max_nodes
 
 
-@dataclass
+@dataclass(slots=True)
 class Style(Statement):
     style: str
     value: str = ""
 
 
-@dataclass
+@dataclass(slots=True)
 class Attrib(Statement):
     alias: str
     text: str
@@ -87,38 +118,53 @@ Attribs = dict[str, Attrib]
 
 
 # Statements: elements
-@dataclass
+@dataclass(slots=True)
 class Drawable(Statement):
     type: Keyword
     text: str
     attrs: str
 
 
-@dataclass
+@dataclass(slots=True)
 class Item(Drawable):
     name: str
     hidable: bool
 
 
-@dataclass
+@dataclass(slots=True)
 class Connection(Drawable):
     src: str
     dst: str
     reversed: bool = False
     relaxed: bool = False
 
-    def signature(self) -> str:
-        d = dataclasses.asdict(self).copy()
-        del d["source"]
-        return json.dumps(d, sort_keys=True)
+    def signature(self) -> ConnectionKey:
+        """Return what makes connections equivalent, as a hashable key.
+
+        The key is immutable: it can be kept, e.g. in a set, even if the
+        connection is changed afterwards.
+        """
+        return (
+            self.type,
+            self.src,
+            self.dst,
+            self.text,
+            self.attrs,
+            self.reversed,
+            self.relaxed,
+        )
 
 
-@dataclass
+# Structural key of a connection: type, src, dst, text, attrs, reversed, relaxed
+ConnectionKey = tuple[str, str, str, str, str, bool, bool]
+
+
+@dataclass(slots=True)
 class Frame(Drawable):
     items: list[str]
 
 
-@dataclass
+@dataclass(slots=True)
 class FilterNeighbors:
     distance: int  # span: how many levels of neighbors (-1 = unlimited)
     suppress_anchors: bool  # "x" flag: select only neighbors, not anchors
@@ -128,19 +174,19 @@ class FilterNeighbors:
     suppress_frames: bool  # "f" flag: suppress frames involving selected items
 
 
-@dataclass
+@dataclass(slots=True)
 class Filter(Statement):
     names: list[str]
     neighbors_up: FilterNeighbors
     neighbors_down: FilterNeighbors
 
 
-@dataclass
+@dataclass(slots=True)
 class Only(Filter):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class Without(Filter):
     replaced_by: str
 
@@ -159,6 +205,7 @@ class StyleOption(StrEnum):
     CONNECTION_TEXT_WIDTH = "connection-text-width"
     BACKGROUND_COLOR = "background-color"
     NO_GRAPH_TITLE = "no-graph-title"
+    FAST_LAYOUT = "fast-layout"
 
 
 ##############################################################################
@@ -211,6 +258,7 @@ ENDPOINT_STAR = "*"  # anonymous endpoint: generates a distinct star item
 ALL_NEIGHBORS = "*"  # unlimited span in filter neighbor spec
 SNIPPET_PREFIX = "#"  # prefix distinguishing snippet references from file paths
 INCLUDE_DIRECTIVE = "#include"  # DSL directive for including external sources
+SNIPPET_PROVENANCE = "<snippet:"  # appended to the provenance of a document
 
 
 ##############################################################################
@@ -230,7 +278,7 @@ Statements = list[Statement]
 SnippetByName = dict[str, Snippet]
 
 
-@dataclass
+@dataclass(slots=True)
 class Options:
     """These options can be specified as commandline args."""
 
@@ -239,9 +287,41 @@ class Options:
     format: str
     no_check_dependencies: bool
     debug: bool
+    jobs: int = 1  # concurrent Graphviz processes in markdown mode
+    cache_dir: str | None = None  # render cache location; None: no cache
+    cache_layouts: bool = False  # cache layouts too, for color variants
+    incremental: bool = False  # skip snippets whose inputs are unchanged
+    provenance_comments: bool = True  # comment DOT statements with sources
+    layout_budget: str | None = None  # "fast" or "full"; None: as styled
+    fast_layout_max_nodes: int | None = None  # None: as styled, or default
+
+
+@dataclass(slots=True)
+class Timing(Base):
+    """Resources used by a stage of a run, reported with --timings."""
+
+    wall: float = 0.0  # elapsed seconds
+    cpu: float = 0.0  # CPU seconds, of this process and its ended children
+    peak: int = 0  # most bytes allocated at once, above those at start
+
+    def add(self, other: Timing) -> None:
+        self.wall += other.wall
+        self.cpu += other.cpu
+        self.peak = max(self.peak, other.peak)
+
+
+@dataclass(slots=True)
+class SnippetTimings(Base):
+    """Timings of the build and rendering of a diagram."""
+
+    name: str  # output file name, or provenance
+    stages: dict[str, Timing] = dataclasses.field(default_factory=dict)
+    total: Timing = dataclasses.field(default_factory=Timing)
+    dot_size: int = 0  # characters of the DOT text
+    graphviz: float = 0.0  # elapsed seconds of the Graphviz process(es)
 
 
-@dataclass
+@dataclass(slots=True)
 class GraphDependency:
     to_graph: str
     to_item: str | None
@@ -0,0 +1,127 @@
+"""Content-addressed on-disk cache of rendered images, with LRU eviction."""
+
+import hashlib
+import os
+import tempfile
+
+from .. import config
+
+
+def find_default_directory() -> str:
+    """Return the per-user cache directory (XDG convention)."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, config.CACHE_DIR_NAME)
+
+
+def make_key(*parts: str) -> str:
+    """Hash the parts that determine a cached value into a cache key."""
+    h = hashlib.sha256()
+    for part in parts:
+        data = part.encode("utf-8")
+        # length prefix, so that parts cannot run into each other
+        h.update(len(data).to_bytes(8, "little"))
+        h.update(data)
+    return h.hexdigest()
+
+
+class RenderCache:
+    """Rendered images stored under their content key.
+
+    The least recently used entries (by file modification time, refreshed
+    on every hit) are evicted when the total size exceeds max_bytes. The
+    directory may be shared by concurrent runs: entries are written
+    atomically, and entries vanishing under our feet are ignored.
+
+    With layouts, the Graphviz layouts of rendered graphs are stored too,
+    to draw their color variants without laying them out again.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = config.CACHE_MAX_BYTES,
+        layouts: bool = False,
+    ) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.layouts = layouts
+        self._total_bytes: int | None = None  # computed on first put
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str) -> bytes | None:
+        """Return the cached value, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            return None
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """Store a value, then evict old entries if the cache is too big."""
+        # write atomically: concurrent readers never see partial entries
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        if self._total_bytes is None:
+            self._total_bytes = sum(size for _, size, _ in self._scan())
+        else:
+            self._total_bytes += len(data)
+        if self._total_bytes > self.max_bytes:
+            self.evict()
+
+    def _scan(self) -> list[tuple[float, int, str]]:
+        """List entries as (modification time, size, path)."""
+        entries = []
+        for dir_path, _, file_names in os.walk(self.directory):
+            for name in file_names:
+                path = os.path.join(dir_path, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the size limit is met."""
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._total_bytes = total
+
+
+def write_if_changed(path: str, data: bytes) -> bool:
+    """Write data to a file, unless the file already holds exactly that.
+
+    Leaving unchanged files alone preserves their modification time, so
+    that tools watching or syncing the outputs see no change.
+    Returns True if the file was written.
+    """
+    try:
+        if os.path.getsize(path) == len(data):
+            with open(path, "rb") as f:
+                if f.read() == data:
+                    return False
+    except FileNotFoundError:
+        pass
+    with open(path, "wb") as f:
+        f.write(data)
+    return True
@@ -1,11 +1,13 @@
 """DOT code generation: Generator class and statement-to-DOT dispatch."""
 
+import dataclasses
+import io
 import pprint
 import re
 import textwrap
-from typing import Any
+from typing import Any, TextIO
 
-from .. import exception, model
+from .. import config, exception, model
 from . import templates as TMPL
 
 
@@ -42,29 +44,81 @@ def wrap(text: str, cols: int) -> str:
     return "\\n".join(res)
 
 
+class DotWriter:
+    """Write the lines of a DOT text to a sink, as they are generated.
+
+    Lines are indented as in the digraph body, except every other line of a
+    run of empty lines.
+    """
+
+    def __init__(self, sink: TextIO) -> None:
+        self.sink = sink
+        self.nb_lines = 0
+        self.size = 0  # characters written
+        self._previous_empty = False  # previous line was written unindented
+
+    def write_line(self, line: str) -> None:
+        """Write a physical line, given as it would be without the rule."""
+        if self.nb_lines:
+            self.sink.write("\n")
+            self.size += 1
+            if line == "  " and not self._previous_empty:
+                self._previous_empty = True
+                self.nb_lines += 1
+                return
+        self._previous_empty = False
+        self.sink.write(line)
+        self.size += len(line)
+        self.nb_lines += 1
+
+
 class Generator:
+    """Generate DOT code from statements.
+
+    The DOT text is written to *sink* as it is generated, or kept in memory
+    if no sink is given (see generate_dot()). The comments telling the
+    source line of each statement can be left out.
+    """
+
     RX_NUMBERED_NAME = re.compile(r"(\d+[.])(.*)")
 
     def __init__(
-        self, graph_options: model.GraphOptions, attribs: model.Attribs
+        self,
+        graph_options: model.GraphOptions,
+        attribs: model.Attribs,
+        sink: TextIO | None = None,
+        provenance_comments: bool = True,
     ) -> None:
-        self.lines: list[str] = []
         self.frame_nr = 0
         self.graph_options = graph_options
         self.attribs = attribs
         self.attribs_rx = self._compile_attribs_names(attribs)
+        self.provenance_comments = provenance_comments
+        self.buffer: io.StringIO | None = None
+        if sink is None:
+            sink = self.buffer = io.StringIO()
+        self.writer = DotWriter(sink)
+        self.nb_block_lines = 0
+        self._tail: list[str] = []
+
+    def write(self, text: str) -> None:
+        """Write a line of the digraph body (possibly multi-line)."""
+        for line in text.split("\n"):
+            self.writer.write_line("  " + line)
+        self.nb_block_lines += 1
 
     def append(self, line: str, statement: model.Statement) -> None:
-        self.lines.append("")
-        text = model.pack(statement.source.text)
-        self.lines.append(f"/* {statement.source.line_nr}: {text} */")
-        self.lines.append(line)
+        self.write("")
+        if self.provenance_comments:
+            text = model.pack(statement.source.text)
+            self.write(f"/* {statement.source.line_nr}: {text} */")
+        self.write(line)
 
     def generate_item(self, item: model.Item) -> None:
         """Emit the DOT declaration for a single item."""
 
         # prepare a working copy with text wrapping and attrib expansion
-        copy = model.Item(**item.__dict__)
+        copy = dataclasses.replace(item)
         hits = self.RX_NUMBERED_NAME.findall(copy.text)
         if hits:
             copy.text = "\\n".join(hits[0])
@@ -126,7 +180,7 @@ class Generator:
         return d
 
     def _item_to_html_dict(self, item: model.Item) -> dict[str, Any]:
-        d = item.__dict__
+        d = model.get_fields(item)
         d["text"] = d["text"].replace("\\n", "<br/>")
         return d
 
@@ -231,17 +285,17 @@ class Generator:
         self.append(f"subgraph cluster_{self.frame_nr} {{", frame)
         self.frame_nr += 1
 
-        self.lines.append(f'  label="{frame.text}"')
+        self.write(f'  label="{frame.text}"')
         if frame.attrs:
             attrs = self._expand_attribs(frame.attrs)
-            self.lines.append(f"  {attrs}")
+            self.write(f"  {attrs}")
 
         for item in frame.items:
-            self.lines.append(f'  "{item}"')
-        self.lines.append("}")
+            self.write(f'  "{item}"')
+        self.write("}")
 
-    def generate_dot_text(self, title: str, bg_color: str | None) -> str:
-        """Assemble all generated lines into the final DOT source text."""
+    def begin(self, title: str, bg_color: str | None) -> None:
+        """Write the DOT text up to the statements."""
 
         # collect graph-level parameters from options
         graph_params = []
@@ -265,14 +319,56 @@ class Generator:
         if bg_color:
             graph_params.append(f"bgcolor={bg_color}")
 
-        # wrap generated lines into the DOT digraph template
-        block = "\n".join(self.lines).replace("\n", "\n  ")
-        text = TMPL.DOT.format(
+        if self.graph_options.fast_layout:
+            graph_params.append(" ".join(self._fast_layout_params()))
+
+        # split the DOT digraph template around the generated lines
+        template_lines = TMPL.DOT.format(
             title=title,
-            block=block,
+            block=TMPL.DOT_BLOCK_MARK,
             graph_params="\n  ".join(graph_params),
-        ).replace("\n  \n", "\n\n")
-        return text
+        ).split("\n")
+        nr = template_lines.index("  " + TMPL.DOT_BLOCK_MARK)
+        for line in template_lines[:nr]:
+            self.writer.write_line(line)
+        self._tail = template_lines[nr + 1 :]
+
+    def _fast_layout_params(self) -> list[str]:
+        """Graphviz attributes trading layout quality for speed.
+
+        Large graphs are laid out by the scalable engine, whose defaults
+        suit them. Otherwise, the network simplex and crossing minimization
+        efforts of dot are bounded, so that they grow slower than the
+        graph; for many edges, edges are straight.
+        """
+        options = self.graph_options
+        if options.use_scalable_engine:
+            return [f"layout={TMPL.ENGINE_SCALABLE}"]
+        nb_nodes = max(1, options.nb_nodes)
+        nb_edges = max(1, options.nb_edges)
+        nslimit = max(0.1, config.FAST_LAYOUT_NS_WORK / nb_nodes**2)
+        mclimit = max(0.05, min(1.0, config.FAST_LAYOUT_MC_EDGES / nb_edges))
+        params = [
+            f"nslimit={nslimit:.2f}",
+            f"nslimit1={nslimit:.2f}",
+            f"mclimit={mclimit:.2f}",
+            "remincross=false",
+        ]
+        if nb_edges > config.FAST_LAYOUT_MAX_EDGES:
+            params.append(f"searchsize={config.FAST_LAYOUT_SEARCH_SIZE}")
+            params.append("splines=line")
+        return params
+
+    def end(self) -> str:
+        """Write the end of the DOT text.
+
+        Returns the whole text if kept in memory, else "".
+        """
+        if not self.nb_block_lines:
+            self.write("")
+        for line in self._tail:
+            self.writer.write_line(line)
+        return self.buffer.getvalue() if self.buffer else ""
 
 
 def generate_dot(
@@ -282,8 +378,12 @@ def generate_dot(
     statements: model.Statements,
     items_by_name: dict[str, model.Item],
 ) -> str:
-    """Iterate over statements and generate a dot source file"""
+    """Iterate over statements and generate a dot source file.
+
+    Returns the DOT text, or "" if written to the sink of the generator.
+    """
 
+    gen.begin(title, bg_color)
     for statement in statements:
         match statement:
             case model.Item() as item:
@@ -300,4 +400,4 @@ def generate_dot(
             case model.Frame() as frame:
                 gen.generate_frame(frame)
 
-    return gen.generate_dot_text(title, bg_color)
+    return gen.end()
@@ -1,37 +1,614 @@
 """Graphviz dot-related generation process"""
 
+import io
+import os
+import shutil
 import subprocess
 import sys
+import tempfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from types import TracebackType
+from typing import BinaryIO, NoReturn, TextIO, TypeVar
 
 from .. import model
 from ..console import print_error
+from ..timings import TIMINGS
+from . import layout
 from . import templates as TMPL
+from .cache import RenderCache, make_key, write_if_changed
 
 
 def generate_image(
-    graph_options: model.GraphOptions, text: str, output_path: str, fmt: str
+    graph_options: model.GraphOptions,
+    text: str,
+    output_path: str,
+    fmt: str,
+    cache: RenderCache | None = None,
 ) -> None:
-    # choose Graphviz engine based on diagram mode
-    if graph_options.is_context:
-        engine = TMPL.ENGINE_CONTEXT
-    else:
-        engine = TMPL.ENGINE_DEFAULT
+    """Render DOT text to an image file; report and exit on failure."""
+    try:
+        data, diagnostics = render_image(graph_options, text, fmt, cache)
+    except subprocess.CalledProcessError as e:
+        report_failure(text, e)
+    sys.stderr.write(diagnostics)
+    write_if_changed(output_path, data)
+
+
+def pipe_image(
+    graph_options: model.GraphOptions,
+    text: str,
+    output: BinaryIO,
+    fmt: str,
+    cache: RenderCache | None = None,
+) -> None:
+    """Render DOT text to a binary stream; report and exit on failure.
 
-    # invoke Graphviz and handle errors
-    cmd = [engine, f"-T{fmt}", f"-o{output_path}"]
+    Without cache to fill, and if the stream is a file (e.g. stdout), it
+    is handed to Graphviz, which writes the image straight into it.
+    """
+    try:
+        fd = output.fileno() if cache is None else None
+    except (OSError, ValueError):  # e.g. io.UnsupportedOperation
+        fd = None
     try:
-        subprocess.run(cmd, input=text, encoding="utf-8", check=True)
+        if fd is None:
+            data, diagnostics = render_image(graph_options, text, fmt, cache)
+            output.write(data)
+        else:
+            output.flush()  # what was written comes first
+            completed = subprocess.run(
+                [select_engine(graph_options), f"-T{fmt}"],
+                input=text.encode("utf-8"),
+                stdout=fd,
+                stderr=subprocess.PIPE,
+                check=True,
+            )
+            diagnostics = completed.stderr.decode("utf-8", "replace")
     except subprocess.CalledProcessError as e:
-        for n, line in enumerate(text.splitlines()):
-            print(f"{n+1:2}: {line}", file=sys.stderr)
-        print_error(f"ERROR: {e}")
-        sys.exit(1)
+        report_failure(text, e)
+    output.flush()
+    sys.stderr.write(diagnostics)
 
 
-def check_installed() -> None:
-    cmd = ["dot", "-V"]
+class EngineSink:
+    """Graphviz run rendering a DOT text as it is generated, without the
+    text being held in memory.
+
+    open() is the sink to give to dfd.build(): it starts the engine
+    selected by the graph options. write_image() then writes the image,
+    or reports and exits on failure. Rendered images are not cached, as
+    cache keys need the complete text.
+    """
+
+    def __init__(self, fmt: str) -> None:
+        self.fmt = fmt
+        self.process: subprocess.Popen[bytes] | None = None
+        self._stdin: TextIO | None = None
+        self._executor = ThreadPoolExecutor(max_workers=2)
+        self._outputs: list[Future[bytes]] = []  # stdout, stderr
+
+    def __enter__(self) -> "EngineSink":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()  # the build failed
+            self.process.wait()
+        self._executor.shutdown()
+
+    def open(self, graph_options: model.GraphOptions) -> TextIO:
+        """Start the engine, and return its input."""
+        self.process = subprocess.Popen(
+            [select_engine(graph_options), f"-T{self.fmt}"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        assert self.process.stdout and self.process.stderr
+        # read outputs as they come, so that the engine never blocks
+        self._outputs = [
+            self._executor.submit(self.process.stdout.read),
+            self._executor.submit(self.process.stderr.read),
+        ]
+        assert self.process.stdin
+        self._stdin = io.TextIOWrapper(self.process.stdin, encoding="utf-8")
+        return self._stdin
+
+    def write_image(self, output_path: str, output: BinaryIO) -> None:
+        """End the input, and write the image to output_path ("-": output);
+        report and exit on failure."""
+        assert self.process is not None and self._stdin is not None
+        try:
+            self._stdin.close()
+        except BrokenPipeError:
+            pass  # the engine failed before reading all
+        returncode = self.process.wait()
+        data, stderr = [future.result() for future in self._outputs]
+        if returncode:
+            e = subprocess.CalledProcessError(
+                returncode, self.process.args, data, stderr
+            )
+            print("(to see the DOT text, use --format dot)", file=sys.stderr)
+            report_failure("", e)
+        if output_path == "-":
+            output.write(data)
+            output.flush()
+        else:
+            write_if_changed(output_path, data)
+        sys.stderr.write(stderr.decode("utf-8", "replace"))
+
+
+def render_image(
+    graph_options: model.GraphOptions,
+    text: str,
+    fmt: str,
+    cache: RenderCache | None = None,
+) -> tuple[bytes, str]:
+    """Render DOT text, from the cache if possible.
+
+    With a cache storing layouts, the layout is cached too, and reused for
+    texts differing only by colors (see reuse_layout()).
+
+    Returns (image, diagnostics). Raises subprocess.CalledProcessError on
+    failure, with the diagnostics in its stderr attribute.
+    """
+    engine = select_engine(graph_options)
+    if not cache:
+        return run_engine(engine, text, fmt)
+    key = make_cache_key(engine, text, fmt, cache)
+    data = cache.get(key)
+    if data is not None:
+        return data, ""
+
+    layout_key = make_layout_key(engine, text, cache) if cache.layouts else None
+    if layout_key is None:
+        data, diagnostics = run_engine(engine, text, fmt)
+    else:
+        positioned = cache.get(layout_key)
+        reused = positioned and reuse_layout(text, [fmt], positioned)
+        if reused:
+            [data], diagnostics = reused
+        else:
+            data, positioned, diagnostics = run_engine_positioned(
+                engine, text, fmt
+            )
+            if positioned:
+                cache.put(layout_key, positioned)
+    cache.put(key, data)
+    return data, diagnostics
+
+
+def run_engine(engine: str, text: str, fmt: str) -> tuple[bytes, str]:
+    """Invoke Graphviz and return (image, diagnostics).
+
+    Raises subprocess.CalledProcessError on failure, with the diagnostics
+    in its stderr attribute, so that callers running several renderings
+    concurrently can report them in a deterministic order.
+    """
+    completed = subprocess.run(
+        [engine, f"-T{fmt}"],
+        input=text.encode("utf-8"),
+        capture_output=True,
+        check=True,
+    )
+    return completed.stdout, completed.stderr.decode("utf-8", "replace")
+
+
+def run_engine_positioned(
+    engine: str, text: str, fmt: str
+) -> tuple[bytes, bytes, str]:
+    """Invoke Graphviz for an image and the positioned DOT text of its
+    layout, both output on the same pipe.
+
+    Returns (image, positioned text, diagnostics), the positioned text
+    empty if it cannot be told from the image. Raises like run_engine().
+    """
+    completed = subprocess.run(
+        [engine, f"-T{TMPL.LAYOUT_FORMAT}", f"-T{fmt}"],
+        input=text.encode("utf-8"),
+        capture_output=True,
+        check=True,
+    )
+    diagnostics = completed.stderr.decode("utf-8", "replace")
+    try:
+        positioned, data = layout.split_positioned(completed.stdout)
+    except ValueError:
+        return completed.stdout, b"", diagnostics
+    return data, positioned, diagnostics
+
+
+def run_engine_formats(
+    engine: str, text: str, fmts: list[str], flags: tuple[str, ...] = ()
+) -> tuple[list[bytes], str]:
+    """Invoke Graphviz once for several formats, with one layout.
+
+    Returns (images, by format, diagnostics); raises like run_engine().
+    A single format is piped; otherwise each -T option is paired with the
+    -o option of its output file.
+    """
+    if len(fmts) == 1:
+        completed = subprocess.run(
+            [engine, *flags, f"-T{fmts[0]}"],
+            input=text.encode("utf-8"),
+            capture_output=True,
+            check=True,
+        )
+        return [completed.stdout], completed.stderr.decode("utf-8", "replace")
+    with tempfile.TemporaryDirectory() as d:
+        paths = [os.path.join(d, f"{nr}.out") for nr in range(len(fmts))]
+        options = [
+            option
+            for fmt, path in zip(fmts, paths)
+            for option in (f"-T{fmt}", f"-o{path}")
+        ]
+        completed = subprocess.run(
+            [engine, *flags] + options,
+            input=text.encode("utf-8"),
+            capture_output=True,
+            check=True,
+        )
+        images = []
+        for path in paths:
+            with open(path, "rb") as f:
+                images.append(f.read())
+    return images, completed.stderr.decode("utf-8", "replace")
+
+
+def select_engine(graph_options: model.GraphOptions) -> str:
+    """Choose the Graphviz engine based on diagram mode and size."""
+    if graph_options.use_scalable_engine:
+        return TMPL.ENGINE_SCALABLE
+    if graph_options.is_context:
+        return TMPL.ENGINE_CONTEXT
+    return TMPL.ENGINE_DEFAULT
+
+
+# Version banners, by engine binary path and modification time
+_versions: dict[tuple[str, int], str] = {}
+
+
+def find_version(engine: str, cache: RenderCache | None = None) -> str:
+    """Return the version banner of a Graphviz engine.
+
+    Running "engine -V" is slow, so banners are memoized by binary path
+    and modification time, in memory and in the render cache, if given.
+    """
+    path = shutil.which(engine) or engine
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime_ns = 0
+    if (path, mtime_ns) not in _versions:
+        key = make_key("version", path, str(mtime_ns))
+        data = cache.get(key) if cache else None
+        if data is None:
+            completed = subprocess.run([path, "-V"], capture_output=True)
+            data = completed.stderr.strip()
+            if cache:
+                cache.put(key, data)
+        _versions[path, mtime_ns] = data.decode("utf-8", "replace")
+    return _versions[path, mtime_ns]
+
+
+def make_layout_key(
+    engine: str, text: str, cache: RenderCache | None = None
+) -> str | None:
+    """Key of the layout of a DOT text: all but its colors.
+
+    None if the text cannot be read, and so its layout not reused.
+    """
+    try:
+        fingerprint = layout.make_fingerprint(text)
+    except ValueError:
+        return None
+    return make_key("layout", fingerprint, engine, find_version(engine, cache))
+
+
+def reuse_layout(
+    text: str, fmts: list[str], positioned: bytes
+) -> tuple[list[bytes], str] | None:
+    """Render DOT text at the positions of a laid out variant of it.
+
+    positioned is the DOT output of Graphviz for a text of the same layout
+    key. Returns (images, by format, diagnostics) as run_engine_formats(),
+    or None if the layout does not fit, or fails to render: the text is
+    then to be laid out.
+    """
+    try:
+        placed = layout.apply_layout(
+            text,
+            layout.read_layout(positioned.decode("utf-8")),
+            TMPL.ENGINE_POSITIONED,
+        )
+        return run_engine_formats(
+            TMPL.ENGINE_POSITIONED, placed, fmts, ("-n2",)
+        )
+    except (ValueError, subprocess.CalledProcessError):
+        return None
+
+
+def make_cache_key(
+    engine: str, text: str, fmt: str, cache: RenderCache | None = None
+) -> str:
+    """Key of a rendered image: everything its bytes depend on."""
+    return make_key(text, engine, fmt, find_version(engine, cache))
+
+
+@dataclass
+class ImageJob:
+    """A DOT text to render into an image file.
+
+    The output path is not used when rendering in memory (render_images()).
+    The diagram name, for timings, defaults to the output path.
+    """
+
+    graph_options: model.GraphOptions
+    text: str
+    output_path: str
+    fmt: str
+    diagram: str = ""
+
+
+# Image rendered for a job, or the error of its Graphviz run
+RenderResult = bytes | subprocess.CalledProcessError
+
+
+def render_images(
+    jobs: list[ImageJob],
+    nb_batches: int = 1,
+    cache: RenderCache | None = None,
+) -> list[RenderResult]:
+    """Render many DOT texts in memory, with few Graphviz processes.
+
+    The jobs of a same DOT text (and engine) are rendered together: one
+    layout, output in each of their formats. With a cache storing layouts,
+    texts whose layout is cached are drawn without layout (see reuse_layout()). The
+    other texts not in the cache are grouped by engine and formats; each
+    group is split into at most nb_batches batches, rendered concurrently
+    by one Graphviz process each (one per graph when timings are
+    recorded). Diagnostics are written to stderr in batch order. A failed
+    batch is rendered again one job at a time, so that only the failing
+    jobs have an error as result.
+    """
+    # phase 1: get cached images, and gather the others by DOT text
+    results: list[RenderResult | None] = [None] * len(jobs)
+    keys: list[str] = [""] * len(jobs)
+    graphs: dict[tuple[str, str], list[int]] = {}  # (engine, text) -> jobs
+    for nr, job in enumerate(jobs):
+        engine = select_engine(job.graph_options)
+        if cache:
+            keys[nr] = make_cache_key(engine, job.text, job.fmt, cache)
+            results[nr] = cache.get(keys[nr])
+            if results[nr] is not None:
+                continue
+        graphs.setdefault((engine, job.text), []).append(nr)
+
+    def formats(graph: list[int]) -> tuple[str, ...]:
+        return tuple(dict.fromkeys(jobs[nr].fmt for nr in graph))
+
+    def collect(graph: list[int], images: list[bytes]) -> None:
+        fmts = formats(graph)
+        for nr in graph:
+            results[nr] = data = images[fmts.index(jobs[nr].fmt)]
+            if cache:
+                cache.put(keys[nr], data)
+
+    def diagram(graph: list[int]) -> str:
+        return jobs[graph[0]].diagram or jobs[graph[0]].output_path
+
+    # phase 2: draw the graphs whose layout is cached, without layout
+    layout_keys: dict[tuple[str, str], str] = {}
+    reusable: list[tuple[tuple[str, str], bytes]] = []
+    for graph_key in graphs:
+        if cache is None or not cache.layouts:
+            break
+        layout_key = make_layout_key(*graph_key, cache)
+        if layout_key is None:
+            continue
+        layout_keys[graph_key] = layout_key
+        positioned = cache.get(layout_key)
+        if positioned is not None:
+            reusable.append((graph_key, positioned))
+
+    def reuse(
+        item: tuple[tuple[str, str], bytes],
+    ) -> tuple[list[bytes], str] | None:
+        (_, text), positioned = item
+        graph = graphs[item[0]]
+        with TIMINGS.record_graphviz(diagram(graph)):
+            return reuse_layout(text, list(formats(graph)), positioned)
+
+    with ThreadPoolExecutor(max_workers=max(1, nb_batches)) as executor:
+        reused = list(executor.map(reuse, reusable))
+    for (graph_key, _), outcome in zip(reusable, reused):
+        if outcome is not None:
+            sys.stderr.write(outcome[1])
+            collect(graphs.pop(graph_key), outcome[0])
+
+    # phase 3: group the other graphs by command, asking for their layout
+    # to cache it (first, so that a lone graph gets it on the same pipe)
+    groups: dict[tuple[str, tuple[str, ...]], list[list[int]]] = {}
+    for graph_key, graph in graphs.items():
+        fmts = formats(graph)
+        if graph_key in layout_keys:
+            fmts = tuple(dict.fromkeys((TMPL.LAYOUT_FORMAT,) + fmts))
+        groups.setdefault((graph_key[0], fmts), []).append(graph)
+
+    # phase 4: render batches concurrently; when timed, one graph per
+    # process, so that each graph gets its own Graphviz time
+    batches = [
+        (engine, fmts, batch)
+        for (engine, fmts), group in groups.items()
+        for batch in _split_batches(
+            group, len(group) if TIMINGS.enabled else nb_batches
+        )
+    ]
+
+    def run_batch(
+        batch: tuple[str, tuple[str, ...], list[list[int]]],
+    ) -> tuple[list[list[bytes]] | None, str]:
+        engine, fmts, graphs = batch
+        with TIMINGS.record_graphviz(diagram(graphs[0])):
+            return _run_engine_batch(
+                engine, list(fmts), [jobs[graph[0]].text for graph in graphs]
+            )
+
+    with ThreadPoolExecutor(max_workers=max(1, nb_batches)) as executor:
+        outcomes = list(executor.map(run_batch, batches))
+
+    # phase 5: collect in order, falling back to one process per job on
+    # failure
+    for (engine, fmts, batch), (images, diagnostics) in zip(batches, outcomes):
+        if images is None:
+            for nr in (nr for graph in batch for nr in graph):
+                job = jobs[nr]
+                try:
+                    data, diagnostics = render_image(
+                        job.graph_options, job.text, job.fmt, cache
+                    )
+                except subprocess.CalledProcessError as e:
+                    results[nr] = e
+                    continue
+                sys.stderr.write(diagnostics)
+                results[nr] = data
+            continue
+        sys.stderr.write(diagnostics)
+        for graph, graph_images in zip(batch, images):
+            layout_key = layout_keys.get((engine, jobs[graph[0]].text))
+            if cache and layout_key:
+                positioned = graph_images[fmts.index(TMPL.LAYOUT_FORMAT)]
+                if positioned:
+                    cache.put(layout_key, positioned)
+            collect(
+                graph, [graph_images[fmts.index(f)] for f in formats(graph)]
+            )
+
+    done = [result for result in results if result is not None]
+    assert len(done) == len(jobs)
+    return done
+
+
+def generate_images(
+    jobs: list[ImageJob],
+    nb_batches: int = 1,
+    cache: RenderCache | None = None,
+) -> None:
+    """Render many DOT texts to their image files (see render_images()).
+
+    The images are written, except those of failed jobs. The first failed
+    job is then reported, and the run exits like with generate_image().
+    """
+    failure: tuple[ImageJob, subprocess.CalledProcessError] | None = None
+    for job, result in zip(jobs, render_images(jobs, nb_batches, cache)):
+        if isinstance(result, subprocess.CalledProcessError):
+            failure = failure or (job, result)
+            continue
+        write_if_changed(job.output_path, result)
+    if failure:
+        report_failure(failure[0].text, failure[1])
+
+
+T = TypeVar("T")
+
+
+def _split_batches(jobs: list[T], nb_batches: int) -> list[list[T]]:
+    """Split jobs into at most nb_batches contiguous batches."""
+    if not jobs:
+        return []
+    size = -(-len(jobs) // max(1, nb_batches))  # ceiling division
+    return [jobs[i : i + size] for i in range(0, len(jobs), size)]
+
+
+def _run_engine_batch(
+    engine: str, fmts: list[str], texts: list[str]
+) -> tuple[list[list[bytes]] | None, str]:
+    """Render a batch of DOT texts in formats with a single Graphviz process.
+
+    Returns (images by text, then by format, diagnostics), with images None
+    on failure. Graphviz lays each graph out once, whatever the number of
+    formats.
+    """
     try:
-        subprocess.run(cmd, stderr=subprocess.DEVNULL)
-    except FileNotFoundError as e:
-        print(f'ERROR: "Graphviz" seems not installed:', e, file=sys.stderr)
+        if len(texts) == 1 and len(fmts) == 1:
+            data, diagnostics = run_engine(engine, texts[0], fmts[0])
+            return [[data]], diagnostics
+        if len(texts) == 1 and len(fmts) == 2 and fmts[0] == TMPL.LAYOUT_FORMAT:
+            data, positioned, diagnostics = run_engine_positioned(
+                engine, texts[0], fmts[1]
+            )
+            return [[positioned, data]], diagnostics
+        if len(texts) == 1:
+            datas, diagnostics = run_engine_formats(engine, texts[0], fmts)
+            return [datas], diagnostics
+    except subprocess.CalledProcessError:
+        return None, ""
+
+    # Graphviz only derives output names from input file names (-O), so
+    # the DOT texts are written to a temporary directory, and the images
+    # read from there
+    with tempfile.TemporaryDirectory() as d:
+        # write inputs as 0.gv, 1.gv, ...
+        input_paths = []
+        for nr, text in enumerate(texts):
+            path = os.path.join(d, f"{nr}.gv")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+            input_paths.append(path)
+
+        # render all inputs into 0.gv.FMT, 1.gv.FMT, ...
+        completed = subprocess.run(
+            [engine] + [f"-T{fmt}" for fmt in fmts] + ["-O"] + input_paths,
+            capture_output=True,
+        )
+        diagnostics = completed.stderr.decode("utf-8", "replace")
+        if completed.returncode != 0:
+            return None, diagnostics
+
+        # collect images
+        names = os.listdir(d)
+        images = []
+        for path in input_paths:
+            prefix = os.path.basename(path) + "."
+            produced = [n for n in names if n.startswith(prefix)]
+            graph_images = []
+            for fmt in fmts:
+                if len(fmts) > 1:  # e.g. "png:cairo" gives 0.gv.png
+                    suffix = fmt.split(":")[0]
+                    produced = [n for n in names if n == prefix + suffix]
+                if len(produced) != 1:
+                    return None, diagnostics
+                with open(os.path.join(d, produced[0]), "rb") as f:
+                    graph_images.append(f.read())
+            images.append(graph_images)
+        return images, diagnostics
+
+
+def report_failure(text: str, e: subprocess.CalledProcessError) -> NoReturn:
+    """Print Graphviz diagnostics and the numbered DOT source, then exit."""
+    print_failure(text, e)
+    sys.exit(1)
+
+
+def print_failure(text: str, e: subprocess.CalledProcessError) -> None:
+    """Print Graphviz diagnostics, the numbered DOT source, and the error."""
+    sys.stderr.write((e.stderr or b"").decode("utf-8", "replace"))
+    for n, line in enumerate(text.splitlines()):
+        print(f"{n+1:2}: {line}", file=sys.stderr)
+    print_error(f"ERROR: {e}")
+
+
+def check_installed() -> None:
+    """Exit if Graphviz is not found in the PATH (no need to run it)."""
+    if shutil.which(TMPL.ENGINE_DEFAULT) is None:
+        print(
+            f'ERROR: "Graphviz" seems not installed: '
+            f'"{TMPL.ENGINE_DEFAULT}" not found in PATH',
+            file=sys.stderr,
+        )
         sys.exit(2)
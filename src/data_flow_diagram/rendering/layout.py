@@ -0,0 +1,399 @@
+"""Reuse of Graphviz layouts for DOT texts differing only by colors.
+
+Laying out is most of the Graphviz time, but colors (background, fills,
+fonts) do not change positions. The layout of a graph is kept as the
+positioned DOT text Graphviz outputs with -Tdot, under the fingerprint of
+the text with its colors left out. A variant of the graph, e.g. in another
+theme, is then rendered by injecting the kept positions into its text, and
+running "neato -n2", which draws without laying out.
+
+Layouts are only cached on demand (--cache-layouts), as fingerprinting
+costs a pass of the tokenizer over each DOT text. The positioned text is
+then output by the same Graphviz run as the image, first on its stdout
+(see split_positioned()).
+
+Only the DOT produced by this tool, and the output of Graphviz, are to be
+read: the reader knows the DOT syntax, not every Graphviz extension.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Iterator
+
+from .cache import make_key
+
+# Attributes not involved in the layout, and left out of fingerprints
+PAINT_ATTRIBUTES = {
+    "bgcolor",
+    "color",
+    "fillcolor",
+    "fontcolor",
+    "labelfontcolor",
+    "pencolor",
+}
+
+# Attributes set by the layout, copied from the positioned text
+POSITION_ATTRIBUTES = {
+    "bb",
+    "head_lp",
+    "height",
+    "lheight",
+    "lp",
+    "lwidth",
+    "pos",
+    "rects",
+    "tail_lp",
+    "width",
+    "xlp",
+}
+
+RX_TOKEN = re.compile(
+    r"""
+    (?P<space>\s+|/\*.*?\*/|//[^\n]*|^\#[^\n]*)
+    | (?P<string>"(?:[^"\\]|\\.)*")
+    | (?P<edge>->|--)
+    | (?P<id>-?(?:\.\d+|\d+(?:\.\d*)?)|[A-Za-z_\x80-\U0010ffff][\w\x80-\U0010ffff]*)
+    | (?P<punct>[{}\[\];,=:])
+    | (?P<html><)
+    """,
+    re.VERBOSE | re.DOTALL | re.MULTILINE,
+)
+
+RX_HTML_PAINT = re.compile(r'\b(?:BG)?COLOR\s*=\s*"[^"]*"', re.IGNORECASE)
+
+
+@dataclass
+class Token:
+    kind: str  # "id" (incl. strings), "html", "edge" or "punct"
+    value: str  # unquoted, for strings
+    start: int
+    end: int
+
+
+def tokenize(text: str) -> Iterator[Token]:
+    """Split DOT text into tokens, skipping spaces and comments.
+
+    Raises ValueError on text that is not DOT.
+    """
+    pos = 0
+    while pos < len(text):
+        m = RX_TOKEN.match(text, pos)
+        if m is None:
+            raise ValueError(f"Unexpected DOT text at {pos}")
+        kind = m.lastgroup
+        assert kind is not None
+        if kind == "html":
+            end = _find_html_end(text, pos)
+            yield Token("html", text[pos + 1 : end - 1], pos, end)
+            pos = end
+            continue
+        pos = m.end()
+        if kind == "space":
+            continue
+        value = m.group()
+        if kind == "string":
+            kind = "id"
+            value = value[1:-1].replace("\\\n", "").replace('\\"', '"')
+        yield Token(kind, value, m.start(), pos)
+
+
+def _find_html_end(text: str, start: int) -> int:
+    """Return the end of the HTML string starting at start: <...>."""
+    depth = 0
+    for nr in range(start, len(text)):
+        if text[nr] == "<":
+            depth += 1
+        elif text[nr] == ">":
+            depth -= 1
+            if not depth:
+                return nr + 1
+    raise ValueError(f"Unclosed HTML string at {start}")
+
+
+def split_positioned(output: bytes) -> tuple[bytes, bytes]:
+    """Split the stdout of Graphviz run with -Tdot and then another -T
+    option into (positioned DOT text, other output).
+
+    Raises ValueError if the output does not start with a DOT graph.
+    """
+    text = output.decode("latin-1")  # a char per byte: offsets are kept
+    depth = 0
+    for token in tokenize(text):
+        if token.kind != "punct" or token.value not in "{}":
+            continue
+        depth += 1 if token.value == "{" else -1
+        if not depth:
+            end = token.end
+            if output[end : end + 1] == b"\n":
+                end += 1
+            return output[:end], output[end:]
+    raise ValueError("No DOT graph at the start of the output")
+
+
+def make_fingerprint(text: str) -> str:
+    """Fingerprint of what the layout of a DOT text depends on.
+
+    Comments, spacing and colors are left out.
+    """
+    parts = []
+    tokens = list(tokenize(text))
+    nr = 0
+    while nr < len(tokens):
+        token = tokens[nr]
+        if (
+            token.kind == "id"
+            and token.value in PAINT_ATTRIBUTES
+            and nr + 2 < len(tokens)
+            and tokens[nr + 1].value == "="
+        ):
+            nr += 3  # name = value
+            continue
+        if token.kind == "html":
+            parts.append("<" + RX_HTML_PAINT.sub("", token.value))
+        else:
+            parts.append(token.value)
+        nr += 1
+    return make_key(*parts)
+
+
+@dataclass
+class Statement:
+    """A DOT statement; edge chains are split into single edges."""
+
+    kind: str  # "node", "edge", "graph" (attributes of a (sub)graph)
+    names: list[str]  # node or edge end names, or subgraph path
+    attrs: dict[str, str]
+    insert_at: int  # where to insert attributes: before "]", or at end
+    has_list: bool  # has an attribute list
+
+
+@dataclass
+class Layout:
+    """Positions of a laid out graph, by graph element."""
+
+    graphs: dict[tuple[str, ...], dict[str, str]] = field(default_factory=dict)
+    nodes: dict[str, dict[str, str]] = field(default_factory=dict)
+    edges: dict[tuple[str, str], list[dict[str, str]]] = field(
+        default_factory=dict
+    )
+
+
+class _Reader:
+    """Read the statements of a DOT graph."""
+
+    def __init__(self, text: str) -> None:
+        self.tokens = list(tokenize(text))
+        self.nr = 0
+        self.path: list[str] = []  # of subgraph names, "" if anonymous
+        self.end = 0  # offset of the closing brace of the graph
+
+    def peek(self) -> Token | None:
+        return self.tokens[self.nr] if self.nr < len(self.tokens) else None
+
+    def at(self, value: str) -> bool:
+        """Tell if the next token is the punctuation or edge op value."""
+        token = self.peek()
+        return token is not None and token.kind != "id" and token.value == value
+
+    def at_id(self) -> bool:
+        token = self.peek()
+        return token is not None and token.kind == "id"
+
+    def next(self) -> Token:
+        token = self.peek()
+        if token is None:
+            raise ValueError("Unexpected end of DOT text")
+        self.nr += 1
+        return token
+
+    def expect(self, value: str) -> Token:
+        if not self.at(value):
+            raise ValueError(f'Expected "{value}" at {self.next().start}')
+        return self.next()
+
+    def read(self) -> Iterator[Statement]:
+        token = self.next()
+        if token.value == "strict":
+            token = self.next()
+        if token.value not in ("digraph", "graph"):
+            raise ValueError("Not a DOT graph")
+        if self.at_id():
+            self.next()
+        self.expect("{")
+        yield from self._read_body()
+        if self.peek() is not None:
+            raise ValueError("Unexpected text after the DOT graph")
+
+    def _read_body(self) -> Iterator[Statement]:
+        while True:
+            if self.at("}"):
+                if not self.path:
+                    self.end = self.next().start
+                else:
+                    self.next()
+                return
+            if self.at(";") or self.at(","):
+                self.next()
+                continue
+            if self.at("{"):
+                self.next()
+                yield from self._read_subgraph("")
+                continue
+            token = self.next()
+            if token.kind != "id":
+                raise ValueError(f"Unexpected DOT text at {token.start}")
+            if token.value == "subgraph":
+                name = self.next().value if self.at_id() else ""
+                self.expect("{")
+                yield from self._read_subgraph(name)
+            elif token.value in ("graph", "node", "edge") and self.at("["):
+                attrs, insert_at = self._read_attrs()
+                if token.value == "graph":
+                    yield Statement(
+                        "graph", list(self.path), attrs, insert_at, True
+                    )
+            elif self.at("="):
+                self.next()
+                value = self.next()
+                yield Statement(
+                    "graph",
+                    list(self.path),
+                    {token.value: value.value},
+                    value.end,
+                    False,
+                )
+            else:
+                yield from self._read_node_or_edges(token)
+
+    def _read_subgraph(self, name: str) -> Iterator[Statement]:
+        self.path.append(name)
+        yield from self._read_body()
+        self.path.pop()
+
+    def _read_node_id(self, token: Token) -> str:
+        """Read a node id, leaving out its port."""
+        while self.at(":"):
+            self.next()
+            self.next()
+        return token.value
+
+    def _read_attrs(self) -> tuple[dict[str, str], int]:
+        """Read attribute lists: [a=b, ...] [...]; return them, and the
+        offset of the last closing bracket."""
+        attrs: dict[str, str] = {}
+        insert_at = 0
+        while self.at("["):
+            self.next()
+            while not self.at("]"):
+                if self.at(",") or self.at(";"):
+                    self.next()
+                    continue
+                name = self.next()
+                self.expect("=")
+                attrs[name.value] = self.next().value
+            insert_at = self.next().start
+        return attrs, insert_at
+
+    def _read_node_or_edges(self, token: Token) -> Iterator[Statement]:
+        names = [self._read_node_id(token)]
+        while self.at("->") or self.at("--"):
+            self.next()
+            end = self.next()
+            if end.kind != "id":
+                raise ValueError(f"Unsupported edge end at {end.start}")
+            names.append(self._read_node_id(end))
+        last = self.tokens[self.nr - 1]
+        has_list = self.at("[")
+        attrs, insert_at = self._read_attrs()
+        if not has_list:
+            insert_at = last.end
+        if len(names) == 1:
+            yield Statement("node", names, attrs, insert_at, has_list)
+        for src, dst in zip(names, names[1:]):
+            yield Statement("edge", [src, dst], attrs, insert_at, has_list)
+
+
+def _positions(attrs: dict[str, str]) -> dict[str, str]:
+    return {k: v for k, v in attrs.items() if k in POSITION_ATTRIBUTES}
+
+
+def read_layout(positioned: str) -> Layout:
+    """Read the positions of a graph from the -Tdot output of Graphviz."""
+    layout = Layout()
+    for statement in _Reader(positioned).read():
+        positions = _positions(statement.attrs)
+        match statement.kind:
+            case "graph":
+                if positions and "" not in statement.names:  # not anonymous
+                    path = tuple(statement.names)
+                    layout.graphs.setdefault(path, {}).update(positions)
+            case "node":
+                name = statement.names[0]
+                layout.nodes.setdefault(name, {}).update(positions)
+            case "edge":
+                src, dst = statement.names
+                layout.edges.setdefault((src, dst), []).append(positions)
+    return layout
+
+
+def _quote(value: str) -> str:
+    return '"' + value.replace('"', '\\"') + '"'
+
+
+def _format_attrs(attrs: dict[str, str]) -> str:
+    return " ".join(f"{name}={_quote(value)}" for name, value in attrs.items())
+
+
+def apply_layout(text: str, layout: Layout, engine: str) -> str:
+    """Return the DOT text, positioned as the layout tells.
+
+    The positions of edges are inserted into their statements, those of
+    nodes and (sub)graphs added at the end of the graph, which is to be
+    rendered by engine -n2. Raises ValueError if the layout does not fit
+    the text.
+    """
+    reader = _Reader(text)
+    insertions: list[tuple[int, str]] = []
+    counts: dict[tuple[str, str], int] = {}
+    nodes = set()
+    for statement in reader.read():
+        if statement.kind == "node":
+            nodes.add(statement.names[0])
+        if statement.kind != "edge":
+            continue
+        src, dst = statement.names
+        nodes |= {src, dst}
+        nr = counts[src, dst] = counts.get((src, dst), 0) + 1
+        edges = layout.edges.get((src, dst), [])
+        if nr > len(edges):
+            raise ValueError(f'No layout for edge "{src}" -> "{dst}"')
+        attrs = _format_attrs(edges[nr - 1])
+        if statement.has_list:
+            insertions.append((statement.insert_at, f" {attrs}"))
+        else:
+            insertions.append((statement.insert_at, f" [{attrs}]"))
+    if counts != {edge: len(layout.edges[edge]) for edge in layout.edges}:
+        raise ValueError("Layout of other edges")
+    if nodes != set(layout.nodes):
+        raise ValueError("Layout of other nodes")
+
+    tail = []
+    for name, positions in layout.nodes.items():
+        tail.append(f"  {_quote(name)} [{_format_attrs(positions)}]")
+    for path, positions in layout.graphs.items():
+        if not path:
+            continue
+        heads = " ".join(f"subgraph {_quote(name)} {{" for name in path)
+        attrs = _format_attrs(positions)
+        tail.append(f"  {heads} graph [{attrs}] " + "}" * len(path))
+    graph = dict(layout.graphs.get((), {}), layout=engine)
+    tail.append(f"  graph [{_format_attrs(graph)}]\n")
+    insertions.append((reader.end, "\n".join(tail)))
+
+    parts = []
+    pos = 0
+    for offset, insertion in sorted(insertions):
+        parts += [text[pos:offset], insertion]
+        pos = offset
+    parts.append(text[pos:])
+    return "".join(parts)
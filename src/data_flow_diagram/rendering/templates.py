@@ -39,6 +39,9 @@ STAR_ITEM_FMT = "__star_{nr}__"
 HTML_ITEM_DEFAULTS: dict[str, str] = {"fontcolor": "black", "color": "black"}
 ENGINE_CONTEXT = "neato"
 ENGINE_DEFAULT = "dot"
+ENGINE_SCALABLE = "sfdp"  # for large graphs, in fast layout
+ENGINE_POSITIONED = "neato"  # with -n2: draws at the given positions
+LAYOUT_FORMAT = "dot"  # output of the positions of a layout
 
 # ── DOT templates ─────────────────────────────────────────────────────
 
@@ -99,5 +102,6 @@ digraph D {{
 """.strip()
 )
 
+DOT_BLOCK_MARK = "\0block\0"  # where generated lines go, cannot be in DOT
 
 GRAPH_PARAMS_CONTEXT_DIAGRAM = "edge [len=2.25]"
@@ -0,0 +1,234 @@
+"""Timings of the stages of a run, and of each diagram: see --timings.
+
+Like debug channels, the recorder is global and disabled by default, so
+that timing a stage costs a mere test when no report is asked for.
+Stages are timed within a diagram (a snippet, or the single DFD source):
+wall time, CPU time, and peak of memory allocated by Python (tracemalloc).
+Graphviz runs in other processes: only their elapsed time is recorded by
+diagram; their CPU time counts in that of the run, where the platform
+reports the CPU time of child processes (POSIX).
+"""
+
+import contextlib
+import dataclasses
+import json
+import time
+from typing import Any, Iterator, TextIO
+
+from . import config, model
+
+# Stages, in pipeline order
+STAGES = [
+    "scan",
+    "parse",
+    "dependencies",
+    "check",
+    "resolve",
+    "filter",
+    "hidables",
+    "options",
+    "generate",
+]
+
+_NO_TIMING: contextlib.nullcontext[None] = contextlib.nullcontext()
+
+
+def _cpu_time() -> float:
+    """CPU time of this process, and of its terminated children if known."""
+    try:
+        import resource  # POSIX only
+    except ImportError:
+        return time.process_time()
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+class Recorder:
+    """Record the timings of the diagrams of a run, while enabled."""
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.snippets: dict[str, model.SnippetTimings] = {}
+        self.total = model.Timing()
+        self._current: model.SnippetTimings | None = None
+        self._start = (0.0, 0.0)
+        self._frames: list[list[int]] = []  # of the blocks being measured
+        self._run_peak = 0
+
+    def start(self) -> None:
+        """Enable, forgetting previous timings, and start tracing memory."""
+        import tracemalloc  # not at module level: slow, and seldom needed
+
+        self.enabled = True
+        self.snippets = {}
+        self.total = model.Timing()
+        self._run_peak = 0
+        tracemalloc.start()
+        self._start = (time.perf_counter(), _cpu_time())
+
+    def stop(self) -> None:
+        """Disable, and stop tracing memory."""
+        import tracemalloc
+
+        wall, cpu = self._start
+        self.total.wall = time.perf_counter() - wall
+        self.total.cpu = _cpu_time() - cpu
+        self._flush_peak()
+        self.total.peak = self._run_peak
+        tracemalloc.stop()
+        self.enabled = False
+
+    def record_snippet(
+        self, name: str
+    ) -> contextlib.AbstractContextManager[None]:
+        """Time the build of a diagram; a rebuild replaces its timings."""
+        if not self.enabled:
+            return _NO_TIMING
+        return self._time_snippet(name)
+
+    @contextlib.contextmanager
+    def _time_snippet(self, name: str) -> Iterator[None]:
+        self._current = self.snippets[name] = model.SnippetTimings(name)
+        try:
+            with self._measure(self._current.total):
+                yield
+        finally:
+            self._current = None
+
+    def record_stage(
+        self, name: str
+    ) -> contextlib.AbstractContextManager[None]:
+        """Time a stage of the diagram being built."""
+        if not self.enabled or self._current is None:
+            return _NO_TIMING
+        timing = self._current.stages.setdefault(name, model.Timing())
+        return self._measure(timing)
+
+    def _flush_peak(self) -> None:
+        """Account for the memory peak so far, before it is reset."""
+        import tracemalloc
+
+        peak = tracemalloc.get_traced_memory()[1]
+        self._run_peak = max(self._run_peak, peak)
+        for frame in self._frames:
+            frame[1] = max(frame[1], peak)
+
+    @contextlib.contextmanager
+    def _measure(self, timing: model.Timing) -> Iterator[None]:
+        """Add the resources used by the block to timing.
+
+        As the tracemalloc peak is reset for each block, the peaks of the
+        enclosing blocks (and of the run) are updated before.
+        """
+        import tracemalloc
+
+        self._flush_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        frame = [current, current]  # [start, peak], in allocated bytes
+        self._frames.append(frame)
+        tracemalloc.reset_peak()
+        wall, cpu = time.perf_counter(), _cpu_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, _cpu_time() - cpu
+            self._flush_peak()
+            self._frames.pop()
+            timing.add(model.Timing(wall, cpu, frame[1] - frame[0]))
+
+    def add_dot_size(self, size: int) -> None:
+        """Record the size of the DOT text of the diagram being built."""
+        if self._current is not None:
+            self._current.dot_size += size
+
+    def record_graphviz(
+        self, name: str
+    ) -> contextlib.AbstractContextManager[None]:
+        """Time the Graphviz rendering of the named diagram."""
+        if not self.enabled or name not in self.snippets:
+            return _NO_TIMING
+        return self._time_graphviz(self.snippets[name])
+
+    @contextlib.contextmanager
+    def _time_graphviz(self, snippet: model.SnippetTimings) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            snippet.graphviz += time.perf_counter() - start
+
+    def sum_stage_totals(self) -> dict[str, model.Timing]:
+        """Return the timings of each stage, summed over the diagrams."""
+        totals = {name: model.Timing() for name in STAGES}
+        for snippet in self.snippets.values():
+            for name, timing in snippet.stages.items():
+                totals.setdefault(name, model.Timing()).add(timing)
+        return totals
+
+    def find_slowest(self) -> list[model.SnippetTimings]:
+        """Return the diagrams, slowest first (build and Graphviz time)."""
+        return sorted(
+            self.snippets.values(),
+            key=lambda s: s.total.wall + s.graphviz,
+            reverse=True,
+        )
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "total": dataclasses.asdict(self.total),
+            "stages": {
+                name: dataclasses.asdict(timing)
+                for name, timing in self.sum_stage_totals().items()
+            },
+            "graphviz": sum(s.graphviz for s in self.snippets.values()),
+            "snippets": [dataclasses.asdict(s) for s in self.find_slowest()],
+        }
+
+    def report(self, fmt: str, output: TextIO) -> None:
+        """Write the report, as "text" or "json"."""
+        if fmt == "json":
+            json.dump(self.to_json(), output, indent=2)
+            output.write("\n")
+            return
+
+        total = self.total
+        output.write(
+            f"Timings: {len(self.snippets)} diagram(s) in {_ms(total.wall)}"
+            f" ms, {_ms(total.cpu)} ms CPU, {_kib(total.peak)} KiB peak\n"
+        )
+        output.write(f"  {'stage':14}{'wall ms':>10}{'CPU ms':>10}")
+        output.write(f"{'peak KiB':>10}\n")
+        for name, timing in self.sum_stage_totals().items():
+            output.write(
+                f"  {name:14}{_ms(timing.wall):>10}{_ms(timing.cpu):>10}"
+                f"{_kib(timing.peak):>10}\n"
+            )
+        graphviz = sum(s.graphviz for s in self.snippets.values())
+        if graphviz:
+            output.write(f"  {'graphviz':14}{_ms(graphviz):>10}\n")
+
+        if len(self.snippets) < 2:
+            for snippet in self.snippets.values():
+                output.write(f"  DOT size: {snippet.dot_size} characters\n")
+            return
+        slowest = self.find_slowest()[: config.TIMINGS_SLOWEST]
+        output.write(f"Slowest diagrams ({len(slowest)}):\n")
+        output.write(f"  {'diagram':30}{'wall ms':>10}{'CPU ms':>10}")
+        output.write(f"{'peak KiB':>10}{'Graphviz ms':>13}{'DOT size':>10}\n")
+        for snippet in slowest:
+            output.write(
+                f"  {snippet.name:30}{_ms(snippet.total.wall):>10}"
+                f"{_ms(snippet.total.cpu):>10}{_kib(snippet.total.peak):>10}"
+                f"{_ms(snippet.graphviz):>13}{snippet.dot_size:>10}\n"
+            )
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.1f}"
+
+
+def _kib(size: int) -> str:
+    return f"{size / 1024:.0f}"
+
+
+TIMINGS = Recorder()
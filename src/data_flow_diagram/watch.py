@@ -0,0 +1,95 @@
+"""Watch mode: rebuild whenever the input or one of its sources changes.
+
+Files are watched by polling their stat info, which works the same on
+all platforms and file systems, and costs next to nothing for the few
+files a diagram depends on. Bursts of changes (e.g. an editor saving
+several files, or writing a file in several steps) are coalesced: the
+build only starts once the files have been stable for a short while.
+"""
+
+import os
+import sys
+import time
+from typing import Callable
+
+from . import config, exception
+from .console import CLI, print_error
+
+# Stat info of a file, None if missing
+Stat = tuple[int, int] | None
+
+# A build returns the paths of the files it depends on
+Build = Callable[[], set[str]]
+
+
+def stat_file(path: str) -> Stat:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class Watcher:
+    """Run a build, then run it again each time its dependencies change.
+
+    The *inputs* are always watched, even when the build fails before
+    telling its dependencies.
+    """
+
+    def __init__(
+        self,
+        build: Build,
+        inputs: set[str],
+        poll_seconds: float = config.WATCH_POLL_SECONDS,
+        debounce_seconds: float = config.WATCH_DEBOUNCE_SECONDS,
+    ) -> None:
+        self.build = build
+        self.inputs = inputs
+        self.poll_seconds = poll_seconds
+        self.debounce_seconds = debounce_seconds
+        self.stats: dict[str, Stat] = {}
+
+    def snapshot(self) -> dict[str, Stat]:
+        return {path: stat_file(path) for path in self.stats}
+
+    def check(self) -> bool:
+        """Tell whether a watched file changed since the last build."""
+        return self.snapshot() != self.stats
+
+    def rebuild(self) -> None:
+        """Run the build, reporting errors instead of exiting."""
+        try:
+            paths = self.build()
+        except exception.DfdException as e:
+            print_error(f"ERROR: {e}")
+            paths = set(self.stats)  # keep watching the same files
+        except SystemExit:
+            # Graphviz failures are reported, then exit; keep watching
+            paths = set(self.stats)
+        paths |= self.inputs
+        self.stats = {path: stat_file(path) for path in paths}
+        CLI.debug_print("%s: watching %d file(s)", sys.argv[0], len(self.stats))
+
+    def wait_until_stable(self) -> None:
+        """Wait until no watched file changed during the debounce delay."""
+        stats = self.snapshot()
+        while True:
+            time.sleep(self.debounce_seconds)
+            new_stats = self.snapshot()
+            if new_stats == stats:
+                return
+            stats = new_stats
+
+    def run(self) -> None:
+        """Build, and rebuild on changes, until interrupted."""
+        self.rebuild()
+        print("Watching for changes; press Ctrl-C to stop.", file=sys.stderr)
+        try:
+            while True:
+                time.sleep(self.poll_seconds)
+                if self.check():
+                    self.wait_until_stable()
+                    self.rebuild()
+        except KeyboardInterrupt:
+            pass
@@ -7,6 +7,7 @@ pipeline including Graphviz.  They require the `dot` binary to be installed.
 import io
 import subprocess
 import sys
+from pathlib import Path
 
 import pytest
 
@@ -44,3 +45,23 @@ def test_subprocess_cli_produces_svg() -> None:
         '<?xml'
     ), "Output does not begin with XML declaration"
     assert output.endswith('</svg>'), "Output does not end with </svg>"
+
+
+def test_markdown_batch_renders_each_snippet(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # Snippets are rendered in batches; each image must land in its own file
+    monkeypatch.chdir(tmp_path)
+    md = "".join(
+        f"```data-flow-diagram out-{n}.svg\nprocess P{n} Process{n}\n```\n"
+        for n in range(5)
+    )
+    (tmp_path / 'doc.md').write_text(md)
+    monkeypatch.setattr(
+        sys, 'argv', ['prog', '--markdown', '-j', '2', 'doc.md']
+    )
+    main()
+    for n in range(5):
+        svg = (tmp_path / f'out-{n}.svg').read_text()
+        assert svg.strip().endswith('</svg>')
+        assert f'Process{n}' in svg
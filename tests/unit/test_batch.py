@@ -0,0 +1,88 @@
+"""Tests for the expansion of the inputs of batch runs."""
+
+from pathlib import Path
+
+import pytest
+
+from data_flow_diagram import batch, exception
+
+
+@pytest.fixture
+def tree(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """A documentation tree, as the current directory."""
+    monkeypatch.chdir(tmp_path)
+    for name in (
+        "docs/a.dfd",
+        "docs/guide.md",
+        "docs/notes.txt",
+        "docs/sub/b.dfd",
+        "docs/sub/draft.dfd",
+        "docs/build/c.dfd",
+        "docs/sub/build/d.dfd",
+        "docs/.cache/e.dfd",
+        "other/f.dfd",
+    ):
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("process P Proc\n")
+    (tmp_path / "docs/.dfdignore").write_text(
+        "# generated\n/build/\ndraft.dfd\n"
+    )
+    return tmp_path
+
+
+def test_directories_are_searched_for_sources(tree: Path) -> None:
+    assert batch.find_inputs(["docs"]) == [
+        "docs/a.dfd",
+        "docs/guide.md",
+        "docs/sub/b.dfd",
+        "docs/sub/build/d.dfd",  # "/build/" is anchored to docs/
+    ]
+
+
+def test_globs_honor_ignore_files(tree: Path) -> None:
+    assert batch.find_inputs(["docs/**/*.dfd", "other"]) == [
+        "docs/a.dfd",
+        "docs/sub/b.dfd",
+        "docs/sub/build/d.dfd",
+        "other/f.dfd",
+    ]
+
+
+def test_files_are_kept_as_given_once(tree: Path) -> None:
+    assert batch.find_inputs(
+        ["docs/notes.txt", "docs/sub/draft.dfd", "./docs/notes.txt"]
+    ) == ["docs/notes.txt", "docs/sub/draft.dfd"]
+
+
+def test_included_inputs_are_dropped(tree: Path) -> None:
+    (tree / "docs/a.dfd").write_text("#include sub/b.dfd\n#include #x\n")
+    (tree / "docs/guide.md").write_text(
+        "```data-flow-diagram g.svg\n#include ../other/f.dfd\n```\n"
+    )
+    inputs = batch.find_inputs(["docs", "other"])
+    assert batch.drop_included(inputs) == [
+        "docs/a.dfd",
+        "docs/guide.md",
+        "docs/sub/build/d.dfd",
+    ]
+
+
+@pytest.mark.parametrize(
+    "args, expected",
+    [
+        pytest.param([], False, id="stdin"),
+        pytest.param(["docs/a.dfd"], False, id="file"),
+        pytest.param(["docs"], True, id="directory"),
+        pytest.param(["docs/*.dfd"], True, id="glob"),
+        pytest.param(["docs/a.dfd", "other/f.dfd"], True, id="files"),
+    ],
+)
+def test_is_batch(tree: Path, args: list[str], expected: bool) -> None:
+    assert batch.is_batch(args) == expected
+
+
+@pytest.mark.parametrize("arg", ["missing.dfd", "docs/*.png"])
+def test_inputs_must_match(tree: Path, arg: str) -> None:
+    with pytest.raises(exception.DfdException, match="No such input"):
+        batch.find_inputs([arg])
@@ -0,0 +1,82 @@
+"""Tests for the render cache (rendering.cache) and its use by graphviz."""
+
+import os
+from pathlib import Path
+
+import pytest
+
+from data_flow_diagram import model
+from data_flow_diagram.rendering import cache, graphviz
+
+
+def test_key_depends_on_every_part() -> None:
+    key = cache.make_key("digraph {}", "dot", "svg", "2.43")
+    assert key == cache.make_key("digraph {}", "dot", "svg", "2.43")
+    assert key != cache.make_key("digraph {}", "neato", "svg", "2.43")
+    assert key != cache.make_key("digraph {}", "dot", "png", "2.43")
+    assert key != cache.make_key("digraph {}", "dot", "svg", "9.0")
+    # parts must not run into each other
+    assert cache.make_key("ab", "c") != cache.make_key("a", "bc")
+
+
+def test_get_returns_put_value(tmp_path: Path) -> None:
+    render_cache = cache.RenderCache(str(tmp_path))
+    assert render_cache.get("00ff") is None
+    render_cache.put("00ff", b"<svg/>")
+    assert render_cache.get("00ff") == b"<svg/>"
+
+
+def test_evicts_least_recently_used(tmp_path: Path) -> None:
+    render_cache = cache.RenderCache(str(tmp_path), max_bytes=25)
+    render_cache.put("aa", b"1" * 10)
+    render_cache.put("bb", b"2" * 10)
+
+    # make "aa" the most recently used entry
+    for nr, key in enumerate(("bb", "aa")):
+        os.utime(render_cache._path(key), (1000 + nr, 1000 + nr))
+    render_cache._total_bytes = None
+
+    render_cache.put("cc", b"3" * 10)
+    assert render_cache.get("bb") is None
+    assert render_cache.get("aa") == b"1" * 10
+    assert render_cache.get("cc") == b"3" * 10
+
+
+def test_write_if_changed_keeps_identical_file(tmp_path: Path) -> None:
+    path = tmp_path / "out.svg"
+    assert cache.write_if_changed(str(path), b"abc")
+    os.utime(path, (1000, 1000))
+    assert not cache.write_if_changed(str(path), b"abc")
+    assert path.stat().st_mtime == 1000
+    assert cache.write_if_changed(str(path), b"abd")
+    assert path.read_bytes() == b"abd"
+
+
+def test_cache_hit_does_not_run_graphviz(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # On a hit, the cached image is written without invoking Graphviz
+    monkeypatch.setattr(
+        graphviz, "find_version", lambda engine, cache=None: "test"
+    )
+
+    def fail(*args: object) -> tuple[bytes, str]:
+        raise AssertionError("Graphviz must not run on a cache hit")
+
+    monkeypatch.setattr(graphviz, "run_engine", fail)
+
+    render_cache = cache.RenderCache(str(tmp_path / "cache"))
+    text = "digraph D {}"
+    render_cache.put(graphviz.make_cache_key("dot", text, "svg"), b"<svg/>")
+
+    output_path = tmp_path / "out.svg"
+    graph_options = model.GraphOptions()
+    graphviz.generate_image(
+        graph_options, text, str(output_path), "svg", render_cache
+    )
+    assert output_path.read_bytes() == b"<svg/>"
+
+    job = graphviz.ImageJob(graph_options, text, str(output_path), "svg")
+    output_path.unlink()
+    graphviz.generate_images([job], 2, render_cache)
+    assert output_path.read_bytes() == b"<svg/>"
@@ -1,23 +1,51 @@
 """Tests for the CLI argument parser and entry points."""
 
 import importlib
+import io
+import json
+import subprocess
 import sys
+import threading
+from pathlib import Path
 
 import pytest
 
-from data_flow_diagram import main, parse_args
+from data_flow_diagram import (
+    cli,
+    console,
+    dfd,
+    exception,
+    main,
+    model,
+    parse_args,
+    timings,
+)
+from data_flow_diagram.rendering import graphviz
 
 # The full set of argument names the CLI must expose; a mismatch here means
 # an arg was added or removed without updating this test.
 EXPECTED_ARG_KEYS = {
-    'INPUT_FILE',
+    'INPUT_FILES',
     'output_file',
     'markdown',
     'format',
     'background_color',
     'no_graph_title',
+    'no_provenance_comments',
+    'layout_budget',
     'no_check_dependencies',
+    'cache_dir',
+    'cache_layouts',
+    'no_cache',
+    'jobs',
+    'incremental',
+    'watch',
+    'serve',
+    'timings',
+    'timings_format',
+    'timings_file',
     'debug',
+    'debug_channels',
     'version',
 }
 
@@ -34,10 +62,10 @@ def test_parse_args_exposes_expected_keys(
 def test_parse_args_positional_input_file(
     monkeypatch: pytest.MonkeyPatch,
 ) -> None:
-    # The positional INPUT_FILE argument must be captured verbatim
+    # The positional INPUT_FILE arguments must be captured verbatim
     monkeypatch.setattr(sys, 'argv', ['prog', 'my-file'])
     args = parse_args()
-    assert args.INPUT_FILE == 'my-file'
+    assert args.INPUT_FILES == ['my-file']
 
 
 def test_console_scripts_entry_point_resolves() -> None:
@@ -73,3 +101,623 @@ def test_help_text_contains_dfd_not_uml(
     output = capsys.readouterr().out
     assert 'DFD input file' in output
     assert 'UML sequence' not in output
+
+
+# ── markdown mode with concurrent jobs ───────────────────────────────────────
+
+MD_WITH_SNIPPETS = "".join(
+    f"```data-flow-diagram out-{n}.dot\nprocess P{n} Process {n}\n```\n"
+    for n in range(8)
+)
+
+
+def _options(
+    jobs: int, incremental: bool = False, fmt: str = 'dot'
+) -> model.Options:
+    return model.Options(
+        background_color=None,
+        no_graph_title=False,
+        format=fmt,
+        no_check_dependencies=True,
+        debug=False,
+        jobs=jobs,
+        incremental=incremental,
+    )
+
+
+def _fake_graphviz(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Render DOT texts as their first process name, failing on "Bad"."""
+
+    def render(text: str) -> tuple[bytes, str]:
+        [name] = [
+            line.split()[0].strip('"')
+            for line in text.splitlines()
+            if line.startswith('  "')
+        ]
+        if 'Bad' in text:
+            raise subprocess.CalledProcessError(1, 'dot', b'', b'bad graph\n')
+        return f'<svg>{name}</svg>'.encode(), f'warning: {name}\n'
+
+    def run_engine(engine: str, text: str, fmt: str) -> tuple[bytes, str]:
+        return render(text)
+
+    def run_engine_batch(
+        engine: str, fmts: list[str], texts: list[str]
+    ) -> tuple[list[list[bytes]] | None, str]:
+        try:
+            rendered = [render(text) for text in texts]
+        except subprocess.CalledProcessError:
+            return None, ''
+        return [[data] for data, _ in rendered], ''.join(
+            diagnostics for _, diagnostics in rendered
+        )
+
+    monkeypatch.setattr(graphviz, 'run_engine', run_engine)
+    monkeypatch.setattr(graphviz, '_run_engine_batch', run_engine_batch)
+
+
+@pytest.mark.parametrize('failing', [False, True])
+def test_markdown_jobs_output_identical_to_serial(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+    failing: bool,
+) -> None:
+    # Rendered concurrently or not, the same images are written, and the
+    # same diagnostics and errors are reported, in snippet order
+    monkeypatch.chdir(tmp_path)
+    _fake_graphviz(monkeypatch)
+    md = MD_WITH_SNIPPETS.replace('.dot', '.svg')
+    if failing:
+        md = md.replace('Process 5', 'Bad 5')
+    runs = {}
+    for jobs in 1, 4:
+        for path in tmp_path.glob('*.svg'):
+            path.unlink()
+        try:
+            cli.handle_markdown_source(
+                _options(jobs, fmt='svg'), '<test>', io.StringIO(md)
+            )
+        except SystemExit as e:
+            assert failing and e.code == 1
+        outputs = {p.name: p.read_bytes() for p in tmp_path.glob('*.svg')}
+        runs[jobs] = outputs, capsys.readouterr().err
+    assert runs[1] == runs[4]
+
+    outputs, err = runs[4]
+    assert len(outputs) == (7 if failing else 8)
+    warnings = [line for line in err.splitlines() if line.startswith('warn')]
+    assert warnings == sorted(warnings)
+    assert ('bad graph' in err) == failing
+
+
+def test_markdown_jobs_report_first_failure_in_snippet_order(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    # Two batches render at the same time, the second one finishing first;
+    # both fail, and the failure of the earliest snippet is reported
+    monkeypatch.chdir(tmp_path)
+    _fake_graphviz(monkeypatch)
+    run_engine_batch = graphviz._run_engine_batch
+    started = threading.Barrier(2, timeout=5)
+    second_done = threading.Event()
+
+    def run_concurrent_batch(
+        engine: str, fmts: list[str], texts: list[str]
+    ) -> tuple[list[list[bytes]] | None, str]:
+        started.wait()  # broken if the batches do not run concurrently
+        first = 'P0' in texts[0]
+        if first:
+            assert second_done.wait(timeout=5)
+        outcome = run_engine_batch(engine, fmts, texts)
+        if not first:
+            second_done.set()
+        return outcome
+
+    monkeypatch.setattr(graphviz, '_run_engine_batch', run_concurrent_batch)
+    md = MD_WITH_SNIPPETS.replace('.dot', '.svg')
+    md = md.replace('Process 1', 'Bad 1').replace('Process 6', 'Bad 6')
+    with pytest.raises(SystemExit):
+        cli.handle_markdown_source(
+            _options(2, fmt='svg'), '<test>', io.StringIO(md)
+        )
+    err = capsys.readouterr().err
+    assert 'Bad 1' in err and 'Bad 6' not in err
+
+
+@pytest.mark.parametrize(
+    'value, expected',
+    [
+        (None, (None, None)),
+        ('full', ('full', None)),
+        ('fast', ('fast', None)),
+        ('fast:2000', ('fast', 2000)),
+    ],
+)
+def test_layout_budget_values(
+    value: str | None, expected: tuple[str | None, int | None]
+) -> None:
+    assert cli._resolve_layout_budget(value) == expected
+
+
+@pytest.mark.parametrize('value', ['slow', 'fast:', 'fast:x', 'full:3'])
+def test_layout_budget_must_be_valid(value: str) -> None:
+    with pytest.raises(exception.DfdException, match='Invalid layout budget'):
+        cli._resolve_layout_budget(value)
+
+
+def test_jobs_must_be_positive(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(sys, 'argv', ['prog', '--jobs', '0', 'my-file'])
+    with pytest.raises(exception.DfdException, match='at least 1'):
+        cli.run(parse_args())
+
+
+MD_WITH_INCLUDES = (
+    "```data-flow-diagram #common\nprocess C Common\n```\n"
+    "```data-flow-diagram uses-snippet.dot\n#include #common\n```\n"
+    "```data-flow-diagram uses-file.dot\n#include common.dfd\n```\n"
+    "```data-flow-diagram alone.dot\nprocess A Alone\n```\n"
+)
+
+
+def _build_incrementally(md: str, capsys: pytest.CaptureFixture[str]) -> str:
+    cli.handle_markdown_source(
+        _options(1, incremental=True), '<test>', io.StringIO(md)
+    )
+    return capsys.readouterr().err.strip()
+
+
+def test_markdown_incremental_skips_unchanged_snippets(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'common.dfd').write_text('process F File\n')
+    md = MD_WITH_INCLUDES
+    assert _build_incrementally(md, capsys) == '3 snippet(s) rebuilt, 0 skipped'
+    assert _build_incrementally(md, capsys) == '0 snippet(s) rebuilt, 3 skipped'
+
+    # Changing an included snippet rebuilds its includers only
+    md = md.replace('Common', 'Changed')
+    assert _build_incrementally(md, capsys) == '1 snippet(s) rebuilt, 2 skipped'
+    assert 'Changed' in (tmp_path / 'uses-snippet.dot').read_text()
+
+    # Same for an included file
+    (tmp_path / 'common.dfd').write_text('process F Changed\n')
+    assert _build_incrementally(md, capsys) == '1 snippet(s) rebuilt, 2 skipped'
+    assert 'Changed' in (tmp_path / 'uses-file.dot').read_text()
+
+
+def test_markdown_incremental_rebuilds_missing_or_altered_output(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    md = MD_WITH_SNIPPETS
+    _build_incrementally(md, capsys)
+    (tmp_path / 'out-0.dot').unlink()
+    (tmp_path / 'out-1.dot').write_text('edited by hand')
+    assert _build_incrementally(md, capsys) == '2 snippet(s) rebuilt, 6 skipped'
+    assert 'P1' in (tmp_path / 'out-1.dot').read_text()
+
+
+def test_markdown_incremental_tracks_referred_graphs(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    # A snippet referring to an item of another graph depends on that graph
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'other.dfd').write_text('process P Process\n')
+    md = "```data-flow-diagram refers.dot\nprocess other.dfd:P\n```\n"
+    options = _options(1, incremental=True)
+    options.no_check_dependencies = False
+    cli.handle_markdown_source(options, '<test>', io.StringIO(md))
+    (tmp_path / 'other.dfd').write_text('process P Renamed\n')
+    cli.handle_markdown_source(options, '<test>', io.StringIO(md))
+    assert capsys.readouterr().err.splitlines() == [
+        '1 snippet(s) rebuilt, 0 skipped',
+        '1 snippet(s) rebuilt, 0 skipped',
+    ]
+
+
+def test_dot_output_is_replaced_once_complete(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    cli.handle_dfd_source(
+        _options(1), '<test>', io.StringIO('process P Proc'), 'out.dot'
+    )
+    assert 'digraph' in (tmp_path / 'out.dot').read_text()
+
+    # failing during generation leaves the former output
+    with pytest.raises(exception.DfdException, match='Invalid attribute'):
+        cli.handle_dfd_source(
+            _options(1),
+            '<test>',
+            io.StringIO('process P Proc\nstore S [bad] Store'),
+            'out.dot',
+        )
+    assert 'digraph' in (tmp_path / 'out.dot').read_text()
+    assert [p.name for p in tmp_path.iterdir()] == ['out.dot']
+
+
+def test_scalable_engine_is_warned_about(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    source = 'style fast-layout 2\nprocess P p\nprocess Q q\nprocess R r'
+    cli.handle_dfd_source(_options(1), '<test>', io.StringIO(source), 'out.dot')
+    err = capsys.readouterr().err
+    assert 'WARNING: <test>: 3 items, more than 2 for fast layout' in err
+
+
+def test_uncached_image_is_rendered_from_streamed_dot_text(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    # a fake engine writing "FMT:TEXT", failing on "Bad"
+    engine = tmp_path / 'engine'
+    engine.write_text(
+        f'#!{sys.executable}\n'
+        'import sys\n'
+        'text = sys.stdin.read()\n'
+        'sys.stderr.write("warning: read\\n")\n'
+        'sys.stdout.write(sys.argv[1][2:] + ":" + text)\n'
+        'sys.exit("Bad" in text)\n'
+    )
+    engine.chmod(0o755)
+    monkeypatch.setattr(graphviz, 'select_engine', lambda o: str(engine))
+    monkeypatch.chdir(tmp_path)
+    source = 'process P Proc'
+    dot_text, _ = dfd.build(
+        model.SourceLine('', '<test>', None, 0), source, 'out', _options(1)
+    )
+    cli.handle_dfd_source(
+        _options(1, fmt='svg'), '<test>', io.StringIO(source), 'out.svg'
+    )
+    assert (tmp_path / 'out.svg').read_text() == 'svg:' + dot_text
+    assert 'warning: read' in capsys.readouterr().err
+
+    # on failure, the diagnostics are reported, and the image left as is
+    with pytest.raises(SystemExit):
+        cli.handle_dfd_source(
+            _options(1, fmt='svg'),
+            '<test>',
+            io.StringIO('process P Bad'),
+            'out.svg',
+        )
+    assert (tmp_path / 'out.svg').read_text() == 'svg:' + dot_text
+    assert '--format dot' in capsys.readouterr().err
+
+
+# ── several output formats ───────────────────────────────────────────────────
+
+
+@pytest.mark.parametrize(
+    'output_path, fmt, expected',
+    [
+        pytest.param('a.svg', 'svg', {'svg': 'a.svg'}, id='single'),
+        pytest.param('-', 'png', {'png': '-'}, id='single-to-stdout'),
+        pytest.param(
+            'a.svg',
+            'svg, png,dot',
+            {'svg': 'a.svg', 'png': 'a.png', 'dot': 'a.dot'},
+            id='list',
+        ),
+        pytest.param(
+            'd/a.{svg,pdf}',
+            'png',
+            {'svg': 'd/a.svg', 'pdf': 'd/a.pdf'},
+            id='braces',
+        ),
+        pytest.param('a.{png}', 'svg', {'png': 'a.png'}, id='braces-single'),
+        pytest.param(
+            'a.svg',
+            'svg,png:cairo',
+            {'svg': 'a.svg', 'png:cairo': 'a.png'},
+            id='renderer',
+        ),
+    ],
+)
+def test_resolve_outputs(
+    output_path: str, fmt: str, expected: dict[str, str]
+) -> None:
+    assert cli.resolve_outputs(output_path, fmt) == expected
+
+
+@pytest.mark.parametrize(
+    'output_path, fmt, match',
+    [
+        pytest.param('-', 'svg,png', 'not stdout', id='stdout'),
+        pytest.param('a.svg', 'svg,,png', 'Invalid list', id='empty'),
+        pytest.param('a.{svg,svg}', 'svg', 'Invalid list', id='duplicate'),
+    ],
+)
+def test_resolve_outputs_errors(output_path: str, fmt: str, match: str) -> None:
+    with pytest.raises(exception.DfdException, match=match):
+        cli.resolve_outputs(output_path, fmt)
+
+
+def _count_layouts(monkeypatch: pytest.MonkeyPatch) -> list[list[str]]:
+    """Fake Graphviz runs for several formats; return the formats of each."""
+    runs: list[list[str]] = []
+
+    def run_engine_formats(
+        engine: str, text: str, fmts: list[str]
+    ) -> tuple[list[bytes], str]:
+        runs.append(fmts)
+        return [f'<{fmt}>'.encode() for fmt in fmts], ''
+
+    monkeypatch.setattr(graphviz, 'run_engine_formats', run_engine_formats)
+    return runs
+
+
+def test_several_formats_from_one_layout(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    runs = _count_layouts(monkeypatch)
+    (tmp_path / 'in.dfd').write_text('process P Proc')
+    cli.run(parse_args(['-f', 'svg,png,dot', '--no-cache', 'in.dfd']))
+    assert runs == [['svg', 'png']]
+    assert (tmp_path / 'in.png').read_bytes() == b'<png>'
+    assert (tmp_path / 'in.svg').read_bytes() == b'<svg>'
+    assert 'digraph' in (tmp_path / 'in.dot').read_text()
+
+
+def test_markdown_snippet_requests_several_formats(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    runs = _count_layouts(monkeypatch)
+    md = (
+        "```data-flow-diagram both.{svg,png}\nprocess P Proc\n```\n"
+        "```data-flow-diagram plain.dot\nprocess Q Proc\n```\n"
+    )
+    options = _options(1, incremental=True)
+    cli.handle_markdown_source(options, '<test>', io.StringIO(md))
+    assert runs == [['svg', 'png']]
+    assert (tmp_path / 'both.png').read_bytes() == b'<png>'
+    assert 'digraph' in (tmp_path / 'plain.dot').read_text()
+
+    # a snippet is up to date once all its outputs are
+    cli.handle_markdown_source(options, '<test>', io.StringIO(md))
+    (tmp_path / 'both.svg').unlink()
+    cli.handle_markdown_source(options, '<test>', io.StringIO(md))
+    assert capsys.readouterr().err.splitlines() == [
+        '2 snippet(s) rebuilt, 0 skipped',
+        '0 snippet(s) rebuilt, 2 skipped',
+        '1 snippet(s) rebuilt, 1 skipped',
+    ]
+
+
+# ── batch mode ───────────────────────────────────────────────────────────────
+
+
+def test_batch_renders_all_inputs_and_sums_up_failures(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'a.dfd').write_text('process P Proc')
+    (tmp_path / 'bad.dfd').write_text('bad P Proc')
+    (tmp_path / 'gv.dfd').write_text('process P Unrenderable')
+    (tmp_path / 'doc.md').write_text(MD_WITH_SNIPPETS.replace('.dot', '.svg'))
+    calls = []
+
+    def render_images(
+        jobs: list[graphviz.ImageJob],
+        nb_batches: int = 1,
+        cache: object = None,
+    ) -> list[graphviz.RenderResult]:
+        calls.append([job.output_path for job in jobs])
+        return [
+            (
+                subprocess.CalledProcessError(1, 'dot', b'', b'boom\n')
+                if 'Unrenderable' in job.text
+                else b'<svg/>'
+            )
+            for job in jobs
+        ]
+
+    monkeypatch.setattr(graphviz, 'render_images', render_images)
+    args = parse_args(['--no-cache', 'a.dfd', 'bad.dfd', 'gv.dfd', 'doc.md'])
+    with pytest.raises(
+        exception.DfdException,
+        match=r'^2 of 4 input\(s\) failed: bad.dfd, gv.dfd$',
+    ):
+        cli.run(args)
+
+    # one rendering for all inputs; the others were output
+    assert calls == [['a.svg', 'gv.svg'] + [f'out-{n}.svg' for n in range(8)]]
+    assert (tmp_path / 'a.svg').read_bytes() == b'<svg/>'
+    assert (tmp_path / 'out-7.svg').read_bytes() == b'<svg/>'
+    assert not (tmp_path / 'gv.svg').exists()
+    err = capsys.readouterr().err
+    assert 'Unrecognized keyword "bad"' in err and 'boom' in err
+
+
+def test_batch_builds_markdown_inputs_in_their_directory(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    outputs = {
+        'a': 'diagram.dot',
+        'b': 'diagram.dot',
+        'c': '../a/diagram.dot',  # an output of a/doc.md
+    }
+    for name, output in outputs.items():
+        (tmp_path / name).mkdir()
+        (tmp_path / name / 'common.dfd').write_text(f'process P Proc {name}')
+        (tmp_path / name / 'doc.md').write_text(
+            f'```data-flow-diagram {output}\n#include common.dfd\n```\n'
+        )
+    args = parse_args(['-f', 'dot', 'a/doc.md', 'b/doc.md', 'c/doc.md'])
+    with pytest.raises(
+        exception.DfdException, match=r'^1 of 3 input\(s\) failed: c/doc.md$'
+    ):
+        cli.run(args)
+    assert 'Proc a' in (tmp_path / 'a' / 'diagram.dot').read_text()
+    assert 'Proc b' in (tmp_path / 'b' / 'diagram.dot').read_text()
+    assert not (tmp_path / 'diagram.dot').exists()
+    assert 'is also an output of "a/doc.md"' in capsys.readouterr().err
+
+
+def test_batch_builds_dfd_inputs_in_their_directory(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'docs').mkdir()
+    (tmp_path / 'docs' / 'main.dfd').write_text(
+        '#include common.dfd\nprocess Q Other'
+    )
+    (tmp_path / 'docs' / 'common.dfd').write_text('process P Proc')
+    cli.run(parse_args(['-f', 'dot', '.']))
+    dot_text = (tmp_path / 'docs' / 'main.dot').read_text()
+    assert '"P"' in dot_text and '"Q"' in dot_text
+    assert not (tmp_path / 'docs' / 'common.dot').exists()  # a fragment
+
+
+def test_batch_needs_derived_outputs(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    args = parse_args(['-o', 'out.svg', '.'])
+    with pytest.raises(exception.DfdException, match='single input'):
+        cli.run(args)
+
+
+def test_debug_channels_are_lazy_and_selectable(
+    monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]
+) -> None:
+    class Costly:
+        def __str__(self) -> str:
+            raise AssertionError('formatted while disabled')
+
+    monkeypatch.setattr(
+        sys, 'argv', ['prog', '--debug-channels', 'dot', 'my-file']
+    )
+    args = parse_args()
+    monkeypatch.setattr(args, 'INPUT_FILES', [])
+    monkeypatch.setattr(sys, 'stdin', io.StringIO('process P Proc'))
+    monkeypatch.setattr(args, 'format', 'dot')
+    try:
+        cli.run(args)
+        console.FILTERS.debug_print('%s', Costly())
+    finally:
+        console.set_debug(False)
+    err = capsys.readouterr().err
+    assert err.lstrip().startswith('digraph')  # only the DOT channel
+
+
+def test_debug_channels_must_exist(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(sys, 'argv', ['prog', '--debug-channels', 'x,dot'])
+    with pytest.raises(exception.DfdException, match='channel.*: x;'):
+        cli.run(parse_args())
+
+
+def test_debug_channels_are_reset_by_each_run(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    # e.g. runs of a daemon worker
+    monkeypatch.setattr(sys, 'stdin', io.StringIO('process P Proc'))
+    try:
+        cli.run(parse_args(['-f', 'dot', '--debug-channels', 'filters']))
+        assert console.FILTERS.enabled
+        cli.run(parse_args(['-f', 'dot', '--debug-channels', 'dot']))
+        assert not console.FILTERS.enabled and console.DOT.enabled
+        cli.run(parse_args(['-f', 'dot']))
+        assert not any(c.enabled for c in console.CHANNELS.values())
+    finally:
+        console.set_debug(False)
+
+
+# ── timings report ───────────────────────────────────────────────────────────
+
+
+def test_timings_report_stages_and_slowest_snippets(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    md = MD_WITH_SNIPPETS.replace('.dot', '.svg')
+    (tmp_path / 'doc.md').write_text(md)
+    monkeypatch.setattr(
+        graphviz, 'run_engine', lambda engine, text, fmt: (b'<svg/>', '')
+    )
+    args = parse_args(
+        [
+            '-m',
+            '--no-cache',
+            '--timings',
+            '--timings-format',
+            'json',
+            '--timings-file',
+            't',
+            'doc.md',
+        ]
+    )
+    cli.run(args)
+    assert not timings.TIMINGS.enabled
+
+    report = json.loads((tmp_path / 't').read_text())
+    assert list(report['stages']) == timings.STAGES
+    assert report['total']['peak'] > 0
+    snippets = report['snippets']
+    assert sorted(s['name'] for s in snippets) == [
+        f'out-{n}.svg' for n in range(8)
+    ]
+    durations = [s['total']['wall'] + s['graphviz'] for s in snippets]
+    assert durations == sorted(durations, reverse=True)
+    assert all(s['graphviz'] > 0 and s['dot_size'] > 0 for s in snippets)
+
+
+def test_timings_report_dot_size_on_stderr(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'in.dfd').write_text('process P Proc')
+    cli.run(parse_args(['-f', 'dot', 'in.dfd', '--timings']))
+    err = capsys.readouterr().err
+    assert err.startswith('Timings: 1 diagram(s)')
+    size = len((tmp_path / 'in.dot').read_text())
+    assert f'DOT size: {size} characters' in err
+
+
+def test_timings_option_takes_no_value(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'in.dfd').write_text('process P Proc')
+    cli.run(parse_args(['-f', 'dot', '--timings', 'in.dfd']))
+    assert capsys.readouterr().err.startswith('Timings: 1 diagram(s)')
+    assert (tmp_path / 'in.dot').exists()
+
+
+def test_timings_without_child_cpu_times(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    # e.g. on Windows, with no resource module
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setitem(sys.modules, 'resource', None)
+    (tmp_path / 'in.dfd').write_text('process P Proc')
+    cli.run(parse_args(['-f', 'dot', 'in.dfd', '--timings']))
+    assert capsys.readouterr().err.startswith('Timings: 1 diagram(s)')
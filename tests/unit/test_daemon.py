@@ -0,0 +1,141 @@
+"""Tests for the render daemon, and the forwarding of CLI runs to it."""
+
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from data_flow_diagram import cli, config, daemon, exception
+
+
+@pytest.fixture
+def socket_path(tmp_path: Path) -> Iterator[str]:
+    """Run a daemon in the background, and yield its socket path."""
+    path = str(tmp_path / 'd.sock')
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        executor.submit(int).result()  # fork the worker now
+        server = daemon.Daemon(path, cli.VERSION, executor)
+        thread = threading.Thread(
+            target=server.serve_forever, kwargs={'poll_interval': 0.05}
+        )
+        thread.start()
+        try:
+            yield path
+        finally:
+            server.shutdown()
+            thread.join()
+            server.server_close()
+
+
+def test_daemon_runs_requests(
+    socket_path: str, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'in.dfd').write_text('process P Proc')
+    response = daemon.forward(
+        ['-f', 'dot', 'in.dfd'], cli.VERSION, None, socket_path
+    )
+    assert response is not None
+    assert response['exit'] == 0
+    assert 'digraph' in (tmp_path / 'in.dot').read_text()
+
+    # standard input and output
+    response = daemon.forward(
+        ['-f', 'dot'], cli.VERSION, 'process Q Other', socket_path
+    )
+    assert response is not None
+    assert b'"Q"' in response['stdout']
+
+    # errors
+    response = daemon.forward(['-f', 'dot'], cli.VERSION, 'bad', socket_path)
+    assert response is not None
+    assert response['exit'] == 1
+    assert 'ERROR:' in response['stderr']
+
+
+def test_daemon_refuses_other_versions(socket_path: str) -> None:
+    assert daemon.forward(['-f', 'dot'], 'other', '', socket_path) is None
+
+
+def test_only_one_daemon_per_socket(socket_path: str) -> None:
+    with ProcessPoolExecutor(1) as executor:
+        with pytest.raises(exception.DfdException, match='already listening'):
+            daemon.Daemon(socket_path, cli.VERSION, executor)
+
+
+def test_socket_is_private_from_creation(tmp_path: Path) -> None:
+    path = tmp_path / 'run' / 'd.sock'
+    with ProcessPoolExecutor(1) as executor:
+        with daemon.Daemon(str(path), cli.VERSION, executor):
+            assert path.stat().st_mode & 0o777 == 0o600
+            assert path.parent.stat().st_mode & 0o777 == 0o700
+
+
+def test_socket_directory_must_be_safe(tmp_path: Path) -> None:
+    # others could replace the socket: no sticky bit
+    directory = tmp_path / 'shared'
+    directory.mkdir()
+    directory.chmod(0o777)
+    with ProcessPoolExecutor(1) as executor:
+        with pytest.raises(exception.DfdException, match='writable by other'):
+            daemon.Daemon(str(directory / 'd.sock'), cli.VERSION, executor)
+
+
+def test_client_only_connects_to_private_sockets(
+    socket_path: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    args = ['-f', 'dot'], cli.VERSION, 'process P Proc', socket_path
+    assert daemon.forward(*args) is not None
+
+    Path(socket_path).chmod(0o666)
+    assert daemon.forward(*args) is None
+
+    Path(socket_path).chmod(0o600)
+    uid = os.getuid()
+    monkeypatch.setattr(os, 'getuid', lambda: uid + 1)  # of another user
+    assert daemon.forward(*args) is None
+
+
+def test_cli_forwards_to_daemon(
+    socket_path: str,
+    monkeypatch: pytest.MonkeyPatch,
+    capsysbinary: pytest.CaptureFixture[bytes],
+) -> None:
+    monkeypatch.setenv(config.DAEMON_SOCKET_ENV_VAR, socket_path)
+    monkeypatch.setattr(sys, 'argv', ['prog', '-f', 'dot'])
+    monkeypatch.setattr(sys, 'stdin', open(__file__))  # any text
+    monkeypatch.setattr(
+        cli, 'run_and_report', lambda *args: pytest.fail('ran locally')
+    )
+    with pytest.raises(SystemExit) as exc_info:
+        cli.main()
+    assert exc_info.value.code == 1  # this file is no DFD
+    assert b'ERROR:' in capsysbinary.readouterr().err
+
+
+def test_cli_runs_locally_without_daemon(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv(config.DAEMON_SOCKET_ENV_VAR, str(tmp_path / 'none'))
+    monkeypatch.setattr(sys, 'argv', ['prog', '-f', 'dot'])
+    ran = []
+    monkeypatch.setattr(cli, 'run_and_report', lambda args: ran.append(args))
+    cli.main()
+    assert len(ran) == 1
+
+
+def test_cli_runs_locally_without_unix_users(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    # e.g. on Windows
+    monkeypatch.delenv(config.DAEMON_SOCKET_ENV_VAR, raising=False)
+    monkeypatch.delattr(os, 'getuid')
+    monkeypatch.setattr(sys, 'argv', ['prog', '-f', 'dot'])
+    ran = []
+    monkeypatch.setattr(cli, 'run_and_report', lambda args: ran.append(args))
+    cli.main()
+    assert len(ran) == 1
@@ -0,0 +1,86 @@
+"""Tests for DfdException: message formatting and structured records."""
+
+import pickle
+
+from data_flow_diagram import exception, model
+
+
+def _line(
+    text: str, parent: model.SourceLine | None, line_nr: int
+) -> model.SourceLine:
+    return model.SourceLine(text, text, parent, line_nr)
+
+
+def test_message_shows_source_stack() -> None:
+    root = _line("", None, 0)
+    root.raw_text = "<file:main.dfd>"
+    caller = _line("#include common.dfd", root, 3)
+    included = model.SourceLine("", "<snippet common.dfd>", caller, 0)
+    e = exception.DfdException("bad", source=_line("process", included, 1))
+    assert str(e) == (
+        "(most recent first)\n"
+        "  line 2: process\n"
+        "  line 1: <snippet common.dfd>\n"
+        "  line 4: #include common.dfd\n"
+        "  line 1: <file:main.dfd>\n"
+        "Error: bad"
+    )
+
+
+def test_accumulated_errors_are_formatted_when_displayed() -> None:
+    root = model.SourceLine("", "<file:x.dfd>", None, 0)
+    e = exception.DfdException("Errors found:")
+    assert not e
+    e.add("first", source=_line("a", root, 0))
+    e.add("second")
+    assert e
+    assert str(e) == (
+        "Errors found:\n\n"
+        "(most recent first)\n"
+        "  line 1: a\n"
+        "  line 1: <file:x.dfd>\n"
+        "Error: first\n\n"
+        "second"
+    )
+
+    # adding after display updates the message
+    e.add("third")
+    assert str(e).endswith("second\n\nthird")
+
+
+def test_args_hold_formatted_message() -> None:
+    # As when the message was formatted eagerly, args[0] is the full text
+    root = model.SourceLine("", "<file:x.dfd>", None, 0)
+    e = exception.DfdException("bad", source=_line("a", root, 0))
+    assert e.args == (str(e),)
+    assert e.args[0].endswith("<file:x.dfd>\nError: bad")
+    e.add("more")
+    assert e.args == (str(e),)
+
+
+def test_records_locate_errors() -> None:
+    root = model.SourceLine("", "<file:doc.md>", None, 0)
+    snippet = model.SourceLine("", "<snippet:a.svg>", None, 9, True)
+    e = exception.DfdException("Errors found:")
+    e.add("in file", source=_line("a", root, 4))
+    e.add("in snippet", source=_line("b", snippet, 2))
+    e.add("nowhere")
+    assert e.records() == [
+        model.ErrorRecord("<file:doc.md>", 5, "in file"),
+        model.ErrorRecord("<snippet:a.svg>", 13, "in snippet"),
+        model.ErrorRecord(None, None, "nowhere"),
+    ]
+
+    # without accumulated errors, the exception is the error
+    single = exception.DfdException("alone", source=root)
+    assert single.records() == [
+        model.ErrorRecord("<file:doc.md>", None, "alone")
+    ]
+
+
+def test_pickling_keeps_errors() -> None:
+    e = exception.DfdException("Errors found:")
+    e.add("first", source=model.SourceLine("a", "a", None, 0))
+    copy = pickle.loads(pickle.dumps(e))
+    assert str(copy) == str(e)
+    assert copy.records() == e.records()
@@ -0,0 +1,239 @@
+"""Tests for the Graphviz invocation helpers that need no Graphviz binary."""
+
+import io
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from data_flow_diagram import cli, model
+from data_flow_diagram.rendering import cache, graphviz, templates
+
+
+def _jobs(n: int) -> list[graphviz.ImageJob]:
+    return [
+        graphviz.ImageJob(
+            model.GraphOptions(), f"digraph {{{i}}}", f"{i}.svg", "svg"
+        )
+        for i in range(n)
+    ]
+
+
+@pytest.mark.parametrize(
+    "nb_jobs, nb_batches, expected_sizes",
+    [
+        pytest.param(5, 1, [5], id="single-batch"),
+        pytest.param(5, 2, [3, 2], id="two-batches"),
+        pytest.param(2, 8, [1, 1], id="more-batches-than-jobs"),
+        pytest.param(0, 4, [], id="no-jobs"),
+    ],
+)
+def test_split_batches_keeps_order(
+    nb_jobs: int, nb_batches: int, expected_sizes: list[int]
+) -> None:
+    jobs = _jobs(nb_jobs)
+    batches = graphviz._split_batches(jobs, nb_batches)
+    assert [len(b) for b in batches] == expected_sizes
+    assert [j for b in batches for j in b] == jobs
+
+
+def test_select_engine_by_diagram_mode() -> None:
+    assert graphviz.select_engine(model.GraphOptions()) == "dot"
+    assert (
+        graphviz.select_engine(model.GraphOptions(is_context=True)) == "neato"
+    )
+
+
+PNG = b"\x89PNG\r\n\x1a\n\x00"
+
+
+def test_binary_image_to_stdout_is_byte_exact(
+    monkeypatch: pytest.MonkeyPatch, capsysbinary: pytest.CaptureFixture[bytes]
+) -> None:
+    # Captured stdout has no file descriptor: the image goes through memory
+    monkeypatch.setattr(
+        graphviz, "run_engine", lambda engine, text, fmt: (PNG, "")
+    )
+    cli.write_output("digraph D {}", "-", "png", model.GraphOptions())
+    assert capsysbinary.readouterr().out == PNG
+
+
+def test_graphviz_writes_straight_to_stdout(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capfdbinary: pytest.CaptureFixture[bytes],
+) -> None:
+    engine = tmp_path / "engine"
+    engine.write_text(
+        "#!/bin/sh\ncat >/dev/null\nprintf '\\211PNG\\r\\n\\032\\n\\000'\n"
+    )
+    engine.chmod(0o755)
+    monkeypatch.setattr(graphviz, "select_engine", lambda o: str(engine))
+    monkeypatch.setattr(
+        sys, "stdout", io.TextIOWrapper(os.fdopen(1, "wb", closefd=False))
+    )
+    print("before", flush=True)
+    cli.write_output("digraph D {}", "-", "png", model.GraphOptions())
+    assert capfdbinary.readouterr().out == b"before\n" + PNG
+
+
+def test_batch_renders_each_graph_in_each_format(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # a fake engine writing "FMT:TEXT" into INPUT.FMT for each -T option
+    engine = tmp_path / "engine"
+    engine.write_text(
+        f"#!{sys.executable}\n"
+        "import sys\n"
+        "fmts = [a[2:] for a in sys.argv[1:] if a.startswith('-T')]\n"
+        "for path in [a for a in sys.argv[1:] if not a.startswith('-')]:\n"
+        "    for fmt in fmts:\n"
+        "        with open(path + '.' + fmt.split(':')[0], 'w') as f:\n"
+        "            f.write(fmt + ':' + open(path).read())\n"
+    )
+    engine.chmod(0o755)
+    monkeypatch.setattr(graphviz, "select_engine", lambda o: str(engine))
+    jobs = [
+        graphviz.ImageJob(model.GraphOptions(), text, "", fmt)
+        for text in ("A", "B")
+        for fmt in ("svg", "png:cairo")
+    ]
+    assert graphviz.render_images(jobs) == [
+        b"svg:A",
+        b"png:cairo:A",
+        b"svg:B",
+        b"png:cairo:B",
+    ]
+
+
+def test_layout_is_reused_for_color_variants(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # a fake engine whose positioned DOT output is its input
+    monkeypatch.setattr(
+        graphviz, "find_version", lambda engine, cache=None: "test"
+    )
+    runs: list[tuple[str, ...]] = []
+
+    def run_engine_formats(
+        engine: str, text: str, fmts: list[str], flags: tuple[str, ...] = ()
+    ) -> tuple[list[bytes], str]:
+        runs.append((engine, *flags))
+        return [text.encode() for _ in fmts], ""
+
+    def run_engine_positioned(
+        engine: str, text: str, fmt: str
+    ) -> tuple[bytes, bytes, str]:
+        runs.append((engine,))
+        return text.encode(), text.encode(), ""
+
+    monkeypatch.setattr(graphviz, "run_engine_formats", run_engine_formats)
+    monkeypatch.setattr(
+        graphviz, "run_engine_positioned", run_engine_positioned
+    )
+    render_cache = cache.RenderCache(str(tmp_path / "cache"), layouts=True)
+    light = 'digraph D {\n  bgcolor=white\n  "P" [label="p"]\n}'
+    dark = light.replace("white", "black")
+    other = light.replace('"p"', '"q"')
+    graph_options = model.GraphOptions()
+    for text in light, dark, other:
+        graphviz.render_image(graph_options, text, "svg", render_cache)
+    assert runs == [("dot",), ("neato", "-n2"), ("dot",)]
+
+    # in batches too
+    runs.clear()
+    jobs = [
+        graphviz.ImageJob(graph_options, text.replace("white", "gray"), "", f)
+        for text in (light, other)
+        for f in ("svg", "png")
+    ]
+    images = graphviz.render_images(jobs, 2, render_cache)
+    assert runs == [("neato", "-n2")] * 2
+    assert all(
+        isinstance(image, bytes) and b"bgcolor=gray" in image
+        for image in images
+    )
+
+
+@pytest.mark.parametrize(
+    "layouts, expected_runs",
+    [
+        pytest.param(False, ["-Tsvg", "-Tsvg"], id="images"),
+        pytest.param(True, ["-Tdot -Tsvg", "-n2 -Tsvg"], id="layouts"),
+    ],
+)
+def test_cached_rendering_to_stdout_makes_no_temp_files(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsysbinary: pytest.CaptureFixture[bytes],
+    layouts: bool,
+    expected_runs: list[str],
+) -> None:
+    # a fake engine writing "FMT:TEXT" to stdout for each -T option, the
+    # positioned DOT text being its input, and logging its options
+    engine = tmp_path / "engine"
+    engine.write_text(
+        f"#!{sys.executable}\n"
+        "import sys\n"
+        "text = sys.stdin.read()\n"
+        f"with open({str(tmp_path / 'runs')!r}, 'a') as f:\n"
+        "    print(*sys.argv[1:], file=f)\n"
+        "for fmt in [a[2:] for a in sys.argv[1:] if a.startswith('-T')]:\n"
+        "    sys.stdout.write(text if fmt == 'dot' else fmt + ':' + text)\n"
+    )
+    engine.chmod(0o755)
+    monkeypatch.setattr(graphviz, "select_engine", lambda o: str(engine))
+    monkeypatch.setattr(templates, "ENGINE_POSITIONED", str(engine))
+    monkeypatch.setattr(
+        graphviz, "find_version", lambda engine, cache=None: "test"
+    )
+
+    def make_temp_dir() -> None:
+        raise AssertionError("temporary directory made")
+
+    monkeypatch.setattr(tempfile, "TemporaryDirectory", make_temp_dir)
+
+    render_cache = cache.RenderCache(str(tmp_path / "cache"), layouts=layouts)
+    light = 'digraph D {\n  bgcolor=white\n  "P" [label="p"]\n}'
+    dark = light.replace("white", "black")
+    for text in light, dark:
+        cli.write_output(text, "-", "svg", model.GraphOptions(), render_cache)
+    out = capsysbinary.readouterr().out
+    assert out.startswith(f"svg:{light}svg:".encode())
+    assert out.endswith(b"}") and b"bgcolor=black" in out
+    assert (tmp_path / "runs").read_text().splitlines() == expected_runs
+
+
+def test_version_is_cached_per_binary(tmp_path: Path) -> None:
+    engine = tmp_path / "engine"
+    engine.write_text("#!/bin/sh\necho 'engine - version 1' >&2\n")
+    engine.chmod(0o755)
+    render_cache = cache.RenderCache(str(tmp_path / "cache"))
+    assert graphviz.find_version(str(engine), render_cache) == (
+        "engine - version 1"
+    )
+
+    # a fresh process reads the banner from the render cache
+    graphviz._versions.clear()
+    stat = engine.stat()
+    engine.write_text("#!/bin/sh\nexit 1\n")
+    os.utime(engine, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert graphviz.find_version(str(engine), render_cache) == (
+        "engine - version 1"
+    )
+
+    # an updated binary is asked again
+    os.utime(engine, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert graphviz.find_version(str(engine), render_cache) == ""
+
+
+def test_dot_output_needs_no_graphviz(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("PATH", str(tmp_path))  # no Graphviz there
+    (tmp_path / "in.dfd").write_text("process P Proc")
+    args = cli.parse_args(["-f", "dot", str(tmp_path / "in.dfd")])
+    cli.run_and_report(args)
+    assert "digraph" in (tmp_path / "in.dot").read_text()
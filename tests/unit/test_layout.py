@@ -0,0 +1,153 @@
+"""Tests for the reuse of Graphviz layouts across color variants."""
+
+import pytest
+
+from data_flow_diagram import dfd, model
+from data_flow_diagram.rendering import layout
+
+SOURCE = """
+process P Proc
+entity E Ent
+P --> E data
+P --> E more
+frame P = Frame
+"""
+
+# As output by "dot -Tdot" for the DOT text of SOURCE, titled "t"
+POSITIONED = r"""digraph D {
+	graph [bb="0,0,300,120",
+		fontname=helvetica,
+		label="\n- t -",
+		lheight=0.33,
+		lp="150,12",
+		lwidth=0.5,
+		rankdir=LR
+	];
+	node [fontname=helvetica,
+		fontsize=10,
+		label="\N"
+	];
+	edge [color=gray];
+	subgraph cluster_0 {
+		graph [bb="8,8,100,100",
+			label=Frame,
+			lp="54,88"
+		];
+		P	[fillcolor="#eeeeee",
+			height=0.5,
+			label=Proc,
+			pos="54,40",
+			width=0.75];
+	}
+	E	[height=0.5,
+		label=Ent,
+		pos="200,40",
+		shape=rectangle,
+		width=0.75];
+	P -> E	[label=data,
+		lp="120,48",
+		pos="e,180,40 80,40 120,40 150,40 170,40"];
+	P -> E	[label=more,
+		lp="120,20",
+		pos="e,180,30 80,30 120,30 150,30 170,30\
+ 175,30"];
+}
+"""
+
+
+def _build(source: str = SOURCE, **overrides: object) -> str:
+    options = model.Options(
+        background_color=None,
+        no_graph_title=False,
+        format="dot",
+        no_check_dependencies=True,
+        debug=False,
+    )
+    for name, value in overrides.items():
+        setattr(options, name, value)
+    root = model.SourceLine("", "<test>", None, 0)
+    text, _ = dfd.build(root, source, "t", options)
+    return text
+
+
+def test_fingerprint_ignores_colors_and_comments() -> None:
+    fingerprint = layout.make_fingerprint(_build())
+    assert layout.make_fingerprint(_build(background_color="black")) == (
+        fingerprint
+    )
+    assert layout.make_fingerprint(_build(provenance_comments=False)) == (
+        fingerprint
+    )
+
+    # colors of items, including those of HTML labels
+    texts = [
+        _build(SOURCE + f"{kind} S [color={color}] Colored\n")
+        for kind in ("process", "store")
+        for color in ("red", "blue")
+    ]
+    assert layout.make_fingerprint(texts[0]) == layout.make_fingerprint(
+        texts[1]
+    )
+    assert layout.make_fingerprint(texts[2]) == layout.make_fingerprint(
+        texts[3]
+    )
+
+    # titles and connections take room
+    assert layout.make_fingerprint(_build(no_graph_title=True)) != fingerprint
+    assert layout.make_fingerprint(_build(SOURCE + "E --> P back")) != (
+        fingerprint
+    )
+
+
+def test_layout_is_applied_to_a_variant() -> None:
+    positions = layout.read_layout(POSITIONED)
+    assert positions.nodes["P"] == {
+        "height": "0.5",
+        "pos": "54,40",
+        "width": "0.75",
+    }
+    assert positions.edges["P", "E"][1]["pos"].endswith("170,30 175,30")
+
+    placed = layout.apply_layout(
+        _build(background_color="black"), positions, "neato"
+    )
+    assert "bgcolor=black" in placed
+    assert layout.read_layout(placed) == positions
+    assert 'graph [bb="0,0,300,120" lheight="0.33"' in placed
+    assert 'layout="neato"]' in placed
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        pytest.param(SOURCE + "E --> P back", id="more-edges"),
+        pytest.param(SOURCE.replace("P --> E more\n", ""), id="fewer-edges"),
+        pytest.param(SOURCE + "process Q Other", id="more-nodes"),
+    ],
+)
+def test_layout_of_another_graph_is_refused(source: str) -> None:
+    positions = layout.read_layout(POSITIONED)
+    with pytest.raises(ValueError):
+        layout.apply_layout(_build(source), positions, "neato")
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        pytest.param("digraph D {", id="unclosed"),
+        pytest.param("digraph D { a -> {b c} }", id="subgraph-end"),
+        pytest.param("digraph D { a [label=<b>] ", id="unclosed-html"),
+        pytest.param("digraph D { a } b", id="trailing"),
+    ],
+)
+def test_unsupported_dot_raises_value_error(text: str) -> None:
+    with pytest.raises(ValueError):
+        layout.read_layout(text)
+
+
+def test_positioned_text_is_split_from_the_image() -> None:
+    image = b"\x89PNG\r\n\x1a\n}{\xff"
+    output = POSITIONED.encode() + image
+    assert layout.split_positioned(output) == (POSITIONED.encode(), image)
+    with pytest.raises(ValueError):
+        layout.split_positioned(b"<svg/>")
@@ -1,7 +1,9 @@
 """Tests for Markdown snippet extraction (markdown.extract_snippets)."""
 
+import io
+
 from data_flow_diagram import model
-from data_flow_diagram.markdown import extract_snippets
+from data_flow_diagram.markdown import extract_snippets, read_snippets
 
 
 def test_extract_snippets_finds_dfd_blocks(
@@ -11,3 +13,38 @@ def test_extract_snippets_finds_dfd_blocks(
     # Only data-flow-diagram blocks must be extracted; unrelated blocks ignored
     result = extract_snippets(md_with_two_snippets)
     assert result == md_expected_snippets
+
+
+def test_read_snippets_streams_with_line_numbers() -> None:
+    # Snippets come with the 0-based line number of their opening fence,
+    # and without leading and trailing blank lines
+    md = io.StringIO(
+        "# Title\n"
+        "\n"
+        "```data-flow-diagram a.svg\n"
+        "\n"
+        "process P\n"
+        "\n"
+        "process Q\n"
+        "\n"
+        "  ```\n"
+        "```python\n"
+        "print()\n"
+        "```\n"
+        "```data-flow-diagram #b\n"
+        "entity E\n"
+        "```\n"
+    )
+    snippets = read_snippets(md)
+    assert next(snippets) == model.Snippet(
+        text="process P\n\nprocess Q\n", name="a", output="a.svg", line_nr=2
+    )
+    assert next(snippets) == model.Snippet(
+        text="entity E\n", name="#b", output="#b", line_nr=12
+    )
+    assert next(snippets, None) is None
+
+
+def test_read_snippets_ignores_unclosed_block() -> None:
+    md = io.StringIO("```data-flow-diagram a.svg\nprocess P\n")
+    assert list(read_snippets(md)) == []
@@ -7,6 +7,7 @@ tests (e.g. for include resolution) belong in test_scanner.py.
 import pytest
 
 from data_flow_diagram import exception, model
+from data_flow_diagram.console import set_debug
 from data_flow_diagram.dsl import checker, parser, scanner
 
 # ── Valid syntax fixture ──────────────────────────────────────────────────────
@@ -151,3 +152,47 @@ def test_parse_raises(dfd_text: str) -> None:
     tokens = scanner.scan(None, dfd_text)
     with pytest.raises(exception.DfdException):
         parser.parse(tokens)
+
+
+@pytest.mark.parametrize(
+    "op, keyword",
+    [
+        ("->", "flow"),
+        ("--->?", "flow?"),
+        ("<--", "flow.r"),
+        ("<-?", "flow.r?"),
+        ("->>", "cflow"),
+        ("<<--?", "cflow.r?"),
+        ("<->", "bflow"),
+        ("--?", "uflow?"),
+        ("::>", "signal"),
+        ("<:?", "signal.r?"),
+        (">>", "constraint"),
+        ("<", "constraint.r"),
+    ],
+)
+def test_parse_arrow_sugar(op: str, keyword: str) -> None:
+    # Arrows are rewritten to keyword form, which becomes the source text
+    tokens = scanner.scan(None, f"A  {op}  B  some  text")
+    parser.parse(tokens)
+    assert tokens[0].text == f"{keyword}\tA\tB\tsome  text"
+
+
+@pytest.mark.parametrize("op", ["-", ">?", "<-->>", "=>"])
+def test_parse_non_arrow_is_not_rewritten(op: str) -> None:
+    tokens = scanner.scan(None, f"A {op} B")
+    with pytest.raises(exception.DfdException, match='keyword "A"'):
+        parser.parse(tokens)
+
+
+def test_parse_debug_output(capsys: pytest.CaptureFixture[str]) -> None:
+    # Debug output dumps the statements, even though model classes are slotted
+    options = model.Options(None, False, "svg", False, debug=True)
+    set_debug(True)
+    try:
+        parser.parse(scanner.scan(None, "process P Proc\n!<2 P"), options)
+    finally:
+        set_debug(False)
+    err = capsys.readouterr().err
+    assert err.startswith('Item {\n  "source": {')
+    assert '"names": [\n    "P"\n  ]' in err
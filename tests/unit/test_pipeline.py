@@ -4,6 +4,7 @@ These tests exercise each stage of the DFD pipeline with programmatically
 constructed inputs, verifying that:
 
 - build() returns well-formed DOT text without any file I/O
+- render_many() renders sources to images in memory
 - handle_options() extracts style statements into GraphOptions
 - remove_unused_hidables() drops unconnected conditional items
 - generate_dot() produces correct DOT fragments from model objects
@@ -11,9 +12,14 @@ constructed inputs, verifying that:
 - dependency_checker.check() validates dependencies via file_texts dict
 """
 
+import io
+import subprocess
+from pathlib import Path
+from typing import Any
+
 import pytest
 
-from data_flow_diagram import dfd, exception, model
+from data_flow_diagram import config, dfd, exception, model
 from data_flow_diagram.dsl import (
     checker,
     dependency_checker,
@@ -21,6 +27,7 @@ from data_flow_diagram.dsl import (
     parser,
     scanner,
 )
+from data_flow_diagram.rendering import graphviz
 from data_flow_diagram.rendering.dot import Generator, generate_dot
 
 
@@ -107,6 +114,86 @@ class TestBuild:
         assert '"E"' in dot_text
         assert '"P" -> "E"' in dot_text
 
+    def test_fast_layout_scales_with_graph_size(self) -> None:
+        def chain(n: int) -> str:
+            items = "".join(f"process P{i} proc\n" for i in range(n))
+            return items + "".join(
+                f"P{i} --> P{i + 1}\n" for i in range(n - 1)
+            )
+
+        provenance = _src("<test>")
+        options = _default_options(layout_budget="fast")
+        dot_text, graph_options = dfd.build(provenance, chain(4), "", options)
+        assert "nslimit=" in dot_text and "remincross=false" in dot_text
+        assert "splines=line" not in dot_text
+        assert graphviz.select_engine(graph_options) == "dot"
+
+        dot_text, graph_options = dfd.build(
+            provenance, chain(config.FAST_LAYOUT_MAX_NODES + 1), "", options
+        )
+        assert "layout=sfdp" in dot_text
+        assert graphviz.select_engine(graph_options) == "sfdp"
+
+    def test_fast_layout_threshold_is_configurable(
+        self, capsys: pytest.CaptureFixture[str]
+    ) -> None:
+        provenance = _src("<test>")
+        dfd_src = "style fast-layout 2\nprocess P p\nprocess Q q\nprocess R r"
+        options = _default_options()
+        _, graph_options = dfd.build(provenance, dfd_src, "", options)
+        assert graphviz.select_engine(graph_options) == "sfdp"
+        assert capsys.readouterr().err == ""  # warned by the CLI
+
+        # the command line overrides the style
+        options = _default_options(fast_layout_max_nodes=3)
+        _, graph_options = dfd.build(provenance, dfd_src, "", options)
+        assert graphviz.select_engine(graph_options) == "dot"
+        assert capsys.readouterr().err == ""
+
+    def test_layout_budget_overrides_style(self) -> None:
+        provenance = _src("<test>")
+        dfd_src = "style fast-layout\nprocess P proc"
+        dot_text, _ = dfd.build(provenance, dfd_src, "", _default_options())
+        assert "nslimit=" in dot_text
+        options = _default_options(layout_budget="full")
+        dot_text, _ = dfd.build(provenance, dfd_src, "", options)
+        assert "nslimit=" not in dot_text
+
+
+# ── render_many() ────────────────────────────────────────────────────────────
+
+
+class TestRenderMany:
+    @pytest.fixture(autouse=True)
+    def fake_graphviz(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        def run_engine(engine: str, text: str, fmt: str) -> tuple[bytes, str]:
+            if "Bad" in text:
+                raise subprocess.CalledProcessError(1, engine, b"", b"boom")
+            return f"{engine}.{fmt}:{len(text)}".encode(), ""
+
+        monkeypatch.setattr(graphviz, "run_engine", run_engine)
+
+    def test_returns_images_in_order(self) -> None:
+        sources = ["process P p", "process Q q\nprocess R r", "style context"]
+        dots = dfd.render_many(sources, "dot")
+        assert [b"digraph" in dot for dot in dots] == [True] * 3
+        images = dfd.render_many(sources, "svg", jobs=3)
+        assert images == [
+            f"dot.svg:{len(dots[0])}".encode(),
+            f"dot.svg:{len(dots[1])}".encode(),
+            f"neato.svg:{len(dots[2])}".encode(),
+        ]
+
+    def test_raises_on_first_failure(self) -> None:
+        with pytest.raises(exception.DfdException, match="source 1: boom"):
+            dfd.render_many(
+                ["process P p", "process B Bad", "process C Bad"], jobs=3
+            )
+
+    def test_reports_source_errors(self) -> None:
+        with pytest.raises(exception.DfdException, match="<source 1>"):
+            dfd.render_many(["process P p", "bad"])
+
 
 # ── handle_options() ─────────────────────────────────────────────────────────
 
@@ -312,6 +399,35 @@ class TestGenerateDot:
         assert "subgraph cluster_" in dot
         assert "My Frame" in dot
 
+    def test_streams_same_text_to_sink(self) -> None:
+        statements = _parse(
+            "process P p\nstore S s\nP --> S data\nframe P S = F"
+        )
+        items_by_name = checker.check(statements)
+        dot = generate_dot(
+            Generator(model.GraphOptions(), {}),
+            "Title",
+            "red",
+            statements,
+            items_by_name,
+        )
+        sink = io.StringIO()
+        gen = Generator(model.GraphOptions(), {}, sink)
+        assert generate_dot(gen, "Title", "red", statements, items_by_name) == ""
+        assert sink.getvalue() == dot
+        assert "\n\n  /* 0: process P p */\n" in dot
+
+    def test_empty_graph(self) -> None:
+        dot = generate_dot(Generator(model.GraphOptions(), {}), "", None, [], {})
+        assert dot.endswith("]\n\n}")
+
+    def test_without_provenance_comments(self) -> None:
+        statements = _parse("process P p\nprocess Q q")
+        gen = Generator(model.GraphOptions(), {}, provenance_comments=False)
+        dot = generate_dot(gen, "", None, statements, checker.check(statements))
+        assert "/*" not in dot
+        assert '\n\n  "P" [' in dot
+
 
 # ── handle_filters() happy path ──────────────────────────────────────────────
 
@@ -342,6 +458,108 @@ class TestHandleFilters:
         assert names == ["A", "B"]
 
 
+    def test_only_downstream_all_neighbors(self) -> None:
+        # ">*" follows flows downstream transitively, but not upstream
+        statements = _parse(
+            "process A a\nprocess B b\nprocess C c\nprocess D d\n"
+            "D --> A\nA --> B\nB --> C\n! >* A"
+        )
+        result = filters.handle_filters(statements)
+        names = [s.name for s in result if isinstance(s, model.Item)]
+        assert names == ["A", "B", "C"]
+
+    def test_only_neighbors_limited_distance(self) -> None:
+        statements = _parse(
+            "process A a\nprocess B b\nprocess C c\n"
+            "A --> B\nB --> C\n! >1 A"
+        )
+        result = filters.handle_filters(statements)
+        names = [s.name for s in result if isinstance(s, model.Item)]
+        assert names == ["A", "B"]
+
+    def test_neighbors_follow_flow_or_layout_direction(self) -> None:
+        # A reversed flow points upstream in flow direction, but downstream
+        # in layout direction
+        dfd_src = "process A a\nprocess B b\nA <-- B\n"
+        statements = _parse(dfd_src + "! >x* A")
+        downs, _ = filters.find_neighbors(
+            statements[-1],  # type: ignore[arg-type]
+            filters.build_adjacencies(statements),
+            2,
+        )
+        assert downs == set()
+
+        statements = _parse(dfd_src + "! ]x* A")
+        downs, _ = filters.find_neighbors(
+            statements[-1],  # type: ignore[arg-type]
+            filters.build_adjacencies(statements),
+            2,
+        )
+        assert downs == {"B"}
+
+    def test_neighbors_ignore_constraints_and_reach_anchor_in_cycle(
+        self,
+    ) -> None:
+        statements = _parse(
+            "process A a\nprocess B b\nprocess C c\n"
+            "A --> B\nB --> A\nA > C\n! >x* A"
+        )
+        downs, ups = filters.find_neighbors(
+            statements[-1],  # type: ignore[arg-type]
+            filters.build_adjacencies(statements),
+            3,
+        )
+        assert downs == {"A", "B"}
+        assert ups == set()
+
+    def test_bidirectional_flow_is_both_upstream_and_downstream(self) -> None:
+        statements = _parse(
+            "process A a\nprocess B b\nprocess C c\n"
+            "A <-> B\nC -- A\n! <x1 A"
+        )
+        _, ups = filters.find_neighbors(
+            statements[-1],  # type: ignore[arg-type]
+            filters.build_adjacencies(statements),
+            3,
+        )
+        assert ups == {"B", "C"}
+
+    def test_connection_signature_ignores_source(self) -> None:
+        statements = _parse(
+            "process A a\nprocess B b\nA --> B data\n\nA --> B data\n"
+            "A --> B other"
+        )
+        conns = [s for s in statements if isinstance(s, model.Connection)]
+        assert conns[0].source != conns[1].source
+        assert conns[0].signature() == conns[1].signature()
+        assert conns[0].signature() != conns[2].signature()
+        assert len({c.signature() for c in conns}) == 2
+
+    def test_deduplicate_connections_keeps_first_occurrence(self) -> None:
+        statements = _parse(
+            "process A a\nprocess B b\nA --> B x\nB --> A x\nA --> B x"
+        )
+        result = filters.deduplicate_connections(statements)
+        conns = [s for s in result if isinstance(s, model.Connection)]
+        assert [(c.src, c.dst) for c in conns] == [("A", "B"), ("B", "A")]
+        assert conns[0] is statements[2]
+
+        # only candidates are deduplicated
+        second = statements[3]
+        assert isinstance(second, model.Connection)
+        key = second.signature()
+        assert filters.deduplicate_connections(statements, {key}) == statements
+
+    def test_replaced_connections_are_merged(self) -> None:
+        statements = _parse(
+            "process A a\nprocess B b\nprocess C c\nprocess D d\n"
+            "A --> B\nA --> C\n~ =D B C"
+        )
+        result = filters.handle_filters(statements)
+        conns = [s for s in result if isinstance(s, model.Connection)]
+        assert [(c.src, c.dst) for c in conns] == [("A", "D")]
+
+
 # ── dependency_checker.check() with file_texts ──────────────────────────────
 
 
@@ -436,3 +654,109 @@ class TestDependencyChecker:
             dependency_checker.check(
                 [dep], None, options, file_texts=file_texts
             )
+
+    def test_registry_parses_each_graph_once(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        # Many references to the same graph, over several checks sharing a
+        # registry, must parse it only once
+        parse_calls = []
+        parse = parser.parse
+
+        def counting_parse(*args: Any, **kwargs: Any) -> Any:
+            parse_calls.append(args)
+            return parse(*args, **kwargs)
+
+        monkeypatch.setattr(parser, "parse", counting_parse)
+        deps = [
+            model.GraphDependency(
+                to_graph="other.dfd",
+                to_item=name,
+                to_type=model.Keyword.PROCESS,
+                source=_src(f"process other.dfd:{name}"),
+            )
+            for name in ("P", "Q")
+        ]
+        options = _default_options(no_check_dependencies=False)
+        file_texts = {"other.dfd": "process P proc\nprocess Q proc"}
+        registry = dependency_checker.GraphRegistry()
+        for _ in range(3):
+            dependency_checker.check(
+                deps, None, options, file_texts=file_texts, registry=registry
+            )
+        assert len(parse_calls) == 1
+
+        # A changed graph is parsed again
+        file_texts["other.dfd"] = "process P proc"
+        with pytest.raises(exception.DfdException, match='"Q"'):
+            dependency_checker.check(
+                deps, None, options, file_texts=file_texts, registry=registry
+            )
+        assert len(parse_calls) == 2
+
+    def test_registry_reads_each_file_once(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        # A referred file is only read when not parsed yet, that is until
+        # it changes
+        read_calls = []
+        read_file = dependency_checker._read_file
+
+        def counting_read_file(*args: Any) -> Any:
+            read_calls.append(args)
+            return read_file(*args)
+
+        monkeypatch.setattr(dependency_checker, "_read_file", counting_read_file)
+        monkeypatch.chdir(tmp_path)
+        other = tmp_path / "other.dfd"
+        other.write_text("process P proc\nprocess Q proc")
+        deps = [
+            model.GraphDependency(
+                to_graph="other.dfd",
+                to_item=name,
+                to_type=model.Keyword.PROCESS,
+                source=_src(f"process other.dfd:{name}"),
+            )
+            for name in ("P", "Q")
+        ]
+        options = _default_options(no_check_dependencies=False)
+        registry = dependency_checker.GraphRegistry()
+        for _ in range(3):
+            dependency_checker.check(deps, None, options, registry=registry)
+        assert len(read_calls) == 1
+
+        other.write_text("process P proc")
+        with pytest.raises(exception.DfdException, match='"Q"'):
+            dependency_checker.check(deps, None, options, registry=registry)
+        assert len(read_calls) == 2
+
+    def test_registry_keeps_graphs_of_documents_apart(self) -> None:
+        # The same snippet text includes other snippets in each document,
+        # so its graph must not be shared by the documents
+        def check(document: str, included: str) -> None:
+            snippet_by_name = {
+                name: model.Snippet(text=text, name=name, output="#", line_nr=0)
+                for name, text in (
+                    ("common", "#include #inc"),
+                    ("inc", included),
+                )
+            }
+            root = model.SourceLine(
+                "", f"<file:{document}><snippet:out.svg>", None, 0
+            )
+            dep = model.GraphDependency(
+                to_graph="#common",
+                to_item="P",
+                to_type=model.Keyword.PROCESS,
+                source=model.SourceLine("x", "x", root, 1),
+            )
+            dependency_checker.check(
+                [dep], snippet_by_name, options, registry=registry
+            )
+
+        options = _default_options(no_check_dependencies=False)
+        registry = dependency_checker.GraphRegistry()
+        check("a.md", "process P proc")
+        with pytest.raises(exception.DfdException, match='"P"'):
+            check("b.md", "process Q proc")
+        assert len(registry.graphs) == 2
@@ -4,6 +4,7 @@ These tests exercise error paths in the #include directive handling:
 recursive includes, missing files, and missing/invalid snippets.
 """
 
+import os
 from pathlib import Path
 
 import pytest
@@ -45,3 +46,88 @@ def test_include_recursive(tmp_path: Path) -> None:
     self_including.write_text(f"#include {self_including}\nprocess\tP\tProc")
     with pytest.raises(exception.DfdException, match="Recursive"):
         scanner.scan(None, self_including.read_text())
+
+
+def test_include_indirect_cycle(tmp_path: Path) -> None:
+    # a.dfd -> b.dfd -> a.dfd is a cycle
+    a, b = tmp_path / "a.dfd", tmp_path / "b.dfd"
+    a.write_text(f"#include {b}")
+    b.write_text(f"#include {a}")
+    with pytest.raises(exception.DfdException, match="Recursive"):
+        scanner.scan(None, f"#include {a}")
+
+
+def test_include_shared_fragment_once(tmp_path: Path) -> None:
+    # A fragment included by two includees is not a cycle, and its lines
+    # are only included once
+    common = tmp_path / "common.dfd"
+    common.write_text("process\tC\tCommon")
+    a, b = tmp_path / "a.dfd", tmp_path / "b.dfd"
+    a.write_text(f"#include {common}\nprocess\tA\tA")
+    b.write_text(f"#include {common}\nprocess\tB\tB")
+    lines = scanner.scan(None, f"#include {a}\n#include {b}")
+    assert [l.text for l in lines] == [
+        "process\tC\tCommon",
+        "process\tA\tA",
+        "process\tB\tB",
+    ]
+
+
+def test_include_same_file_by_another_path_once(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # Include-once and recursion go by real path, not by the name written
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a.dfd").write_text("process\tA\tA")
+    (tmp_path / "link.dfd").symlink_to(tmp_path / "a.dfd")
+    lines = scanner.scan(
+        None, "#include a.dfd\n#include ./a.dfd\n#include link.dfd"
+    )
+    assert [l.text for l in lines] == ["process\tA\tA"]
+
+    (tmp_path / "self.dfd").write_text("#include ./self.dfd")
+    with pytest.raises(exception.DfdException, match="Recursive"):
+        scanner.scan(None, "#include self.dfd")
+
+
+def test_include_reads_changed_file(tmp_path: Path) -> None:
+    # Included files are cached, but not beyond a modification
+    part = tmp_path / "part.dfd"
+    part.write_text("process\tP\tBefore")
+    assert scanner.scan(None, f"#include {part}")[0].text.endswith("Before")
+    part.write_text("process\tP\tAfter, longer")
+    assert scanner.scan(None, f"#include {part}")[0].text.endswith("longer")
+
+
+def test_scanned_lines_are_not_shared() -> None:
+    # The parser rewrites SourceLine texts, so each scan needs its own
+    first = scanner.scan(None, "process\tP\tProc")
+    first[0].text = "rewritten"
+    assert scanner.scan(None, "process\tP\tProc")[0].text == "process\tP\tProc"
+
+
+def test_only_included_files_are_cached(tmp_path: Path) -> None:
+    # Whole documents are not kept alive by the cache, only included files
+    part = tmp_path / "part.dfd"
+    part.write_text("process\tP\tPart")
+    scanner._read_lines.cache_clear()
+    for n in range(3):
+        scanner.scan(None, f"process\tQ{n}\tDoc\n#include {part}")
+    assert scanner._read_lines.cache_info().currsize == 1
+
+
+def test_included_files_are_cached_by_real_path(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # Same relative path, mtime and size, but another file: e.g. runs of
+    # a daemon worker in different directories
+    for name in "a", "b":
+        (tmp_path / name).mkdir()
+        part = tmp_path / name / "x.inc"
+        part.write_text(f"process\tP\t{name.upper()}")
+        os.utime(part, ns=(0, 0))
+    for name in "a", "b":
+        monkeypatch.chdir(tmp_path / name)
+        assert scanner.scan(None, "#include x.inc")[0].text.endswith(
+            name.upper()
+        )
@@ -0,0 +1,87 @@
+"""Tests for watch mode (watch.Watcher and its use by the CLI)."""
+
+import os
+from pathlib import Path
+
+import pytest
+
+from data_flow_diagram import cli, exception, model, watch
+from data_flow_diagram.watch import Watcher
+
+
+def _touch(path: Path, text: str) -> None:
+    # Move mtime forward, as its resolution may be coarse
+    path.write_text(text)
+    os.utime(path, ns=(0, path.stat().st_mtime_ns + 1_000_000_000))
+
+
+def test_check_detects_changes_of_dependencies(tmp_path: Path) -> None:
+    main = tmp_path / 'main.dfd'
+    dep = tmp_path / 'dep.dfd'
+    main.write_text('')
+    dep.write_text('')
+    watcher = Watcher(lambda: {str(dep)}, {str(main)})
+    watcher.rebuild()
+    assert not watcher.check()
+    _touch(dep, 'changed')
+    assert watcher.check()
+    watcher.rebuild()
+    assert not watcher.check()
+
+    # A removed dependency is a change too
+    dep.unlink()
+    assert watcher.check()
+
+
+def test_rebuild_reports_errors_and_keeps_watching(
+    tmp_path: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    main = tmp_path / 'main.dfd'
+    main.write_text('')
+
+    def build() -> set[str]:
+        raise exception.DfdException('broken')
+
+    watcher = Watcher(build, {str(main)})
+    watcher.rebuild()
+    assert 'ERROR: broken' in capsys.readouterr().err
+    _touch(main, 'changed')
+    assert watcher.check()
+
+
+def test_watch_rebuilds_dependent_snippets_only(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'common.dfd').write_text('process C Common\n')
+    (tmp_path / 'doc.md').write_text(
+        "```data-flow-diagram a.dot\n#include common.dfd\n```\n"
+        "```data-flow-diagram b.dot\nprocess B B\n```\n"
+    )
+    builds = []
+
+    class FakeWatcher(Watcher):
+        def run(self) -> None:
+            self.rebuild()
+            builds.append(capsys.readouterr().err.strip())
+            _touch(tmp_path / 'common.dfd', 'process C Changed\n')
+            assert self.check()
+            self.rebuild()
+            builds.append(capsys.readouterr().err.strip())
+
+    monkeypatch.setattr(watch, 'Watcher', FakeWatcher)
+    options = model.Options(
+        background_color=None,
+        no_graph_title=False,
+        format='dot',
+        no_check_dependencies=True,
+        debug=False,
+    )
+    cli.watch_source(options, 'doc.md', '-', is_markdown=True)
+    assert builds == [
+        '2 snippet(s) rebuilt, 0 skipped',
+        '1 snippet(s) rebuilt, 1 skipped',
+    ]
+    assert 'Changed' in (tmp_path / 'a.dot').read_text()
@@ -8,5 +8,5 @@ MYPY_OPTS+=" --warn-return-any"
 MYPY_OPTS+=" --strict-equality"
 MYPY_OPTS+=" --strict --namespace-packages"
 
-SRCS=$(find src tests -name "*.py")
+SRCS=$(find src tests benchmarks -name "*.py")
 mypy --ignore-missing-imports --pretty $MYPY_OPTS --no-strict-optional $SRCS